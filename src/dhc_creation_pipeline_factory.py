@@ -5,6 +5,7 @@ from .multi_step_pipeline.orchestrator_adjacent import OrchestratorAdjacent
 from .util.config import Config
 from .util.not_yet_implemented_exception import NotYetImplementedException
 from .multi_step_pipeline.clustering_first_stage import ClusteringFirstStage
+from .multi_step_pipeline.cluster_decomposition import ClusterDecomposition
 from .multi_step_pipeline.clustering_second_stage import ClusteringSecondStage
 from .multi_step_pipeline.preprocessing import Preprocessing
 from .multi_step_pipeline.shortest_path_graph_creator import ShortestPathGraphCreator
@@ -41,6 +42,7 @@ class DHCCreationPipelineFactory:
     def create_street_following_pipeline(self):
         preprocessing = Preprocessing()
         clustering_first_stage = ClusteringFirstStage(Config().get_distance_measuring_method())
+        cluster_decomposition = ClusterDecomposition()
         feasible_solution_creator = ClusteringSecondStageFeasibleSolutionCreator()
         clustering_second_stage = ClusteringSecondStage()
         graph_creator = GraphCreator()
@@ -49,6 +51,7 @@ class DHCCreationPipelineFactory:
         visualization = Visualization()
         return MultiStepPipeline(preprocessing,
                                  clustering_first_stage,
+                                 cluster_decomposition,
                                  feasible_solution_creator,
                                  clustering_second_stage,
                                  graph_creator,
@@ -59,12 +62,14 @@ class DHCCreationPipelineFactory:
     def create_greenfield_pipeline(self):
         preprocessing = Preprocessing()
         clustering_first_stage = ClusteringFirstStage(Config().get_distance_measuring_method())
+        cluster_decomposition = ClusterDecomposition()
         feasible_solution_creator = ClusteringSecondStageFeasibleSolutionCreator()
         clustering_second_stage = ClusteringSecondStage()
         graph_creator = GraphCreator()
         visualization = Visualization()
         return OrchestratorGreenfield(preprocessing,
                                  clustering_first_stage,
+                                 cluster_decomposition,
                                  feasible_solution_creator,
                                  clustering_second_stage,
                                  graph_creator,
@@ -73,12 +78,14 @@ class DHCCreationPipelineFactory:
     def create_adjacent_pipeline(self):
         preprocessing = Preprocessing()
         clustering_first_stage = ClusteringFirstStage(Config().get_distance_measuring_method())
+        cluster_decomposition = ClusterDecomposition()
         feasible_solution_creator = ClusteringSecondStageFeasibleSolutionCreator()
         clustering_second_stage = ClusteringSecondStage()
         graph_creator = GraphCreator()
         visualization = Visualization()
         return OrchestratorAdjacent(preprocessing,
                                       clustering_first_stage,
+                                      cluster_decomposition,
                                       feasible_solution_creator,
                                       clustering_second_stage,
                                       graph_creator,
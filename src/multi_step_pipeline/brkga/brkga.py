@@ -5,8 +5,13 @@ from .clustering_decoder import ClusteringDecoder
 from brkga_mp_ipr.types_io import load_configuration
 from brkga_mp_ipr.algorithm import BrkgaMpIpr
 from brkga_mp_ipr.enums import Sense
+from .brkga_mp_ipr_populations import BrkgaMpIprPopulations
+from .deferred_decoding_brkga import DeferredDecodingBrkga
+from .numpy_brkga import NumpyBrkga
+from .parallel_evaluation import ParallelEvaluation
 from ...util.logger import Logger
 from ...util.config import Config
+from ...util.process_pool import ProcessPool
 from ...util.results_saver import ResultsSaver
 from datetime import datetime
 import os
@@ -23,27 +28,81 @@ class Brkga:
                  num_generations: int,
                  sense: Sense,
                  decoder: ClusteringDecoder,
-                 initial_solution: list):
+                 initial_solution: list,
+                 num_independent_populations: int = None):
         self.instance = instance
         self.decoder = decoder
         self.sense = sense
         self.seed = seed
         self.num_generations = num_generations
-        self.brkga_params, _ = load_configuration(self.CONFIG_FILE_PATH)
+        self.brkga_params, self.control_params = load_configuration(self.CONFIG_FILE_PATH)
         self.brkga_params.population_size = int(self.instance.get_number_of_nodes() * Config().get_population_factor())
+        if num_independent_populations is not None:
+            self.brkga_params.num_independent_populations = num_independent_populations
         self.initial_solution = initial_solution
         self.do_warm_start = Config().get_do_warm_start()
         self.timestamp_dict = {}
+        self.cache_statistics_dict = {}
+        self.previous_cache_hits = 0
+        self.previous_cache_misses = 0
+        self.previous_number_of_clusters = 0
+        self.previous_number_of_reused_clusters = 0
+        self.previous_number_of_pruned_decodes = 0
+        self.do_lower_bound_pruning = Config().get_lower_bound_pruning()
+        if self.do_lower_bound_pruning and self.sense != Sense.MINIMIZE:
+            raise Exception(f"lower-bound-pruning only works with Sense.MINIMIZE, but the sense is {self.sense}.")
+        if (self.do_lower_bound_pruning and Config().get_brkga_engine() != "numpy"
+                and not BrkgaMpIprPopulations.is_supported()):
+            Logger().warning(f"lower-bound-pruning needs {BrkgaMpIprPopulations.PACKAGE_NAME} "
+                             f"{BrkgaMpIprPopulations.SUPPORTED_VERSION} or the numpy brkga-engine, but "
+                             f"{BrkgaMpIprPopulations.get_installed_version()} is installed. Pruning is disabled.")
+            self.do_lower_bound_pruning = False
         self.requested_new_folder = False
+        self.warn_about_unsupported_control_params()
+
+    def warn_about_unsupported_control_params(self):
+        """brkga_mp_ipr 0.9.1 does not implement exchange_elite and evolve() never resets the populations.
+        The numpy engine does the same, so both engines run the same algorithm."""
+        if self.control_params.exchange_interval > 0:
+            Logger().warning(f"exchange_interval {self.control_params.exchange_interval} of {self.CONFIG_FILE_PATH} "
+                             f"is not supported. Elite chromosomes are not exchanged between the populations.")
+        if self.control_params.reset_interval > 0:
+            Logger().warning(f"reset_interval {self.control_params.reset_interval} of {self.CONFIG_FILE_PATH} "
+                             f"is not supported. The populations are not reset.")
 
     def do_brkga(self):
-        brkga = BrkgaMpIpr(
-            decoder = self.decoder,
+        evaluation = self.create_parallel_evaluation()
+        try:
+            return self.do_brkga_(evaluation)
+        finally:
+            if evaluation is not None:
+                evaluation.shutdown()
+
+    def create_parallel_evaluation(self):
+        workers = ProcessPool.get_usable_workers(Config().get_decoding_workers(), "Decoding chromosomes")
+        if workers <= 1:
+            return None
+        if Config().get_brkga_engine() != "numpy" and not BrkgaMpIprPopulations.is_supported():
+            Logger().warning(f"Decoding chromosomes in a process pool needs {BrkgaMpIprPopulations.PACKAGE_NAME} "
+                             f"{BrkgaMpIprPopulations.SUPPORTED_VERSION} or the numpy brkga-engine, but "
+                             f"{BrkgaMpIprPopulations.get_installed_version()} is installed. "
+                             f"Decoding in the main process.")
+            return None
+        return ParallelEvaluation(self.decoder, workers)
+
+    def do_brkga_(self, evaluation: ParallelEvaluation = None):
+        brkga_kwargs = dict(
             seed = self.seed,
             sense = self.sense, # Seed.MINIMIZE
             chromosome_size = self.instance.get_number_of_nodes(),
             params = self.brkga_params
         )
+        if Config().get_brkga_engine() == "numpy":
+            brkga = NumpyBrkga(decoder = self.decoder, evaluation = evaluation, **brkga_kwargs)
+        elif evaluation is None:
+            brkga = BrkgaMpIpr(decoder = self.decoder, **brkga_kwargs)
+        else:
+            brkga = DeferredDecodingBrkga(evaluation = evaluation, **brkga_kwargs)
         if self.do_warm_start:
             Logger().info("Initializing initial solution with warm start.")
             warm_start_solution = self.get_result_for_chromosome(self.initial_solution)
@@ -84,14 +143,18 @@ class Brkga:
         run = True
         start_time = time.time()
         self.timestamp_dict[iteration] = current_time
+        self.log_cache_statistics(iteration)
         # Evolving:
         Logger().info(f"{datetime.now()} Evolving...")
         while run:
             iteration += 1
+            if self.do_lower_bound_pruning:
+                self.decoder.pruning_threshold = self.get_worst_elite_fitness(brkga)
             brkga.evolve()
             fitness = brkga.get_best_fitness()
             current_time = datetime.now().strftime("%Y-%m-%d_%H:%M:%S.%f")
             self.timestamp_dict[iteration] = current_time
+            self.log_cache_statistics(iteration)
             if fitness < best_cost:
                 update_offset = iteration - last_update_iteration
                 if large_offset < update_offset:
@@ -113,9 +176,17 @@ class Brkga:
         Logger().info(f"{current_time} Total elapsed time: {total_elapsed_time}")
         Logger().info(f"Total number of iterations: {total_num_iterations}")
         self.save_times(self.timestamp_dict)
+        self.save_cache_statistics(self.cache_statistics_dict)
         self.save_result(current_time, best_result, iteration)
         return best_result
 
+    @staticmethod
+    def get_worst_elite_fitness(brkga):
+        """Elites are carried over to the next generation. Offspring that are worse can not become elite."""
+        if isinstance(brkga, NumpyBrkga):
+            return brkga.get_worst_elite_fitness()
+        return BrkgaMpIprPopulations.get_worst_elite_fitness(brkga)
+
     def save_result(self, timestamp, result_dict, num_generations):
         current_generation = num_generations
         amount_of_clusters = self.decoder.num_clusters
@@ -142,6 +213,44 @@ class Brkga:
                                   result_dict=result_dict)
         self.requested_new_folder = True
 
+    def log_cache_statistics(self, iteration):
+        """Logs how many cluster cost evaluations the reference decode and the cache of the fitness function
+        saved since the last call."""
+        fitness_function = self.decoder.fitness_function
+        hits = fitness_function.cache_hits - self.previous_cache_hits
+        misses = fitness_function.cache_misses - self.previous_cache_misses
+        clusters = self.decoder.number_of_clusters - self.previous_number_of_clusters
+        reused_clusters = self.decoder.number_of_reused_clusters - self.previous_number_of_reused_clusters
+        pruned_decodes = self.decoder.number_of_pruned_decodes - self.previous_number_of_pruned_decodes
+        self.previous_cache_hits = fitness_function.cache_hits
+        self.previous_cache_misses = fitness_function.cache_misses
+        self.previous_number_of_clusters = self.decoder.number_of_clusters
+        self.previous_number_of_reused_clusters = self.decoder.number_of_reused_clusters
+        self.previous_number_of_pruned_decodes = self.decoder.number_of_pruned_decodes
+        self.cache_statistics_dict[iteration] = {
+            "clusters": clusters,
+            "clusters_reused_from_reference": reused_clusters,
+            "decodes_pruned_by_lower_bound": pruned_decodes,
+            "evaluations_saved": hits,
+            "evaluations": misses,
+            "cache_size": len(fitness_function.cluster_cost_cache)
+        }
+        if clusters:
+            Logger().info(f"reference decode: {reused_clusters} of {clusters} clusters reused "
+                          f"({100 * reused_clusters / clusters:.1f} %).")
+        if pruned_decodes:
+            Logger().info(f"lower bound: {pruned_decodes} chromosomes worse than the elite were not costed exactly.")
+        if hits + misses:
+            Logger().info(f"cluster cost cache: {hits} of {hits + misses} cluster evaluations saved "
+                          f"({100 * hits / (hits + misses):.1f} %).")
+
+    def save_cache_statistics(self, cache_statistics_dict):
+        create_new_folder = not self.requested_new_folder
+        ResultsSaver.save_result(file_name=f"cluster_cost_cache_per_generation",
+                                 create_new_folder=create_new_folder,
+                                 cache_statistics=cache_statistics_dict)
+        self.requested_new_folder = True
+
     def save_times(self, timestamp_dict):
         create_new_folder = not self.requested_new_folder
         ResultsSaver.save_result(file_name=f"times_per_generation",
@@ -34,6 +34,7 @@ class BrkgaAPI:
 
     def __init__(self):
         self.seed_to_use = 0
+        self.number_of_evaluations = 0
 
     # ToDo: Validate members and distance matrix. They need to have the same dimensions!
     def do_brkga(self,
@@ -47,7 +48,8 @@ class BrkgaAPI:
                  total_distance: float,
                  total_member_list: list,
                  id_to_node_translation_dict: dict,
-                 pivot_element="none"):
+                 pivot_element="none",
+                 num_independent_populations=None):
 
         result = self.do_brkga_(graph,
                                                        max_capacity,
@@ -59,7 +61,8 @@ class BrkgaAPI:
                                                        total_distance,
                                                        total_member_list,
                                                        id_to_node_translation_dict,
-                                                       pivot_element)
+                                                       pivot_element,
+                                                       num_independent_populations)
         return result
 
     def do_brkga_(self,
@@ -73,7 +76,8 @@ class BrkgaAPI:
                   total_distance: float,
                   total_member_list: list,
                   id_to_node_translation_dict: dict,
-                  pivot_element="none"):
+                  pivot_element="none",
+                  num_independent_populations=None):
         if pivot_element not in ["none", "single", "double"]:
             raise ValueError(f"pivot_element must be 'none', 'single', or 'double'. Is: {pivot_element}")
         if pivot_element == "single":
@@ -95,17 +99,19 @@ class BrkgaAPI:
                                                                             id_to_node_translation_dict,
                                                                             catalogue_df,
                                                                             pipe_prices), pivot_element)
-        initial_solution = self.encode_warm_start(warm_start, total_member_list, pivot_element)
         self.seed_to_use = self.SEED_DEFAULT
         if Config().get_use_random_seed():
             self.seed_to_use = random.randint(1,1_000_000_000)
+        initial_solution = self.encode_warm_start(warm_start, total_member_list, pivot_element)
         brkga = Brkga(instance=instance,
                       seed=self.seed_to_use,
                       num_generations=self.NUM_GENERATIONS,
                       sense=Sense.MINIMIZE,
                       decoder=decoder,
-                      initial_solution=initial_solution)
+                      initial_solution=initial_solution,
+                      num_independent_populations=num_independent_populations)
         result = brkga.do_brkga()
+        self.number_of_evaluations = decoder.number_of_decodes
         return result
 
     def encode_warm_start(self, warm_start, total_member_list : list, pivot_element="none"):
@@ -126,7 +132,9 @@ class BrkgaAPI:
         if len(id_solution) != len(total_member_list):
             raise Exception(f"Mismatched length of parameter total_member_list ({len(total_member_list)}) "
                             f"and local variable id_solution ({len(id_solution)})")
-        keys = sorted([random.random() for _ in range(len(id_solution))])
+        # seeded, so that the result of a cluster does not depend on the clusters run before it in the same process.
+        rng = random.Random(self.seed_to_use)
+        keys = sorted([rng.random() for _ in range(len(id_solution))])
         initial_chromosome = [0] * len(id_solution)
         for i in range(len(id_solution)):
             member_index = total_member_list.index(id_solution[i])
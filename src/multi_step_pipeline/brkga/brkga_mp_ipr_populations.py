@@ -0,0 +1,65 @@
+from functools import lru_cache
+from importlib import metadata
+
+from brkga_mp_ipr.algorithm import BrkgaMpIpr
+from brkga_mp_ipr.enums import Sense
+from brkga_mp_ipr.types import BaseChromosome
+
+
+class BrkgaMpIprPopulations:
+    """Reads and writes the fitness of the populations of a BrkgaMpIpr, which has no public interface for it.
+
+    Every population keeps a list of (fitness, position of the chromosome) tuples, best first. Elite entries keep
+    the positions of the previous generation, so they can repeat the positions of new chromosomes.
+    This layout is only known for the version of brkga_mp_ipr pinned in metadata.txt, so every access checks
+    the installed version first."""
+
+    PACKAGE_NAME = "brkga-mp-ipr"
+    SUPPORTED_VERSION = "0.9.1"
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_installed_version():
+        try:
+            return metadata.version(BrkgaMpIprPopulations.PACKAGE_NAME)
+        except metadata.PackageNotFoundError:
+            return None
+
+    @classmethod
+    def is_supported(cls) -> bool:
+        return cls.get_installed_version() == cls.SUPPORTED_VERSION
+
+    @classmethod
+    def check_version(cls):
+        if not cls.is_supported():
+            raise Exception(f"The populations of {cls.PACKAGE_NAME} {cls.get_installed_version()} can not be "
+                            f"accessed. Only version {cls.SUPPORTED_VERSION} is supported.")
+
+    @classmethod
+    def get_fitness(cls, brkga: BrkgaMpIpr, population_index: int) -> list[tuple[float, int]]:
+        """(fitness, position of the chromosome) of every chromosome of the population, best first."""
+        cls.check_version()
+        return list(brkga.get_current_population(population_index).fitness)
+
+    @classmethod
+    def set_fitness(cls, brkga: BrkgaMpIpr, population_index: int, fitness: list[tuple[float, int]]):
+        """Ranks the (fitness, position of the chromosome) tuples the way BrkgaMpIpr does."""
+        cls.check_version()
+        brkga.get_current_population(population_index).fitness = sorted(
+            fitness, reverse=(brkga.opt_sense == Sense.MAXIMIZE))
+
+    @classmethod
+    def get_chromosome(cls, brkga: BrkgaMpIpr, population_index: int, position: int) -> BaseChromosome:
+        """The chromosome at the position the fitness tuples refer to. Unlike brkga.get_chromosome,
+        the position is not the rank and the chromosome is not copied."""
+        cls.check_version()
+        return brkga.get_current_population(population_index).chromosomes[position]
+
+    @classmethod
+    def get_worst_elite_fitness(cls, brkga: BrkgaMpIpr) -> float:
+        """Worst fitness within the elite sets of all populations."""
+        worst_elite_per_population = [cls.get_fitness(brkga, population_index)[brkga.elite_size - 1][0]
+                                      for population_index in range(brkga.params.num_independent_populations)]
+        if brkga.opt_sense == Sense.MAXIMIZE:
+            return min(worst_elite_per_population)
+        return max(worst_elite_per_population)
@@ -1,5 +1,7 @@
+import math
 from collections import defaultdict
 
+import numpy as np
 from brkga_mp_ipr.types import BaseChromosome
 from .clustering_instance import ClusteringInstance
 from .fitness_function import FitnessFunction
@@ -11,6 +13,7 @@ class ClusteringDecoder:
     MEMBERS_TO_FLAG_INDEX = "-1"
     PIVOT_SINGLE_NAME = "pivot_members_end"
     CONSTRAINT_BROKEN_PENALTY = 1_000_000_000
+    NOT_ASSIGNED = -1
 
     def __init__(self, instance: ClusteringInstance, num_clusters: int, fitness_function: FitnessFunction,
                  pivot_element="none"):
@@ -20,19 +23,32 @@ class ClusteringDecoder:
         self.instance = instance
         self.num_clusters = num_clusters
         self.fitness_function = fitness_function
+        self.number_of_decodes = 0
+        self.number_of_clusters = 0
+        self.number_of_reused_clusters = 0
+        self.number_of_pruned_decodes = 0
+        self.pruning_threshold = math.inf
+        """Chromosomes whose lower bound exceeds it are not evaluated exactly. Set to the worst elite fitness."""
+        self.reference_fitness = math.inf
+        self.reference_cluster_labels = None
+        """cluster labels of the best chromosome decoded so far. Offspring mostly inherit from it."""
+        self.reference_cluster_costs = {}
+        """gene of the cluster center : (cost, demand) of the clusters of the reference"""
 
     def decode(self, chromosome: BaseChromosome, rewrite: bool) -> float:
-        permutation = sorted(
-            (key, index) for index, key in enumerate(chromosome)
-        )
-        all_indices = [index for key, index in permutation]
-        arranged_ids = self.instance.get_decoded_list_of_ids(all_indices)
-        cluster_capacities = self.init_cluster_capacities(arranged_ids)
-        if cluster_capacities is -1:
-            return self.CONSTRAINT_BROKEN_PENALTY
-        cluster_dict = self.create_cluster_membership_dict(arranged_ids, cluster_capacities)
-        fitness = self.evaluate_solution(cluster_dict)
-        return fitness
+        return self.decode_batch([chromosome])[0]
+
+    def decode_batch(self, chromosomes) -> list[float]:
+        """Decodes and evaluates a whole population. Returns the fitness values in the order of the chromosomes."""
+        self.number_of_decodes += len(chromosomes)
+        fitness_values = []
+        for permutation in self.get_permutations(chromosomes):
+            cluster_labels = self.create_cluster_labels(permutation)
+            if not isinstance(cluster_labels, np.ndarray):
+                fitness_values.append(self.CONSTRAINT_BROKEN_PENALTY)
+            else:
+                fitness_values.append(self.evaluate_cluster_labels(permutation, cluster_labels))
+        return fitness_values
 
     def decode_single_use(self, chromosome: BaseChromosome):
         cluster_dict = self.decode_chromosome(chromosome)
@@ -47,92 +63,133 @@ class ClusteringDecoder:
         return end_result
 
     def decode_chromosome(self, chromosome: BaseChromosome):
-        permutation = sorted(
-            (key, index) for index, key in enumerate(chromosome)
-        )
-        all_indices = [index for key, index in permutation]
-        arranged_ids = self.instance.get_decoded_list_of_ids(all_indices)
-        cluster_capacities = self.init_cluster_capacities(arranged_ids)
-        if cluster_capacities is -1:
-            return self.CONSTRAINT_BROKEN_PENALTY
-        cluster_dict = self.create_cluster_membership_dict(arranged_ids, cluster_capacities)
-        if "172146675" in arranged_ids:
-            Logger().debug(f"{cluster_dict}")
-        return cluster_dict
+        return self.decode_chromosomes([chromosome])[0]
 
-    def init_cluster_capacities(self, permutation: list) -> {str: float}:
-        return_dict = {}
-        cluster_centers = permutation[:self.num_clusters]
-        if self.pivot_element == "single":
-            if self.PIVOT_SINGLE_NAME in cluster_centers:
-                return -1
-        for cluster_center in cluster_centers:
-            return_dict[cluster_center] = float(self.instance.max_capacity) - float(self.instance.get_point_demand(cluster_center))
-        return return_dict
-
-    def create_cluster_membership_dict(self, permutation: list, cluster_capacities: {int: float}) -> {str: list[str]}:
-        if self.pivot_element == "none":
-            cluster_membership_dict = self.create_cluster_membership_dict_no_pivot(permutation, cluster_capacities)
-            return cluster_membership_dict
-        elif self.pivot_element == "single":
-            cluster_membership_dict = self.create_cluster_membership_dict_single_pivot(permutation, cluster_capacities)
-            return cluster_membership_dict
-        else:
-            raise NotYetImplementedException(f"Other pivot strategies such as chosen {self.pivot_element} are not implemented.")
+    def decode_chromosomes(self, chromosomes):
+        """Returns a cluster dict per chromosome, or CONSTRAINT_BROKEN_PENALTY if the chromosome is invalid."""
+        return [self.create_cluster_membership_dict(permutation) for permutation in self.get_permutations(chromosomes)]
 
-    def create_cluster_membership_dict_no_pivot(self, permutation: list, cluster_capacities: {int: float}) -> {str: list[str]}:
-        cluster_centers = permutation[:self.num_clusters]
-        potential_members = permutation[self.num_clusters:]
-        result_dict = defaultdict(list, {center: [] for center in cluster_centers})
-        for potential_member in potential_members:
-            result_dict = self.create_cluster_membership_dict_inner_function(result_dict, cluster_capacities,
-                                                                             potential_member, cluster_centers)
+    def get_permutations(self, chromosomes) -> np.ndarray:
+        # the genes sorted by their keys. Equal keys are sorted by gene, like sorting (key, index) tuples.
+        return np.argsort(np.asarray(chromosomes, dtype=float), axis=1, kind="stable")
+
+    def create_cluster_membership_dict(self, permutation: np.ndarray) -> {str: list[str]}:
+        cluster_labels = self.create_cluster_labels(permutation)
+        if not isinstance(cluster_labels, np.ndarray):
+            return cluster_labels
+        members = self.instance.members
+        cluster_center_ids = {cluster_center: members[cluster_center]
+                              for cluster_center in permutation[:self.num_clusters].tolist()}
+        result_dict = defaultdict(list, {center: [] for center in cluster_center_ids.values()})
+        # in the order of the permutation, so excluded pivot elements come after the members that had to be sorted out.
+        for gene, cluster_label in zip(permutation.tolist(), cluster_labels[permutation].tolist()):
+            if cluster_label == self.NOT_ASSIGNED:
+                result_dict[self.MEMBERS_TO_FLAG_INDEX].append(members[gene])
+            elif cluster_label != gene:
+                result_dict[cluster_center_ids[cluster_label]].append(members[gene])
         return result_dict
 
-    def create_cluster_membership_dict_single_pivot(self, permutation: list, cluster_capacities: {int: float}) -> {
-        str: list}:
+    def create_cluster_labels(self, permutation: np.ndarray):
+        """Returns per gene the gene of its cluster center, NOT_ASSIGNED for excluded members,
+        or CONSTRAINT_BROKEN_PENALTY if the chromosome is invalid. Cluster centers are labeled with themselves."""
+        if self.pivot_element not in ["none", "single"]:
+            raise NotYetImplementedException(f"Other pivot strategies such as chosen {self.pivot_element} are not implemented.")
         cluster_centers = permutation[:self.num_clusters]
         potential_members = permutation[self.num_clusters:]
-        result_dict = defaultdict(list, {center: [] for center in cluster_centers})
-        break_index = self.num_clusters
-        for potential_member in potential_members:
-            if potential_member == self.PIVOT_SINGLE_NAME:
-                break
-            result_dict = self.create_cluster_membership_dict_inner_function(result_dict, cluster_capacities,
-                                                                             potential_member, cluster_centers)
-            break_index += 1
-        members_to_exclude = permutation[break_index:]
-        # Logger().debug(f"break index: {break_index}, members_to_exclude: {members_to_exclude}")
-        for member in members_to_exclude:
-            result_dict[self.MEMBERS_TO_FLAG_INDEX].append(member)
-        return result_dict
+        if self.pivot_element == "single":
+            pivot_rank = int(np.flatnonzero(permutation == self.instance.pivot_index)[0])
+            if pivot_rank < self.num_clusters:
+                return self.CONSTRAINT_BROKEN_PENALTY
+            # the pivot element itself and everything after it is excluded.
+            potential_members = permutation[self.num_clusters:pivot_rank]
+        assignments = self.assign_members_to_cluster_centers(cluster_centers, potential_members)
+        cluster_labels = np.full(len(permutation), self.NOT_ASSIGNED)
+        cluster_labels[cluster_centers] = cluster_centers
+        is_assigned = assignments != self.NOT_ASSIGNED
+        cluster_labels[potential_members[is_assigned]] = cluster_centers[assignments[is_assigned]]
+        return cluster_labels
+
+    def evaluate_cluster_labels(self, permutation: np.ndarray, cluster_labels: np.ndarray) -> float:
+        """Like evaluate_solution, but only the clusters that differ from the reference decode are costed.
+        A cluster is unchanged, if no gene joined or left it, so its cost can be taken from the reference."""
+        changed_cluster_centers = set()
+        if self.reference_cluster_labels is not None:
+            is_changed = cluster_labels != self.reference_cluster_labels
+            changed_cluster_centers.update(cluster_labels[is_changed].tolist())
+            changed_cluster_centers.update(self.reference_cluster_labels[is_changed].tolist())
+        building_positions = self.instance.member_building_positions
+        labels_in_order = cluster_labels[permutation]
+        cluster_costs = {}
+        uncosted_clusters = {}
+        """gene of the cluster center : positions of the members of clusters that are neither reused nor cached"""
+        for cluster_center in permutation[:self.num_clusters].tolist():
+            if self.reference_cluster_labels is not None and cluster_center not in changed_cluster_centers:
+                cluster_costs[cluster_center] = self.reference_cluster_costs[cluster_center]
+                self.number_of_reused_clusters += 1
+                continue
+            # members in the order of the permutation, followed by the cluster center like in compute_fitness_for_all.
+            cluster_members = permutation[(labels_in_order == cluster_center) & (permutation != cluster_center)]
+            cluster_center_position = int(building_positions[cluster_center])
+            positions = np.append(building_positions[cluster_members], cluster_center_position)
+            cluster_costs[cluster_center] = self.fitness_function.get_cached_fitness(positions, cluster_center_position)
+            if cluster_costs[cluster_center] is None:
+                uncosted_clusters[cluster_center] = positions
+        self.number_of_clusters += len(cluster_costs)
+        trees = {cluster_center: None for cluster_center in uncosted_clusters}
+        if uncosted_clusters and self.pruning_threshold < math.inf:
+            lower_bound = self.compute_lower_bound(cluster_costs, uncosted_clusters, trees)
+            if lower_bound > self.pruning_threshold:
+                self.number_of_pruned_decodes += 1
+                return lower_bound
+        for cluster_center, positions in uncosted_clusters.items():
+            cluster_center_position = int(building_positions[cluster_center])
+            cluster_costs[cluster_center] = self.fitness_function.compute_fitness(positions, cluster_center_position,
+                                                                                  trees[cluster_center])
+            self.fitness_function.cache_fitness(positions, cluster_center_position, cluster_costs[cluster_center])
+        fitness = self.fitness_function.compute_fitness_from_costs(list(cluster_costs.values()))
+        if fitness < self.reference_fitness:
+            self.reference_fitness = fitness
+            self.reference_cluster_labels = cluster_labels
+            self.reference_cluster_costs = cluster_costs
+        return fitness
+
+    def compute_lower_bound(self, cluster_costs: dict, uncosted_clusters: dict, trees: dict) -> float:
+        """Fitness with the lower bounds of the costs of the uncosted clusters. Never above the exact fitness.
+        The trees of the uncosted clusters are stored in trees, so the exact costs do not have to build them again."""
+        building_positions = self.instance.member_building_positions
+        costs_and_lower_bounds = []
+        for cluster_center, costs in cluster_costs.items():
+            if cluster_center in uncosted_clusters:
+                positions = uncosted_clusters[cluster_center]
+                cluster_center_position = int(building_positions[cluster_center])
+                trees[cluster_center] = self.fitness_function.create_tree(positions, cluster_center_position)
+                costs = self.fitness_function.compute_lower_bound(positions, cluster_center_position,
+                                                                  trees[cluster_center])
+            costs_and_lower_bounds.append(costs)
+        return self.fitness_function.compute_fitness_from_costs(costs_and_lower_bounds)
+
+    def assign_members_to_cluster_centers(self, cluster_centers: np.ndarray, potential_members: np.ndarray):
+        """Assigns every potential member, in order, to the closest cluster center that still has enough capacity.
 
-    def create_cluster_membership_dict_inner_function(self, cluster_dict, cluster_capacities, potential_member,
-                                                      cluster_centers):
-        distances_to_center = self.instance.get_sorted_distances_to_multiple_points(
-            potential_member, cluster_centers)
-        potential_member_assigned = False
-        for cluster_center, distance in distances_to_center:
-            if self.potential_member_fits_into_cluster(cluster_capacities, cluster_center, potential_member):
-                cluster_dict[cluster_center].append(potential_member)
-                # Logger().debug(f"cluster capacity of {cluster_center} was: {cluster_capacities[cluster_center]}")
-                cluster_capacities[cluster_center] -= self.instance.get_point_demand(potential_member)
-                # Logger().debug(f"cluster capacity of {cluster_center} is: {cluster_capacities[cluster_center]}")
-                potential_member_assigned = True
-                break
-        if not potential_member_assigned:
-            # Logger().debug(f"{potential_member} had to be sorted out!")
-            cluster_dict[self.MEMBERS_TO_FLAG_INDEX].append(potential_member)
-        return cluster_dict
-
-    def potential_member_fits_into_cluster(self, cluster_capacities: {int: float},
-                                           cluster_center: str,
-                                           potential_member: str):
-        remaining_capacity = float(cluster_capacities[cluster_center])
-        potential_remaining_capacity = remaining_capacity - self.instance.get_point_demand(potential_member)
-        # Logger().debug(f'calculating remaining capacity for {potential_member}: {remaining_capacity} - {self.instance.get_point_demand(potential_member)} = {potential_remaining_capacity}'
-        #               f'enough capacity? {potential_remaining_capacity >= 0}')
-        return potential_remaining_capacity >= 0
+        :param cluster_centers: genes of the cluster centers.
+        :param potential_members: genes of the potential members.
+        :return: per potential member the index of its cluster center in cluster_centers, or NOT_ASSIGNED.
+        """
+        member_demands = self.instance.member_demand_array
+        cluster_capacities = (float(self.instance.max_capacity) - member_demands[cluster_centers]).tolist()
+        distances = self.instance.distance_matrix[
+            np.ix_(self.instance.member_building_positions[potential_members],
+                   self.instance.member_building_positions[cluster_centers])]
+        # closest cluster center first. Equal distances keep the order of the cluster centers.
+        rankings = np.argsort(distances, axis=1, kind="stable").tolist()
+        assignments = np.full(len(potential_members), self.NOT_ASSIGNED)
+        for member, (ranking, demand) in enumerate(zip(rankings, member_demands[potential_members].tolist())):
+            for cluster_center in ranking:
+                if cluster_capacities[cluster_center] - demand >= 0:
+                    cluster_capacities[cluster_center] -= demand
+                    assignments[member] = cluster_center
+                    break
+        return assignments
 
     def evaluate_solution(self, cluster_dict) -> float:
         fitness = self.fitness_function.compute_fitness_for_all(cluster_dict)
@@ -1,7 +1,7 @@
-from turtle import pd
-
+import networkx as nx
 import numpy as np
-from networkx import nx
+
+from .minimum_spanning_tree import MinimumSpanningTree
 
 
 class ClusteringInstance:
@@ -10,6 +10,8 @@ class ClusteringInstance:
     IS_CENTER_FIELD = "is_center"
     CLUSTER_ID_FIELD = "cluster_id"
     PIVOT_STRING_SINGLE = "pivot_members_end"
+    PIVOT_POSITION = -1
+    NO_EDGE = -1
 
     def __init__(self, graph: nx.Graph, max_capacity: float, demands: {str: float}, yearly_demands: {str: float},
                  members: list,
@@ -21,6 +23,64 @@ class ClusteringInstance:
         self.id_to_node_translation_dict = id_to_node_translation_dict
         self.pivot_element = pivot_element
         self.yearly_demands = yearly_demands
+        self.building_ids = list(demands.keys())
+        """building id per row and column of distance_matrix. Translates positions back to ids for the end results."""
+        self.building_positions = {building_id: position for position, building_id in enumerate(self.building_ids)}
+        """building id : row and column in distance_matrix"""
+        self.demand_array = np.array([float(demands[building_id]) for building_id in self.building_ids],
+                                     dtype=np.float64)
+        """demands ordered like building_ids"""
+        self.yearly_demand_array = np.array([float(yearly_demands[building_id]) for building_id in self.building_ids],
+                                            dtype=np.float64)
+        """yearly demands ordered like building_ids"""
+        self.distance_matrix, self.edge_index_matrix, self.edge_ids = self.create_distance_matrix()
+        self.member_building_positions = np.array([self.building_positions.get(member, self.PIVOT_POSITION)
+                                                   for member in members], dtype=int)
+        """position in distance_matrix per gene of a chromosome, PIVOT_POSITION for pivot elements"""
+        self.member_demand_array = np.where(self.member_building_positions != self.PIVOT_POSITION,
+                                            self.demand_array[self.member_building_positions], 0.0)
+        """demand per gene of a chromosome, 0 for pivot elements"""
+        self.pivot_index = members.index(self.PIVOT_STRING_SINGLE) if self.PIVOT_STRING_SINGLE in members else None
+        """gene of the single pivot element"""
+
+    def create_distance_matrix(self):
+        """Dense float32 matrix of the edge weights between all buildings, inf where there is no edge.
+        Together with the index of every edge into the list of the edge ids of the graph, NO_EDGE where there is none."""
+        node_positions = {self.id_to_node_translation_dict[building_id]: position
+                          for building_id, position in self.building_positions.items()}
+        distance_matrix = np.full((len(node_positions), len(node_positions)), np.inf, dtype=np.float32)
+        edge_index_matrix = np.full((len(node_positions), len(node_positions)), self.NO_EDGE, dtype=np.int32)
+        edge_ids = []
+        for u, v, data in self.graph.edges(data=True):
+            if u in node_positions and v in node_positions:
+                distance_matrix[node_positions[u], node_positions[v]] = data['weight']
+                distance_matrix[node_positions[v], node_positions[u]] = data['weight']
+                edge_index_matrix[node_positions[u], node_positions[v]] = len(edge_ids)
+                edge_index_matrix[node_positions[v], node_positions[u]] = len(edge_ids)
+                edge_ids.append(data.get('edge_ids'))
+        np.fill_diagonal(distance_matrix, 0.0)
+        return distance_matrix, edge_index_matrix, edge_ids
+
+    def get_positions(self, members: list) -> np.ndarray:
+        return np.array([self.building_positions[member] for member in members], dtype=int)
+
+    def get_building_ids(self, positions) -> list[str]:
+        return [self.building_ids[position] for position in positions]
+
+    def get_edge_ids(self, position1: int, position2: int):
+        return self.edge_ids[self.edge_index_matrix[position1, position2]]
+
+    def get_minimum_spanning_tree(self, positions: np.ndarray, root_position: int):
+        """Returns the parents, parent distances and depths of the minimum spanning tree of the buildings
+        at the positions, indexed like positions and rooted at root_position. See MinimumSpanningTree.prim."""
+        return MinimumSpanningTree.prim(self.distance_matrix, positions,
+                                        int(np.flatnonzero(positions == root_position)[0]))
+
+    def get_demands(self, positions: np.ndarray) -> float:
+        return float(self.demand_array[positions].sum())
+
+    def get_demands_per_year(self, positions: np.ndarray) -> float:
+        return float(self.yearly_demand_array[positions].sum())
 
     # ToDo: Delete?
     def get_distance(self, id1, id2):
@@ -40,14 +100,6 @@ class ClusteringInstance:
         sorted_result = sorted(unsorted_result, key=lambda x: x[1])
         return sorted_result
 
-    def get_point_demand(self, point: str) -> float:
-        if not point.startswith("pivot"):
-            return float(self.demands[point])
-
-    def get_yearly_demand(self, point: str) -> float:
-        if not point.startswith("pivot"):
-            return float(self.yearly_demands[point])
-
     def get_number_of_nodes(self):
         number_of_nodes = len(self.demands)
         if self.pivot_element == "single":
@@ -83,11 +135,3 @@ class ClusteringInstance:
         for index in indexes:
             return_list.append(self.members[index])
         return return_list
-
-    def get_point_demands(self, id_subset):
-        demands = sum([self.get_point_demand(cluster_member) for cluster_member in id_subset])
-        return demands
-
-    def get_point_demands_per_year(self, id_subset):
-        yearly_demands = sum([self.get_yearly_demand(cluster_member) for cluster_member in id_subset])
-        return yearly_demands
\ No newline at end of file
@@ -0,0 +1,53 @@
+import math
+
+from brkga_mp_ipr.algorithm import BrkgaMpIpr
+from brkga_mp_ipr.types import BaseChromosome
+
+from .brkga_mp_ipr_populations import BrkgaMpIprPopulations
+from .parallel_evaluation import ParallelEvaluation
+
+
+class DeferredDecodingBrkga(BrkgaMpIpr):
+    """BrkgaMpIpr that evaluates all new chromosomes of a generation at once.
+
+    brkga_mp_ipr decodes one chromosome after another. This class acts as the decoder of its own base class
+    and only returns a placeholder. Once all populations of a generation have been built, the chromosomes with
+    placeholders are evaluated as one batch, and the fitness of every population is fixed and ranked again.
+    The populations end up exactly as if every chromosome had been decoded right away.
+    Only evolve() evaluates the placeholders, after evolve_population() alone they remain."""
+
+    # nan is no valid fitness, so placeholders can not be confused with the fitness of elite chromosomes.
+    PLACEHOLDER_FITNESS = math.nan
+
+    def __init__(self, evaluation: ParallelEvaluation, **kwargs):
+        BrkgaMpIprPopulations.check_version()
+        self.evaluation = evaluation
+        super().__init__(decoder=self, **kwargs)
+
+    def decode(self, chromosome: BaseChromosome, rewrite: bool) -> float:
+        return self.PLACEHOLDER_FITNESS
+
+    def initialize(self) -> None:
+        super().initialize()
+        self.evaluate_placeholders()
+
+    def evolve(self, num_generations: int = 1) -> None:
+        if num_generations < 1:
+            super().evolve(num_generations)
+        for _ in range(num_generations):
+            super().evolve()
+            self.evaluate_placeholders()
+
+    def evaluate_placeholders(self):
+        """Evaluates the placeholders of all populations in one batch. Only placeholders are replaced."""
+        population_indices = range(self.params.num_independent_populations)
+        fitness_per_population = [BrkgaMpIprPopulations.get_fitness(self, population_index)
+                                  for population_index in population_indices]
+        chromosomes = [BrkgaMpIprPopulations.get_chromosome(self, population_index, position)
+                       for population_index, fitness in zip(population_indices, fitness_per_population)
+                       for value, position in fitness if math.isnan(value)]
+        fitness_values = iter(self.evaluation.evaluate(chromosomes))
+        for population_index, fitness in zip(population_indices, fitness_per_population):
+            BrkgaMpIprPopulations.set_fitness(self, population_index,
+                                              [(next(fitness_values), position) if math.isnan(value)
+                                               else (value, position) for value, position in fitness])
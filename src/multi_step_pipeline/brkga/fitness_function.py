@@ -1,11 +1,13 @@
-from collections import defaultdict
+import hashlib
+from collections import OrderedDict
 from ...util.config import Config
 from .mass_flow_calculation import MassFlowCalculation as mfc
 
-import networkx as nx
-import pandas as pd
+import numpy as np
 
 from .clustering_instance import ClusteringInstance
+from .pipe_type_lookup import PipeTypeLookup
+from .minimum_spanning_tree import MinimumSpanningTree
 from ...util.dhp_utility import DhpUtility
 
 from ...util.logger import Logger
@@ -18,6 +20,9 @@ class FitnessFunction:
     PRESSURE_LOSS_THRESHOLD = 250
     PIVOT_STRING_SINGLE = "pivot_members_end"
     CONSTRAINT_BROKEN_PENALTY = 1_000_000_000
+    # lower bounds are scaled down by this, so rounding can not lift them above the exact costs.
+    LOWER_BOUND_TOLERANCE = 1e-9
+    CACHE_KEY_SIZE = 16
 
     trench_cost_per_cubic_m = 0.0
 
@@ -29,47 +34,126 @@ class FitnessFunction:
         self.fixed_cost = Config().get_fixed_cost()
         self.pipe_diameter_catalogue = pipe_diameter_catalogue
         self.pipe_prices = pipe_prices
+        self.pipe_type_lookup = PipeTypeLookup(pipe_diameter_catalogue, pipe_prices)
         self.trench_cost_per_cubic_m = Config().get_trench_cost_per_cubic_m()
         self.life_time_of_heating_source = Config().get_life_time_of_heating_source()
         self.cost_per_penetration = Config().get_cost_per_penetration()
+        self.cluster_cost_cache = OrderedDict()
+        """cache key of the cluster : (cost, demand). Least recently used entries come first. See get_cache_key."""
+        self.cluster_cost_cache_size = Config().get_cluster_cost_cache_size()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cheapest_cost_per_m = self.calculate_cheapest_cost_per_m()
+        """cheapest sum of pipe price and trench cost per meter of all pipe types"""
 
     def compute_fitness_for_all(self, cluster_dict):
         fitness_scores = []
         for cluster_center_id, members in cluster_dict.items():
             if cluster_center_id != "-1":
                 members.append(cluster_center_id)
-                cost, demand = self.compute_fitness(members,
-                                           cluster_center_id)
+                cost, demand = self.compute_cached_fitness(self.instance.get_positions(members),
+                                                           self.instance.building_positions[cluster_center_id])
                 fitness_scores.append((cost, demand))
-        all_costs = [single_cost for single_cost, demand in fitness_scores]
-        all_demands = [demand for single_cost, demand in fitness_scores]
-        fitness = sum(all_costs) / sum(all_demands)
+        fitness = self.compute_fitness_from_costs(fitness_scores)
         # Logger().debug(f"fitness for permutation calculated: {fitness}")
         return fitness
 
-    def compute_fitness(self, id_subset : list, cluster_center_id):
-        # Logger().debug(f"Calculating fitness for {id_subset} with {cluster_center_id} as it's cluster center.")
-        if len(id_subset) == 1:
-            return self.fixed_cost, self.instance.get_point_demands(id_subset)
-        subset_graph = self.instance.get_subgraph(id_subset)
-        mst = self.create_mst(subset_graph)
-        tree = self.extract_tree(mst, self.buildings_to_point_dict[cluster_center_id])
+    def compute_fitness_from_costs(self, fitness_scores):
+        """fitness_scores: (cost, demand) per cluster."""
+        all_costs = [single_cost for single_cost, demand in fitness_scores]
+        all_demands = [demand for single_cost, demand in fitness_scores]
+        return sum(all_costs) / sum(all_demands)
+
+    def compute_cached_fitness(self, positions: np.ndarray, cluster_center_position: int, tree=None):
+        """compute_fitness with a bounded LRU cache.
+        Populations converge, so the same clusters get evaluated again and again across individuals and generations.
+        The costs only depend on the cluster center and the set of members, not on the order of the members."""
+        cached_result = self.get_cached_fitness(positions, cluster_center_position)
+        if cached_result is not None:
+            return cached_result
+        result = self.compute_fitness(positions, cluster_center_position, tree)
+        self.cache_fitness(positions, cluster_center_position, result)
+        return result
+
+    def get_cached_fitness(self, positions: np.ndarray, cluster_center_position: int):
+        """Returns the cached (cost, demand) of the cluster or None."""
+        if not self.cluster_cost_cache_size:
+            return None
+        key = self.get_cache_key(positions, cluster_center_position)
+        cached_result = self.cluster_cost_cache.get(key)
+        if cached_result is not None:
+            self.cluster_cost_cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached_result
+        self.cache_misses += 1
+        return None
+
+    def cache_fitness(self, positions: np.ndarray, cluster_center_position: int, result):
+        if not self.cluster_cost_cache_size:
+            return
+        self.cluster_cost_cache[self.get_cache_key(positions, cluster_center_position)] = result
+        if len(self.cluster_cost_cache) > self.cluster_cost_cache_size:
+            self.cluster_cost_cache.popitem(last=False)
+
+    def get_cache_key(self, positions: np.ndarray, cluster_center_position: int) -> bytes:
+        """16 byte digest of the cluster center and the bitset of the member positions.
+        Every entry takes the same memory no matter how large the cluster is, so the number of entries caps it."""
+        membership = np.zeros(len(self.instance.building_ids), dtype=bool)
+        membership[positions] = True
+        key = hashlib.blake2b(digest_size=self.CACHE_KEY_SIZE)
+        key.update(int(cluster_center_position).to_bytes(8, "little", signed=True))
+        key.update(np.packbits(membership).tobytes())
+        return key.digest()
 
-        pipe_mass_flows = self.calculate_cumulative_mass_flows(tree, self.buildings_to_point_dict[cluster_center_id])
+    def compute_lower_bound(self, positions: np.ndarray, cluster_center_position: int, tree):
+        """Returns (cost, demand) of the cluster, where the cost is never above the one of compute_fitness:
+        the fixed cost plus every edge of the tree built with the cheapest pipe and trench."""
+        if len(positions) == 1:
+            return self.compute_fitness(positions, cluster_center_position)
+        all_demands = self.instance.get_demands_per_year(positions) * self.life_time_of_heating_source
+        if all_demands <= 0:
+            return self.CONSTRAINT_BROKEN_PENALTY, 1
+        parents, parent_distances, _ = tree
+        # members that can not be reached from the cluster center get no pipe.
+        has_pipe = parents != MinimumSpanningTree.NO_PARENT
+        pipe_cost = float(parent_distances[has_pipe].sum()) * self.cheapest_cost_per_m
+        if Config().get_installation_strategy() == "adjacent":
+            pipe_cost += int(has_pipe.sum()) * self.cost_per_penetration
+        return self.fixed_cost + pipe_cost * (1 - self.LOWER_BOUND_TOLERANCE), all_demands
+
+    def calculate_cheapest_cost_per_m(self):
+        costs_per_m = []
+        for pipe_type in self.pipe_type_lookup.pipe_types:
+            if pipe_type is not None:
+                pipe = {'length': 1.0, 'pipe_type': pipe_type}
+                cost_per_m = self.calculate_single_pipe_investment_cost(pipe)
+                # with adjacent installation, trench costs are paid per pipe instead of per meter.
+                if Config().get_installation_strategy() != "adjacent":
+                    cost_per_m += self.calculate_single_trench_cost(pipe)
+                costs_per_m.append(cost_per_m)
+        return min(costs_per_m, default=0.0)
+
+    def compute_fitness(self, positions: np.ndarray, cluster_center_position: int, tree=None):
+        """positions: positions of the members within the instance, including the cluster center."""
+        if len(positions) == 1:
+            return self.fixed_cost, self.instance.get_demands(positions)
+        if tree is None:
+            tree = self.create_tree(positions, cluster_center_position)
+
+        pipe_mass_flows = self.calculate_cumulative_mass_flows(positions, tree)
 
         # Logger().debug(f"pipe flows calculated: {pipe_mass_flows}")
-        pipes, _ = self.pipes_to_construct(tree, pipe_mass_flows)
+        pipes, _ = self.pipes_to_construct(positions, tree, pipe_mass_flows)
         pipe_cost_sum, pipe_cost, trench_cost = self.calculate_pipe_cost(pipes)
 
-        all_demands = self.instance.get_point_demands_per_year(id_subset) * self.life_time_of_heating_source
+        all_demands = self.instance.get_demands_per_year(positions) * self.life_time_of_heating_source
         total_cost = self.fixed_cost + pipe_cost_sum
         # Logger().debug(f"all demands calculated: {all_demands}, total cost: {total_cost}")
         # zero and negative checks to make sure.
         if all_demands <= 0:
             return self.CONSTRAINT_BROKEN_PENALTY, 1
-        # ToDo: be careful!! cluster center id_subset needs to contain cluster center!!
+        # ToDo: be careful!! cluster center positions need to contain cluster center!!
         # fitness =  (self.fixed_cost + pipe_cost_sum) / all_demands
-        # Logger().debug(f"costs and demands calculated for {id_subset} with cluster center {cluster_center_id}: cost: {total_cost}, demand: {all_demands}")
 
         return total_cost, all_demands
 
@@ -80,8 +164,8 @@ class FitnessFunction:
             if cluster_center_id != "-1":
                 members.append(cluster_center_id)
                 (pipe_result, supplied_power, total_pipe_cost, pipe_investment_cost, trench_cost,
-                 total_cost) = self.compute_fitness_result(members,
-                                               cluster_center_id)
+                 total_cost) = self.compute_fitness_result(self.instance.get_positions(members),
+                                               self.instance.building_positions[cluster_center_id])
                 result = {
                     'cluster_center': cluster_center_id,
                     'pipe_result': pipe_result,
@@ -131,81 +215,50 @@ class FitnessFunction:
         }
         return return_value
 
-    def compute_fitness_result(self, id_subset: list, cluster_center_id):
+    def compute_fitness_result(self, positions: np.ndarray, cluster_center_position: int):
         """Use only for end result!"""
-        if len(id_subset) == 1:
-            return ({}, self.instance.get_point_demands(id_subset),
+        if len(positions) == 1:
+            return ({}, self.instance.get_demands(positions),
                     0, 0, 0, self.fixed_cost)
-        subset_graph = self.instance.get_subgraph(id_subset)
-        mst = self.create_mst(subset_graph)
-        tree = self.extract_tree(mst, self.buildings_to_point_dict[cluster_center_id])
-        pipe_mass_flows = self.calculate_cumulative_mass_flows(tree, self.buildings_to_point_dict[cluster_center_id])
-        pipe_mass_flows_result = {}
-        for (u, v), value in pipe_mass_flows.items():
-            from_node = self.points_to_building_dict[u]
-            to_node = self.points_to_building_dict[v]
-            mass_flow = value
-            pipe_mass_flows_result[(from_node, to_node)] = mass_flow
-        pipes, from_to_pipes = self.pipes_to_construct(tree, pipe_mass_flows)
+        tree = self.create_tree(positions, cluster_center_position)
+        pipe_mass_flows = self.calculate_cumulative_mass_flows(positions, tree)
+        pipes, from_to_pipes = self.pipes_to_construct(positions, tree, pipe_mass_flows)
         pipe_result = []
-        for (u, v), value in from_to_pipes.items():
+        for (u, v), (value, mass_flow) in from_to_pipes.items():
             value['from_building'] = u
             value['to_building'] = v
-            value['mass_flow'] = pipe_mass_flows_result[(u, v)]
+            value['mass_flow'] = mass_flow
             pipe_cost, trench_cost = self.calculate_single_pipe_cost(value)
             value['pipe_cost'] = pipe_cost
             value['trench_cost'] = trench_cost
             pipe_result.append(value)
         total_pipe_cost, pipe_investment_cost, trench_cost = self.calculate_pipe_cost(pipes)
         total_cost = total_pipe_cost + self.fixed_cost
-        supplied_power = self.instance.get_point_demands_per_year(id_subset) * self.life_time_of_heating_source
+        supplied_power = self.instance.get_demands_per_year(positions) * self.life_time_of_heating_source
         if supplied_power <= 0:
             total_cost = self.CONSTRAINT_BROKEN_PENALTY
         return pipe_result, supplied_power, total_pipe_cost, pipe_investment_cost, trench_cost, total_cost
 
-    def create_mst(self, subset_graph):
-        mst = nx.minimum_spanning_tree(subset_graph, weight='weight')
-        return mst
-
-    def extract_tree(self, mst, root):
+    def create_tree(self, positions, cluster_center_position):
+        """Returns the minimum spanning tree of the members as parent array, rooted at the cluster center,
+        together with the distances to the parents and the members grouped by depth, deepest first.
+        All arrays are indexed like positions."""
         # We have to make the graph into a tree with a root so that we can
         # calculate the pipe diameters later on.
-        root = root
-        tree = nx.DiGraph()
-        visited = set()
-
-        def dfs(node, parent=None):
-            visited.add(node)
-            if parent is not None:
-                weight = mst.edges[parent, node]['weight']
-                edge_ids = mst.edges[parent, node]['edge_ids']
-                tree.add_edge(parent, node, weight=weight, edge_ids=edge_ids)
-            for neighbor in mst.neighbors(node):
-                if neighbor not in visited:
-                    dfs(neighbor, node)
-        dfs(root)
-        return tree
-
-    def calculate_cumulative_mass_flows(self, tree, heat_source_node):
-        number_of_consumers = defaultdict(lambda: 1)
-        cumulative_demands = self.instance.demands.copy()
-        cumulative_demands = {key: float(value) for key, value in cumulative_demands.items()}
-        for node in nx.dfs_postorder_nodes(tree, source=heat_source_node):
-            for child in tree.successors(node):
-                number_of_consumers[self.points_to_building_dict[node]] += number_of_consumers[self.points_to_building_dict[child]]
-                cumulative_demands[self.points_to_building_dict[node]] += cumulative_demands[self.points_to_building_dict[child]]
-        pipe_mass_flows = {}
-        for u, v in tree.edges():
-            simultaneity_factor = self.calculate_simultaneity_factor(number_of_consumers[self.points_to_building_dict[v]])
-            demand = cumulative_demands[self.points_to_building_dict[v]] * simultaneity_factor
-            mass_flow = mfc.calculate_mass_flow(demand)
-            pipe_mass_flows[(u, v)] = mass_flow
-        if Config().get_log_level() == "debug":
-            transformed_dict = {
-                f"{self.points_to_building_dict[u]} to {self.points_to_building_dict[v]}": value
-                for (u, v), value in pipe_mass_flows.items()
-            }
-            # Logger().debug(f"pipe_mass_flows: {transformed_dict}")
+        parents, parent_distances, depths = self.instance.get_minimum_spanning_tree(positions,
+                                                                                   cluster_center_position)
+        levels = MinimumSpanningTree.get_levels(depths)
+        return parents, parent_distances, levels
+
+    def calculate_cumulative_mass_flows(self, positions, tree):
+        """Returns the mass flow of the pipe from the parent of each member to the member.
+        The pipe supplies the whole subtree of the member."""
+        parents, _, levels = tree
+        demands = self.instance.demand_array[positions]
+        number_of_consumers = MinimumSpanningTree.accumulate_subtree_sums(np.ones(len(positions)), parents, levels)
+        cumulative_demands = MinimumSpanningTree.accumulate_subtree_sums(demands, parents, levels)
+        simultaneity_factors = self.calculate_simultaneity_factor(number_of_consumers)
+        pipe_mass_flows = mfc.calculate_mass_flow(cumulative_demands * simultaneity_factors)
         return pipe_mass_flows
 
     def calculate_simultaneity_factor(self, number_of_consumers):
@@ -218,49 +271,39 @@ class FitnessFunction:
         sf = a + (b / (1 + inner_calc))
         return sf
 
-    def pipes_to_construct(self, network_tree, cumulative_mass_flows):
+    def pipes_to_construct(self, positions, tree, cumulative_mass_flows):
+        """from_to_pipes is keyed by the building ids of both ends of the pipes."""
+        parents, parent_distances, _ = tree
         pipes = []
         from_to_pipes = {}
-        for u, v, data in network_tree.edges(data=True):
-            # Logger().debug(f"creating pipe from {self.points_to_building_dict[u]} to {self.points_to_building_dict[v]}")
+        # members that can not be reached from the cluster center get no pipe.
+        children = np.flatnonzero(parents != MinimumSpanningTree.NO_PARENT).tolist()
+        mass_flows = cumulative_mass_flows[children].tolist()
+        pipe_types = self.compute_pipe_types(mass_flows)
+        for child, mass_flow, pipe_type in zip(children, mass_flows, pipe_types):
+            from_position = positions[parents[child]]
+            to_position = positions[child]
             pipe = {
-                'id': data['edge_ids'],
-                'length': data['weight'],
-                'pipe_type': self.compute_pipe_type(cumulative_mass_flows[(u, v)])}
+                'id': self.instance.get_edge_ids(from_position, to_position),
+                'length': float(parent_distances[child]),
+                'pipe_type': pipe_type}
             pipes.append(pipe)
-            from_to_pipes[(self.points_to_building_dict[u], self.points_to_building_dict[v])] = pipe
+            from_to_pipes[(self.instance.building_ids[from_position],
+                           self.instance.building_ids[to_position])] = (pipe, mass_flow)
         return pipes, from_to_pipes
 
-    # ToDo: This should probably go into the catalogue class, right?
+    def compute_pipe_types(self, mass_flows):
+        """Resolves the pipe types of all edges of a tree in one lookup."""
+        pipe_types = self.pipe_type_lookup.get_pipe_types(mass_flows)
+        for mass_flow, pipe_type in zip(mass_flows, pipe_types):
+            if pipe_type is None:
+                raise Exception(f"No valid mass flow found for {mass_flow}. "
+                                f"It is larger than every mass flow of the pipe diameter catalogue.")
+        return pipe_types
+
     def compute_pipe_type(self, mass_flow):
         # Logger().debug(f"computing pipe type for {mass_flow}")
-        pressure_loss_threshold = 250
-        pdf = self.pipe_diameter_catalogue
-        filtered_pdf = pdf[pdf[self.MASS_FLOW_COL_NAME] >= mass_flow]
-        if filtered_pdf.empty:
-            Logger().error(f"No valid mass flow found for {mass_flow}")
-            return None
-        first_to_undershoot_threshold = filtered_pdf.iloc[0,:]
-        multiple_values = filtered_pdf[filtered_pdf[self.MASS_FLOW_COL_NAME] == first_to_undershoot_threshold[self.MASS_FLOW_COL_NAME]]
-        # We're skipping the first column, since that's the mass flow column.
-        pipe_columns = [col for col in pdf.columns if col != self.MASS_FLOW_COL_NAME]
-        pipe_type = None
-        for row in multiple_values.iterrows():
-            value_found = False
-            for col in pipe_columns:
-                if pd.notna(row[1][col]) and float(
-                        row[1][col]) < pressure_loss_threshold:
-                    selected_column = col
-                    pipe_type = self.pipe_prices[selected_column]
-                    value_found = True
-                    break
-            if value_found:
-                # Logger().debug(f"Calculated pipe type for {mass_flow}: {pipe_type}")
-                break
-        if pipe_type is None:
-            Logger().error(f"No valid mass flow found for {mass_flow}")
-            # ToDo: Raise Exception!
-        return pipe_type
+        return self.compute_pipe_types([mass_flow])[0]
 
     def calculate_pipe_cost(self, pipe_list):
         pipe_costs_sum = 0
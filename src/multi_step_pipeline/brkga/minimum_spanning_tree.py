@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class MinimumSpanningTree:
+    """Prim's algorithm on a dense distance matrix. O(k²) for k members, without any networkx objects."""
+
+    NO_PARENT = -1
+
+    @staticmethod
+    def prim(distance_matrix: np.ndarray, members: np.ndarray, root: int):
+        """
+        Computes the minimum spanning tree of the members, rooted at root.
+
+        :param distance_matrix: distances between all nodes of the instance. inf where there is no edge.
+        :param members: positions of the members in the distance matrix.
+        :param root: position of the root within members.
+        :return: parents, parent_distances and depths, all indexed by the positions within members.
+                 The root and all members that can not be reached from the root have NO_PARENT.
+                 The root has depth 0, members that can not be reached have depth -1.
+        """
+        distances = distance_matrix[np.ix_(members, members)]
+        number_of_members = len(members)
+        parents = np.full(number_of_members, MinimumSpanningTree.NO_PARENT)
+        parent_distances = np.full(number_of_members, np.inf)
+        parent_distances[root] = 0.0
+        depths = np.full(number_of_members, -1)
+        in_tree = np.zeros(number_of_members, dtype=bool)
+        for _ in range(number_of_members):
+            candidate_distances = np.where(in_tree, np.inf, parent_distances)
+            node = int(np.argmin(candidate_distances))
+            if not np.isfinite(candidate_distances[node]):
+                # the remaining members are not connected to the root.
+                break
+            in_tree[node] = True
+            # the parent of a node is final, once the node joins the tree.
+            depths[node] = 0 if node == root else depths[parents[node]] + 1
+            is_closer = ~in_tree & (distances[node] < parent_distances)
+            parent_distances[is_closer] = distances[node][is_closer]
+            parents[is_closer] = node
+        return parents, parent_distances, depths
+
+    @staticmethod
+    def get_levels(depths: np.ndarray):
+        """Groups the members of the tree by depth, deepest level first.
+        Within a level, members keep their order. Members that can not be reached are left out."""
+        order = np.argsort(depths, kind="stable")
+        order = order[depths[order] >= 0]
+        level_starts = np.flatnonzero(np.diff(depths[order])) + 1
+        return np.split(order, level_starts)[::-1]
+
+    @staticmethod
+    def accumulate_subtree_sums(values: np.ndarray, parents: np.ndarray, levels: list):
+        """Sums the values over every subtree, i.e. the value of a member plus the values of all its descendants.
+        Children are added to their parent in the order of their positions."""
+        subtree_sums = np.array(values, dtype=float)
+        # the last level only contains the root.
+        for level in levels[:-1]:
+            np.add.at(subtree_sums, parents[level], subtree_sums[level])
+        return subtree_sums
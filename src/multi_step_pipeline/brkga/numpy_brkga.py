@@ -0,0 +1,166 @@
+import copy
+
+import numpy as np
+from brkga_mp_ipr.enums import BiasFunctionType, Sense
+from brkga_mp_ipr.types import BaseChromosome, BrkgaParams
+
+from .clustering_decoder import ClusteringDecoder
+from .parallel_evaluation import ParallelEvaluation
+
+
+class NumpyBrkga:
+    """BRKGA-MP with every population held as one 2D array of chromosomes.
+
+    Offers the part of the BrkgaMpIpr interface the Brkga class uses. Parents, crossover and mutants are drawn
+    for a whole generation at once, and all new chromosomes of all populations are decoded as one batch.
+    Populations are kept sorted, best chromosome first. Like BrkgaMpIpr, the populations evolve independently,
+    elite chromosomes are never exchanged between them."""
+
+    BIAS_FUNCTIONS = {
+        BiasFunctionType.CONSTANT: lambda ranks, total_parents: np.full(len(ranks), 1.0 / total_parents),
+        BiasFunctionType.CUBIC: lambda ranks, total_parents: ranks ** -3.0,
+        BiasFunctionType.EXPONENTIAL: lambda ranks, total_parents: np.exp(-ranks),
+        BiasFunctionType.LINEAR: lambda ranks, total_parents: 1.0 / ranks,
+        BiasFunctionType.LOGINVERSE: lambda ranks, total_parents: 1.0 / np.log1p(ranks),
+        BiasFunctionType.QUADRATIC: lambda ranks, total_parents: ranks ** -2.0,
+    }
+
+    def __init__(self, decoder: ClusteringDecoder, sense: Sense, seed: int, chromosome_size: int,
+                 params: BrkgaParams, evaluation: ParallelEvaluation = None):
+        self.decoder = decoder
+        self.evaluation = evaluation
+        self.sense = sense
+        self.chromosome_size = chromosome_size
+        self.params = copy.deepcopy(params)
+        self.population_size = params.population_size
+        self.num_populations = params.num_independent_populations
+        self.elite_size = int(params.elite_percentage * params.population_size)
+        self.num_mutants = int(params.mutants_percentage * params.population_size)
+        self.num_offspring = self.population_size - self.elite_size - self.num_mutants
+        self.num_elite_parents = params.num_elite_parents
+        self.num_non_elite_parents = params.total_parents - params.num_elite_parents
+        # like brkga_mp_ipr, non elite parents are never taken from the places the mutants replace.
+        self.num_non_elite_candidates = self.population_size - self.num_mutants - self.elite_size
+        self.validate_params()
+        if params.bias_type not in self.BIAS_FUNCTIONS:
+            raise ValueError(f"Bias type {params.bias_type} is not supported.")
+        bias_weights = self.BIAS_FUNCTIONS[params.bias_type](np.arange(1, params.total_parents + 1, dtype=float),
+                                                             params.total_parents)
+        self.cumulative_bias_probabilities = np.cumsum(bias_weights / bias_weights.sum())
+        """probability, that an allele is inherited from one of the parents up to that rank"""
+        self.rng = np.random.default_rng(seed)
+        self.initial_chromosomes = []
+        self.populations = None
+        """shape (populations, population size, chromosome size), every population sorted by fitness"""
+        self.fitness = None
+        """shape (populations, population size)"""
+        self.generation = 0
+
+    def validate_params(self):
+        if self.elite_size < 1:
+            raise ValueError(f"Elite set size less then one: {self.elite_size}")
+        if self.num_offspring < 0:
+            raise ValueError(f"Elite set size ({self.elite_size}) + mutant set size ({self.num_mutants}) "
+                             f"greater than population size ({self.population_size})")
+        if self.num_elite_parents < 1 or self.num_non_elite_parents < 1:
+            raise ValueError(f"Needs at least one elite and one non elite parent. "
+                             f"num_elite_parents: {self.num_elite_parents}, "
+                             f"total_parents: {self.num_elite_parents + self.num_non_elite_parents}")
+        if self.num_elite_parents > self.elite_size:
+            raise ValueError(f"Number of elite parents ({self.num_elite_parents}) "
+                             f"is greater than elite set ({self.elite_size})")
+        if self.num_offspring and self.num_non_elite_parents > self.num_non_elite_candidates:
+            raise ValueError(f"Number of non elite parents ({self.num_non_elite_parents}) is greater than "
+                             f"the non elite chromosomes that can be mated ({self.num_non_elite_candidates})")
+
+    def set_initial_population(self, chromosomes: list):
+        """The chromosomes are put into the first population. The rest is filled randomly by initialize."""
+        if len(chromosomes) > self.population_size:
+            raise ValueError(f"Number of given chromosomes ({len(chromosomes)}) is larger "
+                             f"than the population size ({self.population_size})")
+        for i, chromosome in enumerate(chromosomes):
+            if len(chromosome) != self.chromosome_size:
+                raise ValueError(f"Error on setting initial population: chromosome {i} does not have the required "
+                                 f"dimension (actual size: {len(chromosome)}, required size: {self.chromosome_size})")
+        self.initial_chromosomes = [np.asarray(chromosome, dtype=float) for chromosome in chromosomes]
+
+    def initialize(self):
+        self.populations = self.rng.random((self.num_populations, self.population_size, self.chromosome_size))
+        for i, chromosome in enumerate(self.initial_chromosomes):
+            self.populations[0, i] = chromosome
+        self.fitness = self.evaluate(
+            self.populations.reshape(-1, self.chromosome_size)).reshape(self.num_populations, self.population_size)
+        for population_index in range(self.num_populations):
+            self.sort_population(population_index)
+        self.generation = 0
+
+    def evolve(self, generations: int = 1):
+        for _ in range(generations):
+            # all offspring and mutants of all populations are decoded in one batch.
+            new_chromosomes = np.stack([self.create_new_chromosomes(population_index)
+                                        for population_index in range(self.num_populations)])
+            new_fitness = self.evaluate(new_chromosomes.reshape(-1, self.chromosome_size))
+            self.populations[:, self.elite_size:] = new_chromosomes
+            self.fitness[:, self.elite_size:] = new_fitness.reshape(self.num_populations, -1)
+            for population_index in range(self.num_populations):
+                self.sort_population(population_index)
+            self.generation += 1
+
+    def create_new_chromosomes(self, population_index: int) -> np.ndarray:
+        """Offspring of the biased crossover followed by the mutants. They replace everything but the elite."""
+        population = self.populations[population_index]
+        elite_parents = self.sample_without_replacement(self.elite_size, self.num_elite_parents)
+        non_elite_parents = self.elite_size + self.sample_without_replacement(self.num_non_elite_candidates,
+                                                                              self.num_non_elite_parents)
+        # the population is sorted, so the positions of the parents are their ranks.
+        parents = np.sort(np.hstack([elite_parents, non_elite_parents]), axis=1)
+        # roulette per allele over the ranks of the parents.
+        tosses = self.rng.random((self.num_offspring, self.chromosome_size))
+        inherited_from = np.minimum(np.searchsorted(self.cumulative_bias_probabilities, tosses, side="left"),
+                                    len(self.cumulative_bias_probabilities) - 1)
+        parent_positions = np.take_along_axis(parents, inherited_from, axis=1)
+        offspring = population[parent_positions, np.arange(self.chromosome_size)]
+        mutants = self.rng.random((self.num_mutants, self.chromosome_size))
+        return np.vstack([offspring, mutants])
+
+    def sample_without_replacement(self, number_of_candidates: int, sample_size: int) -> np.ndarray:
+        """sample_size distinct positions out of range(number_of_candidates) for every offspring."""
+        if not self.num_offspring:
+            return np.empty((0, sample_size), dtype=int)
+        if sample_size == number_of_candidates:
+            return np.tile(np.arange(number_of_candidates), (self.num_offspring, 1))
+        keys = self.rng.random((self.num_offspring, number_of_candidates))
+        return np.argpartition(keys, sample_size - 1, axis=1)[:, :sample_size]
+
+    def evaluate(self, chromosomes: np.ndarray) -> np.ndarray:
+        if self.evaluation is not None:
+            fitness_values = self.evaluation.evaluate(chromosomes)
+        else:
+            fitness_values = self.decoder.decode_batch(chromosomes)
+        return np.asarray(fitness_values, dtype=float)
+
+    def sort_population(self, population_index: int):
+        fitness = self.fitness[population_index]
+        order = np.argsort(-fitness if self.sense == Sense.MAXIMIZE else fitness, kind="stable")
+        self.populations[population_index] = self.populations[population_index][order]
+        self.fitness[population_index] = fitness[order]
+
+    def get_best_position(self):
+        """(population, 0) of the population with the best chromosome."""
+        best_per_population = self.fitness[:, 0]
+        if self.sense == Sense.MAXIMIZE:
+            return int(np.argmax(best_per_population)), 0
+        return int(np.argmin(best_per_population)), 0
+
+    def get_worst_elite_fitness(self) -> float:
+        """Worst fitness within the elite sets of all populations."""
+        worst_elite_per_population = self.fitness[:, self.elite_size - 1]
+        if self.sense == Sense.MAXIMIZE:
+            return float(np.min(worst_elite_per_population))
+        return float(np.max(worst_elite_per_population))
+
+    def get_best_fitness(self) -> float:
+        return float(self.fitness[self.get_best_position()])
+
+    def get_best_chromosome(self) -> BaseChromosome:
+        return BaseChromosome(self.populations[self.get_best_position()].tolist())
@@ -0,0 +1,63 @@
+import numpy as np
+
+from .clustering_decoder import ClusteringDecoder
+from ...util.process_pool import ProcessPool
+
+# decoder of the worker process. Set once when the worker gets forked.
+_worker_decoder = None
+
+
+def _initialize_worker(decoder: ClusteringDecoder):
+    global _worker_decoder
+    _worker_decoder = decoder
+
+
+def _decode_batch_in_worker(chromosomes, pruning_threshold):
+    _worker_decoder.pruning_threshold = pruning_threshold
+    fitness_function = _worker_decoder.fitness_function
+    cache_hits, cache_misses = fitness_function.cache_hits, fitness_function.cache_misses
+    clusters, reused_clusters = _worker_decoder.number_of_clusters, _worker_decoder.number_of_reused_clusters
+    pruned_decodes = _worker_decoder.number_of_pruned_decodes
+    fitness_values = _worker_decoder.decode_batch(chromosomes)
+    return (fitness_values,
+            fitness_function.cache_hits - cache_hits,
+            fitness_function.cache_misses - cache_misses,
+            _worker_decoder.number_of_clusters - clusters,
+            _worker_decoder.number_of_reused_clusters - reused_clusters,
+            _worker_decoder.number_of_pruned_decodes - pruned_decodes)
+
+
+class ParallelEvaluation:
+    """Decodes batches of chromosomes in a process pool.
+    The workers are forked once and keep their own copy of the decoder, i.e. of the instance
+    with its distance matrix, the pipe catalogue and the cluster cost cache.
+    Only the chromosomes and the fitness values are sent between the processes."""
+
+    def __init__(self, decoder: ClusteringDecoder, workers: int):
+        self.decoder = decoder
+        self.workers = workers
+        self.executor = ProcessPool.create_executor(workers, "Decoding chromosomes",
+                                                    initializer=_initialize_worker, initargs=(decoder,))
+
+    def evaluate(self, chromosomes) -> list[float]:
+        """Returns the fitness values in the order of the chromosomes."""
+        if not len(chromosomes):
+            return []
+        batches = np.array_split(np.asarray(chromosomes, dtype=float), min(self.workers, len(chromosomes)))
+        fitness_values = []
+        fitness_function = self.decoder.fitness_function
+        pruning_thresholds = [self.decoder.pruning_threshold] * len(batches)
+        for (batch_fitness_values, cache_hits, cache_misses, clusters, reused_clusters,
+             pruned_decodes) in self.executor.map(_decode_batch_in_worker, batches, pruning_thresholds):
+            fitness_values.extend(batch_fitness_values)
+            # the statistics of the caches of all workers are reported by the decoder of the main process.
+            fitness_function.cache_hits += cache_hits
+            fitness_function.cache_misses += cache_misses
+            self.decoder.number_of_clusters += clusters
+            self.decoder.number_of_reused_clusters += reused_clusters
+            self.decoder.number_of_pruned_decodes += pruned_decodes
+        self.decoder.number_of_decodes += len(chromosomes)
+        return fitness_values
+
+    def shutdown(self):
+        self.executor.shutdown()
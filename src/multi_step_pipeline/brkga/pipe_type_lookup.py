@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+
+class PipeTypeLookup:
+    """The pipe diameter catalogue compiled into a sorted array of mass flow thresholds.
+    Every threshold is mapped to the pipe type of the first pipe whose pressure loss stays below
+    PRESSURE_LOSS_THRESHOLD at that mass flow, so a pipe type can be resolved with np.searchsorted."""
+
+    MASS_FLOW_COL_NAME = "Volumenstrom"
+    PRESSURE_LOSS_THRESHOLD = 250
+
+    def __init__(self, pipe_diameter_catalogue: pd.DataFrame, pipe_prices: dict):
+        mass_flows = pipe_diameter_catalogue[self.MASS_FLOW_COL_NAME].to_numpy(dtype=float)
+        pipe_columns = [col for col in pipe_diameter_catalogue.columns if col != self.MASS_FLOW_COL_NAME]
+        pressure_losses = pipe_diameter_catalogue[pipe_columns].to_numpy(dtype=float)
+        # nan means, that the pipe is not suitable for the mass flow. nan < threshold is False.
+        is_valid = pressure_losses < self.PRESSURE_LOSS_THRESHOLD
+        self.mass_flow_thresholds = np.unique(mass_flows)
+        self.pipe_types = []
+        """Pipe type per mass flow threshold, None if no pipe is valid at that mass flow.
+        The last entry is None for mass flows above the largest threshold."""
+        for mass_flow_threshold in self.mass_flow_thresholds:
+            pipe_type = None
+            # rows are checked in the order of the catalogue, columns from left to right.
+            for row in np.flatnonzero(mass_flows == mass_flow_threshold):
+                valid_columns = np.flatnonzero(is_valid[row])
+                if valid_columns.size:
+                    pipe_type = pipe_prices[pipe_columns[valid_columns[0]]]
+                    break
+            self.pipe_types.append(pipe_type)
+        self.pipe_types.append(None)
+
+    def get_pipe_type_indices(self, mass_flows):
+        """Index of the smallest mass flow threshold that is greater than or equal to each mass flow."""
+        return np.searchsorted(self.mass_flow_thresholds, np.asarray(mass_flows, dtype=float), side="left")
+
+    def get_pipe_types(self, mass_flows):
+        """Resolves the pipe types of all given mass flows at once. Unresolvable mass flows get None."""
+        return [self.pipe_types[index] for index in self.get_pipe_type_indices(mass_flows)]
+
+    def get_pipe_type(self, mass_flow):
+        return self.pipe_types[int(self.get_pipe_type_indices(mass_flow))]
@@ -0,0 +1,111 @@
+import json
+import os
+
+import numpy as np
+from brkga_mp_ipr.types_io import load_configuration
+
+from .brkga.brkga import Brkga
+from .cluster_job import ClusterJob
+from ..util.config import Config
+from ..util.logger import Logger
+
+
+class ClusterCostModel:
+    """Estimates the runtime of the brkga for a cluster, so that the second stage can schedule the largest jobs first.
+    The number of evaluations follows from the population size, the time per evaluation grows linearly with the
+    chromosome size. Both are calibrated with the measurements of previous runs."""
+
+    MAX_HISTORY_LENGTH = 200
+    # used as long as there is no history. Only the ordering of the estimates matters then.
+    DEFAULT_SECONDS_PER_EVALUATION_AND_GENE = 1e-5
+
+    def __init__(self):
+        self.brkga_params, _ = load_configuration(Brkga.CONFIG_FILE_PATH)
+        self.history_file_path = Config().get_runtime_history_file_path()
+        self.history = self.load_history()
+
+    def load_history(self):
+        if not os.path.isfile(self.history_file_path):
+            return []
+        try:
+            with open(self.history_file_path, "r") as history_file:
+                return json.load(history_file)
+        except (OSError, ValueError):
+            Logger().warning(f"Runtime history {self.history_file_path} could not be read. Starting a new one.")
+            return []
+
+    def save_history(self):
+        os.makedirs(os.path.dirname(self.history_file_path), exist_ok=True)
+        with open(self.history_file_path, "w") as history_file:
+            json.dump(self.history[-self.MAX_HISTORY_LENGTH:], history_file, indent=2)
+
+    @staticmethod
+    def get_chromosome_size(cluster_job: ClusterJob):
+        pivot_count = {"none": 0, "single": 1, "double": 2}[cluster_job.pivot_element]
+        return len(cluster_job.demands) + pivot_count
+
+    def get_population_size(self, chromosome_size):
+        return int(chromosome_size * Config().get_population_factor())
+
+    def get_num_independent_populations(self, cluster_job: ClusterJob):
+        if cluster_job.num_independent_populations is not None:
+            return cluster_job.num_independent_populations
+        return self.brkga_params.num_independent_populations
+
+    def estimate_evaluations(self, cluster_job: ClusterJob):
+        chromosome_size = self.get_chromosome_size(cluster_job)
+        individuals = self.get_population_size(chromosome_size) * self.get_num_independent_populations(cluster_job)
+        if self.history:
+            evaluations_per_individual = float(np.median([entry["evaluations"] / entry["individuals"]
+                                                          for entry in self.history]))
+        else:
+            # every generation evaluates all non elite chromosomes. The run stops after num-generations-to-break
+            # generations without improvement, so we assume twice as many generations.
+            generations = 2 * Config().get_num_generations_to_break()
+            evaluations_per_individual = 1 + generations * (1 - self.brkga_params.elite_percentage)
+        return individuals * evaluations_per_individual
+
+    def get_seconds_per_evaluation_and_gene(self):
+        if not self.history:
+            return self.DEFAULT_SECONDS_PER_EVALUATION_AND_GENE
+        return float(np.median([entry["seconds"] / (entry["evaluations"] * entry["chromosome_size"])
+                                for entry in self.history]))
+
+    def estimate_seconds(self, cluster_job: ClusterJob):
+        return (self.estimate_evaluations(cluster_job) * self.get_chromosome_size(cluster_job)
+                * self.get_seconds_per_evaluation_and_gene())
+
+    def record(self, cluster_job: ClusterJob, evaluations, seconds):
+        """Adds the measurements of a finished job to the history. Call save_history() afterwards."""
+        if not evaluations or seconds <= 0:
+            return
+        chromosome_size = self.get_chromosome_size(cluster_job)
+        self.history.append({
+            "chromosome_size": chromosome_size,
+            "individuals": self.get_population_size(chromosome_size)
+                           * self.get_num_independent_populations(cluster_job),
+            "evaluations": evaluations,
+            "seconds": seconds
+        })
+
+    def schedule(self, cluster_jobs, workers):
+        """Orders the jobs by their estimated runtime, largest first (LPT).
+        Jobs that alone take longer than an evenly distributed share of all jobs per worker
+        optionally get additional independent populations.
+
+        :param cluster_jobs: list of (position, ClusterJob).
+        :param workers: number of worker processes.
+        :return: the reordered list of (position, ClusterJob).
+        """
+        extra_populations = Config().get_extra_populations_for_large_clusters()
+        estimates = {position: self.estimate_seconds(cluster_job) for position, cluster_job in cluster_jobs}
+        share_per_worker = sum(estimates.values()) / workers
+        scheduled_jobs = sorted(cluster_jobs, key=lambda job: estimates[job[0]], reverse=True)
+        for position, cluster_job in scheduled_jobs:
+            if extra_populations and len(cluster_jobs) > 1 and estimates[position] >= share_per_worker:
+                cluster_job.num_independent_populations = (self.brkga_params.num_independent_populations
+                                                           + extra_populations)
+                Logger().info(f"Cluster {cluster_job.cluster_id} dominates the runtime and gets "
+                              f"{cluster_job.num_independent_populations} independent populations.")
+            Logger().debug(f"Cluster {cluster_job.cluster_id}: estimated runtime {estimates[position]:.1f} seconds.")
+        return scheduled_jobs
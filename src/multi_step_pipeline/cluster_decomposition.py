@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+import numpy as np
+from scipy.sparse import coo_matrix, diags
+from scipy.sparse.linalg import eigsh
+
+from ..util.config import Config
+from ..util.logger import Logger
+from ..util.function_timer import FunctionTimer
+
+
+class ClusterDecomposition:
+    """Stage between the first and the second clustering stage.
+    Clusters of the first stage that are larger than max-cluster-size are recursively bisected
+    into independent sub clusters, so that every brkga instance stays bounded in size.
+    The bisection uses the Fiedler vector of the shortest path graph between the members (spectral bisection)."""
+    function_timer = FunctionTimer()
+    EIGENVALUE_SHIFT = 1e-6
+    """the laplacian is positive semi definite, so shift-invert slightly below zero yields its smallest eigenvalues."""
+
+    shortest_path_graph = None
+    graph_translation_dict = None
+    first_stage_cluster_dict = None
+    ready_to_start = False
+    non_members = None
+    """building ids that are in no decomposed cluster, like the noise of the first stage"""
+
+    def set_required_fields(self, shortest_path_graph, graph_translation_dict, first_stage_cluster_dict):
+        self.shortest_path_graph = shortest_path_graph
+        self.graph_translation_dict = graph_translation_dict
+        self.first_stage_cluster_dict = first_stage_cluster_dict
+        self.ready_to_start = True
+
+    @function_timer.timed_function
+    def start(self):
+        """Returns the clusters in the same format as the first stage: cluster id : list of building ids.
+        Buildings that end up in no cluster are left out, like the noise of the first stage, and kept in non_members."""
+        if not self.ready_to_start:
+            raise Exception("Required fields of cluster decomposition have not been set.")
+        self.non_members = []
+        max_cluster_size = Config().get_max_cluster_size()
+        if not max_cluster_size:
+            return self.first_stage_cluster_dict
+        result = defaultdict(list)
+        for cluster_id, cluster_members in self.first_stage_cluster_dict.items():
+            if len(cluster_members) <= max_cluster_size:
+                result[len(result)] = list(cluster_members)
+                continue
+            distance_matrix = self.create_distance_matrix(cluster_members)
+            parts = self.bisect_recursively(np.arange(len(cluster_members)), distance_matrix, max_cluster_size)
+            if Config().get_do_boundary_repair():
+                parts = self.repair_boundaries(parts, distance_matrix, max_cluster_size)
+            parts, dropped_members = self.merge_single_building_parts(parts, distance_matrix, max_cluster_size)
+            for part in parts:
+                result[len(result)] = [cluster_members[i] for i in part]
+            if dropped_members:
+                dropped_building_ids = [cluster_members[i] for i in dropped_members]
+                Logger().warning(f"Cluster {cluster_id}: {len(dropped_building_ids)} buildings are in no decomposed "
+                                 f"cluster, because no cluster they are connected to has room left. "
+                                 f"They are not supplied: {dropped_building_ids}")
+                self.non_members.extend(dropped_building_ids)
+            Logger().info(f"Cluster {cluster_id} with {len(cluster_members)} buildings has been decomposed "
+                          f"into {len(parts)} clusters.")
+        return result
+
+    def create_distance_matrix(self, cluster_members):
+        """Shortest path distances between the members. Members without a connecting path are infinitely far apart."""
+        nodes = [self.graph_translation_dict[member] for member in cluster_members]
+        positions = {node: position for position, node in enumerate(nodes)}
+        distance_matrix = np.full((len(nodes), len(nodes)), np.inf)
+        np.fill_diagonal(distance_matrix, 0.0)
+        for u, v, data in self.shortest_path_graph.subgraph(nodes).edges(data=True):
+            distance_matrix[positions[u], positions[v]] = data['weight']
+            distance_matrix[positions[v], positions[u]] = data['weight']
+        return distance_matrix
+
+    def bisect_recursively(self, members, distance_matrix, max_cluster_size):
+        """members are positions in the distance matrix.
+        The halves are sized for the number of parts the members need, so all parts end up with about the same size
+        and single building parts only remain if max_cluster_size is 2."""
+        if len(members) <= max_cluster_size:
+            return [members]
+        number_of_parts = -(-len(members) // max_cluster_size)
+        first_half_size = len(members) * (number_of_parts // 2) // number_of_parts
+        first_half, second_half = self.spectral_bisection(members, distance_matrix, first_half_size)
+        return (self.bisect_recursively(first_half, distance_matrix, max_cluster_size)
+                + self.bisect_recursively(second_half, distance_matrix, max_cluster_size))
+
+    @classmethod
+    def spectral_bisection(cls, members, distance_matrix, first_half_size=None):
+        """Splits the members along the Fiedler vector of the gaussian affinity graph, by default at its median,
+        which yields two halves with few strong connections between them.
+        Only members connected in the shortest path graph have an affinity, so the laplacian is sparse."""
+        distances = distance_matrix[np.ix_(members, members)]
+        is_edge = np.isfinite(distances)
+        np.fill_diagonal(is_edge, False)
+        rows, columns = np.nonzero(is_edge)
+        edge_distances = distances[rows, columns]
+        positive_distances = edge_distances[edge_distances > 0]
+        sigma = float(np.median(positive_distances)) if positive_distances.size else 1.0
+        affinity = coo_matrix((np.exp(-(edge_distances / sigma) ** 2), (rows, columns)),
+                              shape=distances.shape).tocsc()
+        laplacian = diags(np.asarray(affinity.sum(axis=1)).ravel()) - affinity
+        # the constant vector is an eigenvector, so it must not be the start vector. A fixed one keeps runs repeatable.
+        start_vector = np.random.default_rng(0).random(len(members))
+        eigenvalues, eigenvectors = eigsh(laplacian, k=2, sigma=-cls.EIGENVALUE_SHIFT, which="LM", v0=start_vector)
+        fiedler_vector = eigenvectors[:, np.argsort(eigenvalues)[1]]
+        # the sign of an eigenvector is arbitrary, but decides which members end up in the first half.
+        if fiedler_vector[np.argmax(np.abs(fiedler_vector))] < 0:
+            fiedler_vector = -fiedler_vector
+        order = np.argsort(fiedler_vector, kind="stable")
+        half = len(members) // 2 if first_half_size is None else first_half_size
+        return members[np.sort(order[:half])], members[np.sort(order[half:])]
+
+    @staticmethod
+    def repair_boundaries(parts, distance_matrix, max_cluster_size):
+        """Single pass that moves members to the part with the closest medoid,
+        as long as the target part does not exceed max_cluster_size."""
+        part_of_member = {}
+        for part_id, part in enumerate(parts):
+            for member in part:
+                part_of_member[int(member)] = part_id
+        medoids = [int(part[np.argmin(distance_matrix[np.ix_(part, part)].sum(axis=1))]) for part in parts]
+        part_sizes = [len(part) for part in parts]
+        moved_members = 0
+        for member, part_id in sorted(part_of_member.items()):
+            if member in medoids or part_sizes[part_id] <= 2:
+                continue
+            medoid_distances = distance_matrix[member, medoids]
+            closest_part_id = int(np.argmin(medoid_distances))
+            if (medoid_distances[closest_part_id] < medoid_distances[part_id]
+                    and part_sizes[closest_part_id] < max_cluster_size):
+                part_of_member[member] = closest_part_id
+                part_sizes[part_id] -= 1
+                part_sizes[closest_part_id] += 1
+                moved_members += 1
+        repaired_parts = [[] for _ in parts]
+        for member, part_id in sorted(part_of_member.items()):
+            repaired_parts[part_id].append(member)
+        # members are only moved, never dropped.
+        Logger().info(f"Boundary repair moved {moved_members} buildings.")
+        return [np.array(part) for part in repaired_parts]
+
+    @staticmethod
+    def merge_single_building_parts(parts, distance_matrix, max_cluster_size):
+        """The first stage does not accept clusters of a single building.
+        Single buildings join the part of their closest connected building, if it has room left. Otherwise they are
+        dropped, like single building clusters of the first stage.
+        Returns the parts and the dropped members."""
+        merged_parts = [list(part) for part in parts if len(part) > 1]
+        dropped_members = []
+        for member in sorted(int(part[0]) for part in parts if len(part) == 1):
+            closest_part_id = None
+            closest_distance = np.inf
+            for part_id, part in enumerate(merged_parts):
+                if len(part) >= max_cluster_size:
+                    continue
+                distance = float(np.min(distance_matrix[member, part]))
+                if distance < closest_distance:
+                    closest_part_id, closest_distance = part_id, distance
+            if closest_part_id is None:
+                dropped_members.append(member)
+                continue
+            merged_parts[closest_part_id].append(member)
+        return [np.array(sorted(part)) for part in merged_parts], dropped_members
@@ -0,0 +1,50 @@
+import time
+from dataclasses import dataclass
+
+import networkx as nx
+
+from .brkga.brkga_api import BrkgaAPI
+
+
+@dataclass
+class ClusterJob:
+    """Everything the brkga needs for a single first stage cluster.
+    Holds no layers or QGIS objects, so it can be pickled and run in a worker process."""
+
+    cluster_id: int
+    graph: nx.Graph
+    """Subgraph of the shortest path graph between the members. Its nodes are the building ids."""
+    max_capacity: float
+    demands: dict
+    yearly_demands: dict
+    members: list
+    number_of_clusters: int
+    warm_start: dict
+    total_distance: float
+    pivot_element: str
+    num_independent_populations: int = None
+    """Overrides the number of independent populations of the brkga config, if set."""
+
+    def run(self):
+        """Returns the result of the brkga, the number of evaluated chromosomes and the elapsed seconds."""
+        start_time = time.time()
+        id_to_node_translation_dict = {member: member for member in self.members}
+        brkga_api = BrkgaAPI()
+        result = brkga_api.do_brkga(graph=self.graph,
+                                   max_capacity=self.max_capacity,
+                                   demands=self.demands,
+                                   yearly_demands=self.yearly_demands,
+                                   num_clusters=self.number_of_clusters,
+                                   members=self.members,
+                                   warm_start=self.warm_start,
+                                   total_distance=self.total_distance,
+                                   total_member_list=self.members,
+                                   id_to_node_translation_dict=id_to_node_translation_dict,
+                                   pivot_element=self.pivot_element,
+                                   num_independent_populations=self.num_independent_populations)
+        return result, brkga_api.number_of_evaluations, time.time() - start_time
+
+
+def run_cluster_job(job: ClusterJob):
+    """Entry point of the worker processes."""
+    return job.run()
@@ -2,18 +2,24 @@ from collections import defaultdict
 from typing import Dict, List
 import time
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import radius_neighbors_graph
 from qgis.core import (QgsVectorLayer, QgsField, QgsProject,
                        QgsSymbol, QgsRendererCategory,
                        QgsCategorizedSymbolRenderer, QgsFeature,
-                       QgsFeatureRequest)
+                       QgsFeatureRequest, QgsSpatialIndex)
 from PyQt5.QtCore import QVariant
 from PyQt5.QtGui import QColor
 
 from ..util.logger import Logger
 from ..util.config import Config
 from ..util.dhp_utility import DhpUtility
+from ..util.feature_id_index import FeatureIdIndex
+from ..util.previous_run_results import PreviousRunResults
 from ..util.function_timer import FunctionTimer
+from ..util.results_saver import ResultsSaver
 import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
 import pandas as pd
 import random
 import matplotlib.pyplot as plt
@@ -27,7 +33,7 @@ class ClusteringFirstStage:
     building_centroids: QgsVectorLayer = None
     buildings_layer: QgsVectorLayer = None
     distance_measuring_method = ""
-    selected_buildings_expression: str = None
+    selected_buildings_request: QgsFeatureRequest = None
     ready_to_start: bool = False
     plot_buildings: bool = False
 
@@ -64,7 +70,7 @@ class ClusteringFirstStage:
 
     def start(self):
         if self.ready_to_start:
-            self.selected_buildings_expression = self.prepare_filter_expression()
+            self.selected_buildings_request = self.prepare_filter_request()
             cluster_weights = self.calculate_cluster_weights()
             min_samples = self.calculate_min_samples()
             Logger().debug(f"min_samples: {min_samples}")
@@ -74,19 +80,17 @@ class ClusteringFirstStage:
                 clustering_result = self.do_clustering(data, min_samples)
             if self.distance_measuring_method == "nearest_point" or self.distance_measuring_method == "custom":
                 if self.distance_measuring_method == "nearest_point":
-                    distances_list, amount_of_features, osm_ids = self.calculate_distances_between_points()
-                    distance_matrix = self.construct_distance_matrix(distances_list, amount_of_features)
-                    distance_matrix = self.adjust_transient_connections(distance_matrix, amount_of_features)
-                    distance_df = self.construct_distance_matrix_df(distance_matrix, osm_ids)
-                    cluster_weights_custom = self.map_cluster_weights_to_labels(self.id_labels, cluster_weights)
+                    distance_matrix, osm_ids = self.calculate_distances_between_points()
+                    cluster_weights_custom = self.map_cluster_weights_to_labels(osm_ids, cluster_weights)
+                    clustering_result = self.cluster_transient_connections(distance_matrix, osm_ids, min_samples,
+                                                                           cluster_weights_custom)
                 elif self.distance_measuring_method == "custom" and self.adjacency_matrix is not None and self.id_labels is not None:
-                    distance_df = self.construct_distance_matrix_df(self.adjacency_matrix, self.id_labels)
                     cluster_weights_custom = self.map_cluster_weights_to_labels(self.id_labels, cluster_weights)
+                    clustering_result = self.do_clustering_with_custom_metric(self.adjacency_matrix, self.id_labels,
+                                                                              min_samples, cluster_weights_custom)
                 else:
                     raise Exception("Invalid parameters in first stage clustering.")
 
-                clustering_result = self.do_clustering_with_custom_metric(distance_df, min_samples, cluster_weights_custom)
-
             output_layer = self.prepare_output_layer_for_visualization(clustering_result)
             renderer = self.create_unique_cluster_colors_renderer(
                 clustering_result[self.CLUSTER_RESULTS_CLUSTER_COL_NAME].values,
@@ -96,6 +100,90 @@ class ClusteringFirstStage:
             results = self.prepare_return(clustering_result)
             return results
 
+    @function_timer.timed_function
+    def sweep(self, eps_values, heat_capacities=None, minimum_heat_capacity_exhaustions=None, save_results=False):
+        """
+        Evaluates the clustering for every combination of the given parameters, e.g. for calibration.
+        The neighborhood structure is only calculated once for the largest eps and then reused,
+        as every smaller eps only considers a subset of it. Nothing gets visualized.
+
+        :param eps_values: eps values to evaluate.
+        :param heat_capacities: heat capacities to evaluate. Defaults to the configured one.
+        :param minimum_heat_capacity_exhaustions: exhaustions in percent to evaluate. Defaults to the configured one.
+        :param save_results: whether or not to save the statistics in the results folder.
+        :return: list of cluster statistics, one per parameter combination.
+        """
+        if not self.ready_to_start:
+            raise Exception("Required fields of first stage clustering have not been set.")
+        if heat_capacities is None:
+            heat_capacities = [Config().get_heat_capacity()]
+        if minimum_heat_capacity_exhaustions is None:
+            minimum_heat_capacity_exhaustions = [Config().get_minimum_heat_capacity_exhaustion()]
+        self.selected_buildings_request = self.prepare_filter_request()
+        cluster_weights = self.calculate_cluster_weights()
+        neighborhood_graph, labels = self.calculate_neighborhood_graph(max(eps_values))
+        weights = self.map_cluster_weights_to_labels(labels, cluster_weights)
+
+        statistics = []
+        for eps in sorted(eps_values):
+            for heat_capacity in heat_capacities:
+                for minimum_heat_capacity_exhaustion in minimum_heat_capacity_exhaustions:
+                    min_samples = self.calculate_min_samples(heat_capacity, minimum_heat_capacity_exhaustion)
+                    if self.distance_measuring_method == "nearest_point":
+                        clustering_result = self.cluster_transient_connections(neighborhood_graph, labels,
+                                                                               min_samples, weights, eps)
+                    else:
+                        clustering_result = self.do_clustering_with_custom_metric(neighborhood_graph, labels,
+                                                                                  min_samples, weights, eps)
+                    statistics.append({
+                        "eps": float(eps),
+                        "heat_capacity": float(heat_capacity),
+                        "minimum_heat_capacity_exhaustion": float(minimum_heat_capacity_exhaustion),
+                        "min_samples": min_samples,
+                        **self.calculate_cluster_statistics(clustering_result, cluster_weights)
+                    })
+        if save_results:
+            ResultsSaver.save_result("first_stage_sweep", True, statistics=statistics)
+        return statistics
+
+    def calculate_neighborhood_graph(self, eps):
+        """Sparse distance matrix of all building pairs within eps, depending on the distance measuring method.
+        Returns the matrix and the building ids of its rows."""
+        if self.distance_measuring_method == "centroids":
+            data = self.prepare_data_for_clustering(self.calculate_cluster_weights())
+            labels = [point['id'] for point in data]
+            features = np.array([[point['x'], point['y']] for point in data])
+            neighborhood_graph = radius_neighbors_graph(features, radius=eps, mode="distance")
+            return neighborhood_graph, labels
+        if self.distance_measuring_method == "nearest_point":
+            return self.calculate_distances_between_points(eps)
+        if self.distance_measuring_method == "custom" and self.adjacency_matrix is not None \
+                and self.id_labels is not None:
+            distance_matrix = sparse.coo_matrix(self.adjacency_matrix)
+            within_eps = distance_matrix.data <= eps
+            neighborhood_graph = sparse.csr_matrix((distance_matrix.data[within_eps],
+                                                    (distance_matrix.row[within_eps],
+                                                     distance_matrix.col[within_eps])),
+                                                   shape=distance_matrix.shape)
+            return neighborhood_graph, self.id_labels
+        raise Exception("Invalid parameters in first stage clustering.")
+
+    def calculate_cluster_statistics(self, clustering_result, cluster_weights):
+        """Statistics of the clusters that would be passed on to the second stage."""
+        clusters = self.prepare_return(clustering_result)
+        cluster_sizes = [len(building_ids) for building_ids in clusters.values()]
+        clustered_demand = sum(cluster_weights[building_id]
+                               for building_ids in clusters.values() for building_id in building_ids)
+        total_demand = sum(cluster_weights.values())
+        return {
+            "number_of_clusters": len(clusters),
+            "clustered_buildings": int(sum(cluster_sizes)),
+            "unclustered_buildings": len(clustering_result) - int(sum(cluster_sizes)),
+            "clustered_demand_share": clustered_demand / total_demand if total_demand else 0.0,
+            "mean_cluster_size": float(np.mean(cluster_sizes)) if cluster_sizes else 0.0,
+            "max_cluster_size": max(cluster_sizes, default=0)
+        }
+
     @function_timer.timed_function
     def prepare_data_for_clustering(self, weight_dict):
         prepared_data = []
@@ -117,57 +205,69 @@ class ClusteringFirstStage:
         return prepared_data
 
     @function_timer.timed_function
-    def calculate_distances_between_points(self):
-        """Calculates nearest points for all elements present in filtered buildings layer."""
-        # we need two iterators.
-        features = self.buildings_layer.getFeatures(self.selected_buildings_expression)
-        features_list = DhpUtility.convert_iterator_to_list(features)
-        features_list_length = len(features_list)
-        distances_between_buildings = []
+    def calculate_distances_between_points(self, eps=None):
+        """Calculates the nearest point distances between all buildings present in the filtered buildings layer.
+        Only pairs whose bounding boxes lie within eps of each other are measured, all other pairs are
+        too far apart to ever be neighbors. Returns a sparse, symmetric distance matrix.
+        Distances of 0 are stored explicitly, as touching buildings are neighbors.
+        With reuse-previous-results, distances between buildings that did not change since the previous run
+        are reused."""
+        eps = float(Config().get_eps()) if eps is None else float(eps)
+        reuse_previous_results = Config().get_reuse_previous_results()
+        osm_id_idx = self.buildings_layer.fields().indexFromName(self.SHARED_ID_FIELD_NAME)
+        request = QgsFeatureRequest(self.selected_buildings_request)
+        request.setSubsetOfAttributes([osm_id_idx])
+        spatial_index = QgsSpatialIndex(flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+        positions = {}
         osm_ids = []
-        for i in range(features_list_length):
-            feature_i = features_list[i]
-            feature_i_osm_id = DhpUtility.get_value_from_field(self.buildings_layer, feature_i, "osm_id")
-            osm_ids.append(feature_i_osm_id)
-            for j in range(i + 1, features_list_length):
-                feature_j = features_list[j]
-                geometry_i = feature_i.geometry()
-                geometry_j = feature_j.geometry()
-                distance = geometry_i.distance(geometry_j)
-                feature_i_osm_id = DhpUtility.get_value_from_field(self.buildings_layer, feature_i, "osm_id")
-                feature_j_osm_id = DhpUtility.get_value_from_field(self.buildings_layer, feature_j, "osm_id")
-                distance_entry = {
-                    "feature_i_osm_id": feature_i_osm_id,
-                    "feature_j_osm_id": feature_j_osm_id,
-                    "distance": distance
-                }
-                distances_between_buildings.append(distance_entry)
-                self.log_distances_between_geometries(feature_i, feature_j, distance, self.buildings_layer,
-                                                      "osm_id")
-        return distances_between_buildings, features_list_length, osm_ids
-
-    @function_timer.timed_function
-    def construct_distance_matrix(self, distances_between_geometries, amount_of_features):
-        condensed_distances = [i["distance"] for i in distances_between_geometries]
-        condensed_labels = [i["feature_i_osm_id"] for i in distances_between_geometries]
-        distance_matrix = np.zeros((amount_of_features, amount_of_features))
-        labels = []
-        k = 0
-        for i in range(amount_of_features):
-            for j in range(i + 1, amount_of_features):
-                distance_matrix[i, j] = condensed_distances[k]
-                labels.append(condensed_labels[k])
-                k += 1
-        distance_matrix = distance_matrix + distance_matrix.T
-        if not np.allclose(distance_matrix, distance_matrix.T):
-            raise Exception("Distance matrix is not symmetric. Error in distance matrix calculation.")
-        return distance_matrix
-
-    @function_timer.timed_function
-    def construct_distance_matrix_df(self, distance_matrix, label_names):
-        distance_df = pd.DataFrame(distance_matrix, index=label_names, columns=label_names)
-        # Logger().debug(distance_df)
-        return distance_df
+        geometry_hashes = {}
+        for feature in self.buildings_layer.getFeatures(request):
+            positions[feature.id()] = len(osm_ids)
+            osm_ids.append(feature[osm_id_idx])
+            spatial_index.addFeature(feature)
+            if reuse_previous_results:
+                geometry_hashes[str(feature[osm_id_idx])] = hash(bytes(feature.geometry().asWkb()))
+        unchanged_buildings = set()
+        pair_distances = {}
+        if reuse_previous_results:
+            unchanged_buildings = PreviousRunResults().get_unchanged_buildings(geometry_hashes, eps)
+            previous_pair_distances = PreviousRunResults().pair_distances
+        rows = []
+        cols = []
+        distances = []
+        reused_distances = 0
+        for feature_id, i in positions.items():
+            geometry_i = spatial_index.geometry(feature_id)
+            for neighbor_id in spatial_index.intersects(geometry_i.boundingBox().buffered(eps)):
+                j = positions[neighbor_id]
+                if j <= i:
+                    continue
+                if reuse_previous_results:
+                    pair_key = PreviousRunResults.get_pair_key(osm_ids[i], osm_ids[j])
+                    if pair_key[0] in unchanged_buildings and pair_key[1] in unchanged_buildings:
+                        distance = previous_pair_distances.get(pair_key)
+                        reused_distances += 1
+                        if distance is None:
+                            # the pair was too far apart in the previous run already.
+                            continue
+                    else:
+                        distance = geometry_i.distance(spatial_index.geometry(neighbor_id))
+                else:
+                    distance = geometry_i.distance(spatial_index.geometry(neighbor_id))
+                if distance <= eps:
+                    rows.append(i)
+                    cols.append(j)
+                    distances.append(distance)
+                    if reuse_previous_results:
+                        pair_distances[pair_key] = distance
+        amount_of_features = len(osm_ids)
+        distance_matrix = sparse.coo_matrix((distances + distances, (rows + cols, cols + rows)),
+                                            shape=(amount_of_features, amount_of_features)).tocsr()
+        if reuse_previous_results:
+            PreviousRunResults().update_pair_distances(geometry_hashes, pair_distances, eps)
+            Logger().info(f"Reused {reused_distances} building distances of the previous run.")
+        Logger().debug(f"Measured {len(distances)} building pairs within eps of {amount_of_features} buildings.")
+        return distance_matrix, osm_ids
 
     @function_timer.timed_function
     def prepare_output_layer_for_visualization(self, cluster_results):
@@ -184,7 +284,7 @@ class ClusteringFirstStage:
         output_layer.updateFields()
         DhpUtility.create_new_field(output_layer, self.CLUSTER_FIELD_NAME, QVariant.String)
         output_layer.updateFields()
-        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_expression)
+        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_request)
         for building in selected_buildings_features:
             new_feature = QgsFeature()
             new_feature.setGeometry(building.geometry())
@@ -214,12 +314,12 @@ class ClusteringFirstStage:
             feature2_id = str(feature2[id_field_name_idx])
             # Logger().debug(f"distance between Feature: {feature1_id} and Feature: {feature2_id}: {distance}")
 
-    def do_clustering(self, data, min_samples):
+    def do_clustering(self, data, min_samples, eps=None):
         ids = [point['id'] for point in data]
         weights = [point['weight'] for point in data]
         features = np.array([[point['x'], point['y']] for point in data])
 
-        dbscan = DBSCAN(eps=Config().get_eps(), min_samples=min_samples)
+        dbscan = DBSCAN(eps=Config().get_eps() if eps is None else eps, min_samples=min_samples)
         clusters = dbscan.fit_predict(features, sample_weight=weights)
         columns = [self.CLUSTER_RESULTS_CLUSTER_COL_NAME]
         labels = ids
@@ -231,10 +331,13 @@ class ClusteringFirstStage:
         return cluster_results
 
     @function_timer.timed_function
-    def do_clustering_with_custom_metric(self, distance_df, min_samples, sample_weights):
-        db = DBSCAN(eps=Config().get_eps(), min_samples=min_samples, metric="precomputed")
-        clusters = db.fit_predict(distance_df.values, sample_weight=sample_weights)
-        labels = distance_df.index
+    def do_clustering_with_custom_metric(self, distance_matrix, labels, min_samples, sample_weights, eps=None):
+        """The distance matrix may either be dense or sparse. For sparse matrices, missing entries count as
+        infinitely far away."""
+        if not sparse.issparse(distance_matrix):
+            distance_matrix = np.asarray(distance_matrix)
+        db = DBSCAN(eps=Config().get_eps() if eps is None else eps, min_samples=min_samples, metric="precomputed")
+        clusters = db.fit_predict(distance_matrix, sample_weight=sample_weights)
         columns = [self.CLUSTER_RESULTS_CLUSTER_COL_NAME]
         cluster_results = pd.DataFrame(clusters, index=labels, columns=columns)
         # Logger().debug(cluster_results)
@@ -293,14 +396,14 @@ class ClusteringFirstStage:
         output_layer = QgsVectorLayer("Polygon?crs=" + buildings_layer.crs().authid(), "Clustered Buildings", "memory")
         output_layer_data = output_layer.dataProvider()
         selected_centroids = self.building_centroids.getFeatures()
-        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_expression)
+        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_request)
 
         DhpUtility.create_new_field(buildings_layer, cluster_field, QVariant.String)
         DhpUtility.transfer_values_by_matching_id(buildings_layer,
                                                   selected_centroids, selected_buildings_features,
                                                   cluster_field, self.SHARED_ID_FIELD_NAME)
         # we also need to rewind this iterator.
-        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_expression)
+        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_request)
 
         # preparing the new layer to have the same fields as the original building layer
         output_layer_data.addAttributes(buildings_layer.fields())
@@ -333,14 +436,12 @@ class ClusteringFirstStage:
         return renderer
 
     @function_timer.timed_function
-    def prepare_filter_expression(self):
+    def prepare_filter_request(self):
         """Used to only select buildings that have been processed and selected via preprocessing.
             These are available via the building_centroids."""
         # ToDo: This should probably be part of the preprocessing stage.
         osm_ids = [str(feature[self.SHARED_ID_FIELD_NAME]) for feature in self.building_centroids.getFeatures()]
-        osm_list = ",".join(f"'{osm_id}'" for osm_id in osm_ids)
-        expression = f"{self.SHARED_ID_FIELD_NAME} IN ({osm_list})"
-        return expression
+        return FeatureIdIndex().get_request(self.buildings_layer, self.SHARED_ID_FIELD_NAME, osm_ids)
 
     @function_timer.timed_function
     def prepare_return(self, cluster_df):
@@ -370,9 +471,13 @@ class ClusteringFirstStage:
         # Logger().debug(f"Calculated cluster weights: {weight_dict}")
         return weight_dict
 
-    def calculate_min_samples(self):
-        min_samples = (float(Config().get_heat_capacity()) *
-                       float((Config().get_minimum_heat_capacity_exhaustion_as_decimal())))
+    def calculate_min_samples(self, heat_capacity=None, minimum_heat_capacity_exhaustion=None):
+        """Both parameters default to the configured values. The exhaustion is given in percent."""
+        if heat_capacity is None:
+            heat_capacity = Config().get_heat_capacity()
+        if minimum_heat_capacity_exhaustion is None:
+            minimum_heat_capacity_exhaustion = Config().get_minimum_heat_capacity_exhaustion()
+        min_samples = float(heat_capacity) * float(minimum_heat_capacity_exhaustion) / 100
         return int(min_samples)
 
     def map_cluster_weights_to_labels(self, id_labels, cluster_weights):
@@ -382,30 +487,24 @@ class ClusteringFirstStage:
             weights.append(cluster_weights[id_])
         return weights
 
-    def adjust_transient_connections(self, distance_matrix, amount_of_features):
-        neighborhoods = []
-        visited = set()
-        for i in range(amount_of_features):
-            if i not in visited:
-                # Start a new neighborhood with building `i`
-                queue = [i]
-                neighborhood = set()
-                while queue:
-                    current = queue.pop(0)
-                    if current not in neighborhood:
-                        neighborhood.add(current)
-                        # Find all direct neighbors of `current` (distance <= eps)
-                        neighbors = np.where(distance_matrix[current] <= Config().get_eps())[0]
-                        for neighbor in neighbors:
-                            if neighbor != current and neighbor not in neighborhood:
-                                queue.append(neighbor)
-                neighborhoods.append(neighborhood)
-                visited.update(neighborhood)
-
-        # Step 3: Set all intra-neighborhood distances to 0
-        for neighborhood in neighborhoods:
-            for i in neighborhood:
-                for j in neighborhood:
-                    if i != j:
-                        distance_matrix[i, j] = 0
-        return distance_matrix
+    @function_timer.timed_function
+    def cluster_transient_connections(self, distance_matrix, labels, min_samples, sample_weights, eps=None):
+        """Buildings that are transitively connected by distances <= eps form one neighborhood.
+        Every neighborhood whose summed weights reach min_samples becomes a cluster, all other buildings are noise.
+        This equals DBSCAN on a distance matrix where all intra-neighborhood distances are set to 0."""
+        eps = float(Config().get_eps()) if eps is None else float(eps)
+        distance_matrix = sparse.csr_matrix(distance_matrix)
+        within_eps = distance_matrix.data <= eps
+        rows = np.repeat(np.arange(distance_matrix.shape[0]), np.diff(distance_matrix.indptr))
+        adjacency = sparse.csr_matrix((np.ones(int(np.sum(within_eps))),
+                                       (rows[within_eps], distance_matrix.indices[within_eps])),
+                                      shape=distance_matrix.shape)
+        _, neighborhoods = connected_components(adjacency, directed=False)
+        neighborhood_weights = np.bincount(neighborhoods, weights=np.asarray(sample_weights, dtype=float))
+        is_cluster = neighborhood_weights >= min_samples
+        # clusters are numbered in order of their first building, just like DBSCAN does.
+        cluster_ids = np.full(len(neighborhood_weights), -1, dtype=np.int64)
+        cluster_ids[is_cluster] = np.arange(int(np.sum(is_cluster)))
+        columns = [self.CLUSTER_RESULTS_CLUSTER_COL_NAME]
+        cluster_results = pd.DataFrame(cluster_ids[neighborhoods], index=labels, columns=columns)
+        return cluster_results
@@ -1,4 +1,7 @@
+import hashlib
+import json
 import math
+from concurrent.futures import as_completed
 import random
 from collections import defaultdict
 
@@ -16,6 +19,8 @@ from PyQt5.QtCore import QVariant
 from PyQt5.QtGui import QColor
 
 from .clustering_second_stage_adapter import ClusteringSecondStageAdapter
+from .cluster_job import run_cluster_job
+from .cluster_cost_model import ClusterCostModel
 from .I_clustering_second_stage_feasible_solution_creator import IClusteringSecondStageFeasibleSolutionCreator
 
 # ToDo: Put all of this into class that handles dependencies!!
@@ -25,6 +30,9 @@ from ..util.logger import Logger
 from ..util.config import Config
 
 from ..util.dhp_utility import DhpUtility
+from ..util.feature_id_index import FeatureIdIndex
+from ..util.previous_run_results import PreviousRunResults
+from ..util.process_pool import ProcessPool
 
 
 class ClusteringSecondStage:
@@ -37,7 +45,6 @@ class ClusteringSecondStage:
     first_stage_cluster_dict: defaultdict = None
     ready_to_start = False
     graph_translation_dict = None
-    selected_buildings_expression = ""
     feasible_solution_creator: IClusteringSecondStageFeasibleSolutionCreator = None
 
     PEAK_DEMAND_FIELD_NAME = "peak_demand"
@@ -72,9 +79,21 @@ class ClusteringSecondStage:
     def start(self):
         if self.ready_to_start:
             results = []
+            # with a random seed, every run is meant to give a new result.
+            reuse_previous_results = Config().get_reuse_previous_results() and not Config().get_use_random_seed()
+            cache_keys = {}
+            cluster_jobs = []
             for cluster_id, cluster_members in self.first_stage_cluster_dict.items():
                 # Logger().debug(f"currently calculating second stage results for cluster {cluster_id}")
                 Logger().debug(f"Now calculating for {cluster_id, cluster_members}")
+                if reuse_previous_results:
+                    cache_key = (frozenset(cluster_members), self.calculate_cluster_fingerprint(cluster_members))
+                    cache_keys[cluster_id] = cache_key
+                    cached_result = PreviousRunResults().get_brkga_result(cache_key)
+                    if cached_result is not None:
+                        Logger().info(f"Reusing the brkga result of the previous run for cluster {cluster_id}.")
+                        results.append(cached_result)
+                        continue
                 temporary_solution, cluster_center_dict, number_of_clusters \
                     = self.generate_temporary_clustering_solution(cluster_id, cluster_members)
                 feasible_solution = self.feasible_solution_creator.make_solution_feasible(temporary_solution,
@@ -86,18 +105,76 @@ class ClusteringSecondStage:
                 # Logger().debug(f"feasible solution has been created for cluster {cluster_id}\n"
                 #               f"solution: {feasible_solution}")
                 clustering_second_stage_adapter = ClusteringSecondStageAdapter()
-                brkga_result = clustering_second_stage_adapter.do_brkga(
+                cluster_job = clustering_second_stage_adapter.create_cluster_job(
+                    cluster_id=cluster_id,
                     graph=self.shortest_path_graph,
                     cluster_dict=feasible_solution_with_all_members,
                     info_layer=self.building_centroids,
                     number_of_clusters=number_of_clusters,
                     id_to_node_translation_dict=self.graph_translation_dict,
                     pivot_element=Config().get_pivot_strategy()) # ToDo: Do this here or in orchestrator?
+                # the position keeps the order of the clusters, no matter in which order the jobs finish.
+                cluster_jobs.append((len(results), cluster_job))
+                results.append(None)
+            for position, cluster_job, brkga_result in self.run_cluster_jobs(cluster_jobs):
+                results[position] = brkga_result
                 Logger().info(f"brkga result {brkga_result}")
-                results.append(brkga_result)
+                if reuse_previous_results:
+                    PreviousRunResults().set_brkga_result(cache_keys[cluster_job.cluster_id], brkga_result)
+            if reuse_previous_results:
+                PreviousRunResults().retain_brkga_results(set(cache_keys.values()))
             results = self.add_summed_result(results)
             return results
 
+    def run_cluster_jobs(self, cluster_jobs):
+        """Runs the brkga for all clusters. With more than one configured worker, the jobs run in a process pool
+        and are dispatched largest first by their estimated runtime.
+        Yields (position, job, result) in the order of the positions.
+        The workers only get ClusterJobs, which hold plain data. See ProcessPool for the risks of the pool."""
+        workers = ProcessPool.get_usable_workers(min(Config().get_second_stage_workers(), len(cluster_jobs)),
+                                                 "Running the second stage")
+        cost_model = ClusterCostModel()
+        finished_jobs = []
+        if workers <= 1:
+            for position, cluster_job in cluster_jobs:
+                finished_jobs.append((position, cluster_job, run_cluster_job(cluster_job)))
+                Logger().info(f"Second stage: {len(finished_jobs)}/{len(cluster_jobs)} clusters finished "
+                              f"(cluster {cluster_job.cluster_id}).")
+        else:
+            scheduled_jobs = cost_model.schedule(cluster_jobs, workers)
+            with ProcessPool.create_executor(workers, "Running the second stage") as executor:
+                futures = {executor.submit(run_cluster_job, cluster_job): (position, cluster_job)
+                           for position, cluster_job in scheduled_jobs}
+                for future in as_completed(futures):
+                    position, cluster_job = futures[future]
+                    finished_jobs.append((position, cluster_job, future.result()))
+                    Logger().info(f"Second stage: {len(finished_jobs)}/{len(cluster_jobs)} clusters finished "
+                                  f"(cluster {cluster_job.cluster_id}).")
+        for position, cluster_job, (result, evaluations, seconds) in sorted(finished_jobs, key=lambda job: job[0]):
+            cost_model.record(cluster_job, evaluations, seconds)
+            yield position, cluster_job, result
+        cost_model.save_history()
+
+    def calculate_cluster_fingerprint(self, cluster_members):
+        """Fingerprint of everything the brkga result of a cluster depends on:
+        the positions and demands of its members, the graph between them and the config."""
+        fields = self.building_centroids.fields()
+        id_idx = fields.indexFromName(self.UNIQUE_ID_FIELD_NAME_CENTROIDS)
+        demand_idx = fields.indexFromName(self.PEAK_DEMAND_FIELD_NAME)
+        yearly_demand_idx = fields.indexFromName(ClusteringSecondStageAdapter.YEARLY_DEMAND_FIELD_LAYER)
+        request = FeatureIdIndex().get_request(self.building_centroids, self.UNIQUE_ID_FIELD_NAME_CENTROIDS,
+                                               cluster_members)
+        request.setSubsetOfAttributes([id_idx, demand_idx, yearly_demand_idx])
+        members = sorted((str(feature[id_idx]), str(feature[demand_idx]), str(feature[yearly_demand_idx]),
+                          feature.geometry().asPoint().x(), feature.geometry().asPoint().y())
+                         for feature in self.building_centroids.getFeatures(request))
+        nodes = [self.graph_translation_dict[member] for member in cluster_members]
+        edges = sorted((tuple(sorted([(u.x(), u.y()), (v.x(), v.y())])), data.get('weight'),
+                        data.get('street_type_cost_factor'))
+                       for u, v, data in self.shortest_path_graph.subgraph(nodes).edges(data=True))
+        config = json.dumps(Config().config, sort_keys=True, default=str)
+        return hashlib.sha1(repr((members, edges, config)).encode()).hexdigest()
+
     def generate_temporary_clustering_solution(self, cluster_id, cluster_members):
         member_features_iterator = DhpUtility.get_features_by_id_field(self.building_centroids,
                                                                        self.UNIQUE_ID_FIELD_NAME_CENTROIDS,
@@ -240,7 +317,7 @@ class ClusteringSecondStage:
         output_layer.updateFields()
         DhpUtility.create_new_field(output_layer, self.CLUSTER_FIELD_NAME, QVariant.String)
         output_layer.updateFields()
-        selected_buildings_features = self.buildings_layer.getFeatures(self.selected_buildings_expression)
+        selected_buildings_features = self.buildings_layer.getFeatures(self.prepare_filter_request())
         for building in selected_buildings_features:
             new_feature = QgsFeature()
             new_feature.setGeometry(building.geometry())
@@ -264,15 +341,13 @@ class ClusteringSecondStage:
         pass
 
     # ToDo: THIS TOO!!!
-    def prepare_filter_expression(self):
+    def prepare_filter_request(self):
         """Used to only select buildings that have been processed and selected via preprocessing.
             These are available via the building_centroids."""
         # ToDo: This should probably be part of the preprocessing stage.
         osm_ids = [str(feature[self.UNIQUE_ID_FIELD_NAME_CENTROIDS]) for feature in
                    self.building_centroids.getFeatures()]
-        osm_list = ",".join(f"'{osm_id}'" for osm_id in osm_ids)
-        expression = f"{self.UNIQUE_ID_FIELD_NAME_CENTROIDS} IN ({osm_list})"
-        return expression
+        return FeatureIdIndex().get_request(self.buildings_layer, self.UNIQUE_ID_FIELD_NAME_CENTROIDS, osm_ids)
 
     # ToDo: THIS TOO!
     def create_unique_cluster_colors_renderer(self, labels, geometry_type, cluster_field):
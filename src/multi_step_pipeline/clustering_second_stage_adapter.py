@@ -1,4 +1,6 @@
-from .brkga.brkga_api import BrkgaAPI
+import networkx as nx
+
+from .cluster_job import ClusterJob
 from ..util.dhp_utility import DhpUtility
 from scipy.spatial.distance import cdist
 from ..util.config import Config
@@ -20,26 +22,29 @@ class ClusteringSecondStageAdapter():
         # ToDo: Just add field to cluster dict that represents the brkga solutions.
         # ToDo: For now: Just do the brkga so we can get logs.
         # ToDo: Check if dict has all fields required!
-        brkga_api = BrkgaAPI()
-        members = cluster_dict[self.MEMBER_LIST_KEY]
-        demands = self.get_demands_of_members_as_dict(members, info_layer)
-        yearly_demands = self.get_yearly_demands_of_members_as_dict(members, info_layer)
-        feasible_solution = cluster_dict[self.FEASIBLE_SOLUTION_KEY]
-        total_distance = cluster_dict[self.TOTAL_DISTANCE_KEY]
-        result = brkga_api.do_brkga(
-                                     graph=graph,
-                                     max_capacity=Config().get_heat_capacity(),
-                                     demands=demands,
-                                     yearly_demands=yearly_demands,
-                                     num_clusters=number_of_clusters,
-                                     members=members,
-                                     warm_start=feasible_solution,
-                                     total_distance=total_distance,
-                                     total_member_list=members,
-                                    id_to_node_translation_dict=id_to_node_translation_dict,
-                                    pivot_element=pivot_element)
+        cluster_job = self.create_cluster_job(None, graph, cluster_dict, info_layer, number_of_clusters,
+                                              id_to_node_translation_dict, pivot_element)
+        result, _, _ = cluster_job.run()
         return result
 
+    def create_cluster_job(self, cluster_id, graph, cluster_dict, info_layer, number_of_clusters: int,
+                           id_to_node_translation_dict, pivot_element: str) -> ClusterJob:
+        """Collects everything the brkga needs from the layers, so that it can run without them.
+        The graph is reduced to the members and its nodes are relabelled to their building ids."""
+        members = cluster_dict[self.MEMBER_LIST_KEY]
+        node_to_id_translation_dict = {id_to_node_translation_dict[member]: member for member in members}
+        subgraph = nx.relabel_nodes(graph.subgraph(node_to_id_translation_dict.keys()),
+                                    node_to_id_translation_dict, copy=True)
+        return ClusterJob(cluster_id=cluster_id,
+                          graph=subgraph,
+                          max_capacity=Config().get_heat_capacity(),
+                          demands=self.get_demands_of_members_as_dict(members, info_layer),
+                          yearly_demands=self.get_yearly_demands_of_members_as_dict(members, info_layer),
+                          members=members,
+                          number_of_clusters=number_of_clusters,
+                          warm_start=cluster_dict[self.FEASIBLE_SOLUTION_KEY],
+                          total_distance=cluster_dict[self.TOTAL_DISTANCE_KEY],
+                          pivot_element=pivot_element)
 
     def get_demands_of_members_as_dict(self, members, info_layer):
         # ToDo: I use something like this multiple times. Put this in DHPUtility or calculate it ONCE!
@@ -1,12 +1,16 @@
+import numpy as np
+
 from .I_clustering_second_stage_feasible_solution_creator import IClusteringSecondStageFeasibleSolutionCreator
-from scipy.spatial.distance import euclidean
-from ..util.dhp_utility import DhpUtility
+from ..util.feature_id_index import FeatureIdIndex
 from ..util.logger import Logger
 from ..util.config import Config
 from ..util.function_timer import FunctionTimer
 
 
 class ClusteringSecondStageFeasibleSolutionCreator(IClusteringSecondStageFeasibleSolutionCreator):
+    """Repairs a temporary solution so that no cluster exceeds the heat capacity.
+    xy and demand of all members are fetched with a single request and kept in arrays,
+    so the repair itself does not query the layer anymore."""
     function_timer = FunctionTimer()
 
     # ToDo: Change all variable names containing member to member_id (if suitable)
@@ -26,168 +30,176 @@ class ClusteringSecondStageFeasibleSolutionCreator(IClusteringSecondStageFeasibl
     DEMAND_FIELD = "peak_demand"
 
     def __init__(self):
-        pass
+        self.member_positions = {}
+        """str(member id) : row in member_xy and member_demands"""
+        self.member_xy = np.empty((0, 2))
+        self.member_demands = np.empty(0)
+        self.cluster_positions = {}
+        """cluster id : position in capacities"""
+        self.capacities = np.empty(0)
 
     def make_solution_feasible(self, cluster_dict: dict, cluster_center_dict: dict, info_layer):
         # ToDo: Check for validity (do dicts have the right fields?)
         # ToDo: I have to do the cluster_center_dict thingy!!
-        distance_ranking_dict = self.create_distance_ranking_dict(cluster_dict, cluster_center_dict, info_layer)
-        dict_with_capacity = self.add_capacity_field_to_cluster_dict(distance_ranking_dict, info_layer)
+        self.load_member_data(cluster_dict, info_layer)
+        distance_ranking_dict = self.create_distance_ranking_dict(cluster_dict, cluster_center_dict)
+        dict_with_capacity = self.add_capacity_field_to_cluster_dict(distance_ranking_dict)
         no_member_list = []
         feasible_solution, no_member_list = self.swap_cluster_membership_until_solution_feasible(dict_with_capacity,
                                                                                  cluster_center_dict,
-                                                                                 info_layer,
                                                                                  no_member_list)
         solution_with_cluster_centers = self.add_cluster_center_to_cluster_dict(feasible_solution,
-                                                                                cluster_center_dict,
-                                                                                info_layer)
-        solution_with_distances = self.add_sum_of_distances_field_per_cluster(solution_with_cluster_centers, info_layer)
+                                                                                cluster_center_dict)
+        solution_with_distances = self.add_sum_of_distances_field_per_cluster(solution_with_cluster_centers)
         solution_with_total_distances = self.add_total_sum_of_distances_field(solution_with_distances)
         solution_with_non_members = self.add_non_members_to_cluster_dict(solution_with_total_distances, no_member_list)
         return solution_with_non_members
 
-    def create_distance_ranking_dict(self, cluster_dict, cluster_center_dict, info_layer):
+    def load_member_data(self, cluster_dict, info_layer):
+        """Fetches xy and demand of all members of the cluster dict with a single request."""
+        member_ids = list(dict.fromkeys(str(member) for member_list in cluster_dict.values()
+                                        for member in member_list))
+        self.member_positions = {member: position for position, member in enumerate(member_ids)}
+        self.member_xy = np.full((len(member_ids), 2), np.nan)
+        self.member_demands = np.full(len(member_ids), np.nan)
+        id_field_idx = info_layer.fields().indexFromName(self.UNIQUE_ID_FIELD)
+        demand_field_idx = info_layer.fields().indexFromName(self.DEMAND_FIELD)
+        request = (FeatureIdIndex().get_request(info_layer, self.UNIQUE_ID_FIELD, member_ids)
+                   .setSubsetOfAttributes([id_field_idx, demand_field_idx]))
+        for feature in info_layer.getFeatures(request):
+            position = self.member_positions[str(feature[id_field_idx])]
+            point = feature.geometry().asPoint()
+            self.member_xy[position] = (point.x(), point.y())
+            self.member_demands[position] = float(feature[demand_field_idx])
+        missing_members = [member_ids[position] for position in np.flatnonzero(np.isnan(self.member_demands))]
+        if missing_members:
+            raise Exception(f"No features found for ids {missing_members} in field '{self.UNIQUE_ID_FIELD}'.")
+
+    def get_positions(self, member_list):
+        return np.array([self.member_positions[str(member)] for member in member_list], dtype=int)
+
+    def calculate_distances(self, positions, xy):
+        """Euclidean distances between the given members and one or more points.
+        For an array of points, the result has one row per member and one column per point."""
+        xy = np.asarray(xy, dtype=float)
+        member_xy = self.member_xy[positions]
+        if xy.ndim == 2:
+            member_xy = member_xy[:, np.newaxis, :]
+        difference = member_xy - xy
+        return np.sqrt((difference ** 2).sum(axis=-1))
+
+    def create_distance_ranking_dict(self, cluster_dict, cluster_center_dict):
         distance_ranking_dict = {}
         for (cluster_id, member_list) in cluster_dict.items():
             sorted_list = self.rank_member_list_by_distance_from_center(member_list,
-                                                                        cluster_center_dict[cluster_id],
-                                                                        info_layer)
+                                                                        cluster_center_dict[cluster_id])
             # ToDo: cluster_center_dict[cluster_id] has to be (x, y) tuple!
             distance_ranking_dict[cluster_id] = sorted_list
         # Logger().debug(f"Distance Ranking in Cluster dict has been successful.\n{distance_ranking_dict}")
         return distance_ranking_dict
 
-    def rank_member_list_by_distance_from_center(self, member_list, cluster_center_xy, info_layer):
-        distances_ranking = []
-        for member in member_list:
-            member_feature = DhpUtility.get_feature_by_id_field(info_layer, self.UNIQUE_ID_FIELD, member)
-            member_geometry = member_feature.geometry()
-            member_xy = (member_geometry.asPoint().x(), member_geometry.asPoint().y())
-            distances_ranking.append((member, euclidean(member_xy, cluster_center_xy)))
-        sorted_by_distance = [id_ for id_, distance in sorted(distances_ranking,
-                                                              key=lambda x: x[1],
-                                                              reverse=True)]
-        return sorted_by_distance
-
-    def add_capacity_field_to_cluster_dict(self, cluster_dict, info_layer):
+    def rank_member_list_by_distance_from_center(self, member_list, cluster_center_xy):
+        """Farthest member first. Members with equal distances keep their order."""
+        distances = self.calculate_distances(self.get_positions(member_list), cluster_center_xy)
+        ranking = np.argsort(-distances, kind="stable")
+        return [member_list[position] for position in ranking]
+
+    def add_capacity_field_to_cluster_dict(self, cluster_dict):
         dict_with_capacity = {}
         for (cluster_id, member_list) in cluster_dict.items():
             dict_with_capacity[cluster_id] = {
                 self.MEMBER_LIST_KEY: member_list,
-                self.CURRENT_CAPACITY_KEY: self.calculate_current_capacity(info_layer, member_list)
+                self.CURRENT_CAPACITY_KEY: self.calculate_current_capacity(member_list)
             }
         # Logger().debug(f"capacity added to cluster_dict. Current dict:\n{dict_with_capacity}")
         return dict_with_capacity
 
-    def calculate_current_capacity(self, info_layer, member_list):
+    def calculate_current_capacity(self, member_list):
         capacity = float(Config().get_heat_capacity())
-        for member in member_list:
-            demand = DhpUtility.get_value_from_feature_by_id_field(info_layer,
-                                                                   self.UNIQUE_ID_FIELD,
-                                                                   member,
-                                                                   self.DEMAND_FIELD)
-            capacity -= float(demand)
+        # subtracted one after another, the result must not depend on the summation order of numpy.
+        for demand in self.member_demands[self.get_positions(member_list)].tolist():
+            capacity -= demand
         return capacity
 
     @function_timer.timed_function
-    def swap_cluster_membership_until_solution_feasible(self, cluster_dict, cluster_center_dict, info_layer, no_member_list):
+    def swap_cluster_membership_until_solution_feasible(self, cluster_dict, cluster_center_dict, no_member_list):
         # ToDo: Validate that dict has all the required fields!
+        cluster_ids = list(cluster_center_dict.keys())
+        cluster_centers_xy = np.array([cluster_center_dict[cluster_id] for cluster_id in cluster_ids],
+                                      dtype=float).reshape(-1, 2)
+        self.cluster_positions = {cluster_id: position for position, cluster_id in enumerate(cluster_ids)}
+        self.capacities = np.array([cluster_dict[cluster_id][self.CURRENT_CAPACITY_KEY]
+                                    for cluster_id in cluster_ids], dtype=float)
         for (cluster_id, inner_dict) in cluster_dict.items():
-            if inner_dict[self.CURRENT_CAPACITY_KEY] < 0:
+            cluster_position = self.cluster_positions[cluster_id]
+            if self.capacities[cluster_position] < 0:
                 # Logger().debug(f"Capacity of Cluster {cluster_id} is less than 0."
                 #               f"Trying to swap cluster memberships until capacity is >= 0.")
-                for candidate in list(inner_dict[self.MEMBER_LIST_KEY]):
+                candidates = list(inner_dict[self.MEMBER_LIST_KEY])
+                candidate_positions = self.get_positions(candidates)
+                cluster_centers_ranked = self.create_distance_ranking_member_to_cluster_center(candidate_positions,
+                                                                                               cluster_centers_xy)
+                for candidate, candidate_position, ranking in zip(candidates, candidate_positions,
+                                                                  cluster_centers_ranked):
                     # Logger().debug(f"Currently observing {candidate}")
-                    cluster_centers_ranked = (
-                        self.create_distance_ranking_member_to_cluster_center(candidate,
-                                                                              cluster_center_dict,
-                                                                              info_layer))
-                    swapped = False
-                    for cluster_center_id, distance in cluster_centers_ranked:
-                        if cluster_dict[cluster_center_id][self.CURRENT_CAPACITY_KEY] > float(
-                                DhpUtility.get_value_from_feature_by_id_field(info_layer,
-                                                                              self.UNIQUE_ID_FIELD,
-                                                                              candidate,
-                                                                              self.DEMAND_FIELD)):
-                            self.swap_cluster_membership(cluster_dict, candidate, cluster_id, cluster_center_id,
-                                                         info_layer)
-                            swapped = True
-                            break
-                    if inner_dict[self.CURRENT_CAPACITY_KEY] >= 0:
-                        Logger().debug(f"Current Capacity of Cluster {cluster_id} is greater than 0 now, it is: {inner_dict[self.CURRENT_CAPACITY_KEY]}.")
+                    demand = self.member_demands[candidate_position]
+                    # the closest cluster that is able to take the candidate.
+                    has_capacity = self.capacities[ranking] > demand
+                    swapped = bool(has_capacity.any())
+                    if swapped:
+                        self.swap_cluster_membership(cluster_dict, candidate, demand, cluster_id,
+                                                     cluster_ids[ranking[np.argmax(has_capacity)]])
+                    if self.capacities[cluster_position] >= 0:
+                        Logger().debug(f"Current Capacity of Cluster {cluster_id} is greater than 0 now, "
+                                       f"it is: {self.capacities[cluster_position]}.")
                         break
                     if not swapped:
-                        self.flag_as_non_member(cluster_dict, cluster_id, candidate,
-                                                float(DhpUtility.get_value_from_feature_by_id_field(info_layer,
-                                                                                              self.UNIQUE_ID_FIELD,
-                                                                                              candidate,
-                                                                                              self.DEMAND_FIELD)),
-                                                no_member_list)
-                    # Logger().debug(f"Current Capacity of Cluster {cluster_id} is {inner_dict[self.CURRENT_CAPACITY_KEY]}.")
-
+                        self.flag_as_non_member(cluster_dict, cluster_id, candidate, demand, no_member_list)
+                    # Logger().debug(f"Current Capacity of Cluster {cluster_id} is {self.capacities[cluster_position]}.")
+        for cluster_id, cluster_position in self.cluster_positions.items():
+            cluster_dict[cluster_id][self.CURRENT_CAPACITY_KEY] = float(self.capacities[cluster_position])
         return cluster_dict, no_member_list
 
-    def swap_cluster_membership(self, cluster_dict, member,
-                                from_cluster, to_cluster, info_layer):
-        member_demand = float(DhpUtility.get_value_from_feature_by_id_field(info_layer,
-                                                                            self.UNIQUE_ID_FIELD,
-                                                                            member,
-                                                                            self.DEMAND_FIELD))
+    def swap_cluster_membership(self, cluster_dict, member, member_demand, from_cluster, to_cluster):
         if member in cluster_dict[from_cluster][self.MEMBER_LIST_KEY]:
             cluster_dict[from_cluster][self.MEMBER_LIST_KEY].remove(member)
-            cluster_dict[from_cluster][self.CURRENT_CAPACITY_KEY] += member_demand
+            self.capacities[self.cluster_positions[from_cluster]] += member_demand
         else:
             raise Exception(f"Candidate {member} is not in cluster {from_cluster}")
 
         cluster_dict[to_cluster][self.MEMBER_LIST_KEY].append(member)
-        cluster_dict[to_cluster][self.CURRENT_CAPACITY_KEY] -= member_demand
+        self.capacities[self.cluster_positions[to_cluster]] -= member_demand
         # Logger().debug(f"Swapped {member} from cluster {from_cluster} to cluster {to_cluster}")
 
-    def create_distance_ranking_member_to_cluster_center(self, member, cluster_center_dict, info_layer):
-        ranking_list = []
-        member_xy = DhpUtility.get_xy_by_id_field(info_layer,
-                                                  self.UNIQUE_ID_FIELD,
-                                                  member)
-        for cluster_id, cluster_xy in cluster_center_dict.items():
-            distance = euclidean(cluster_xy, member_xy)
-            ranking_list.append((cluster_id, distance))
-        sorted_by_distance = [id_ for id_ in sorted(ranking_list,
-                                                    key=lambda x: x[1],
-                                                    reverse=False)]
-        return sorted_by_distance
-
-    def add_cluster_center_to_cluster_dict(self, cluster_dict, cluster_center_dict, info_layer):
+    def create_distance_ranking_member_to_cluster_center(self, member_positions, cluster_centers_xy):
+        """Returns one row per member with the positions of the cluster centers, closest first.
+        Cluster centers with equal distances keep their order."""
+        distances = self.calculate_distances(member_positions, cluster_centers_xy)
+        return np.argsort(distances, axis=1, kind="stable")
+
+    def add_cluster_center_to_cluster_dict(self, cluster_dict, cluster_center_dict):
         # ToDo: Wouldn't it make more sense to do this BEFORE applying the swap_cluster_membership?
         for cluster_id, inner_dict in cluster_dict.items():
             closest_building_id = -1
-            closest_distance = float('inf')
-            cluster_center_xy = cluster_center_dict[cluster_id]
-            for member in inner_dict[self.MEMBER_LIST_KEY]:
-                member_xy = DhpUtility.get_xy_by_id_field(info_layer,
-                                                          self.UNIQUE_ID_FIELD,
-                                                          member)
-                distance_to_cluster_center = euclidean(cluster_center_xy, member_xy)
-                if distance_to_cluster_center < closest_distance:
-                    closest_distance = distance_to_cluster_center
-                    closest_building_id = member
+            member_list = inner_dict[self.MEMBER_LIST_KEY]
+            if member_list:
+                distances = self.calculate_distances(self.get_positions(member_list), cluster_center_dict[cluster_id])
+                closest_building_id = member_list[int(np.argmin(distances))]
             inner_dict[self.CLUSTER_CENTER_BUILDING_KEY] = closest_building_id
         # Logger().debug(f"Cluster Centers added. Current dict: {cluster_dict}")
         return cluster_dict
 
 
-    def add_sum_of_distances_field_per_cluster(self, cluster_dict, info_layer):
-        total_distance = 0.0
+    def add_sum_of_distances_field_per_cluster(self, cluster_dict):
         for cluster_id, inner_dict in cluster_dict.items():
-            cluster_center_id = inner_dict[self.CLUSTER_CENTER_BUILDING_KEY]
+            total_distance = 0.0
             members = inner_dict[self.MEMBER_LIST_KEY]
-            cluster_center_xy = DhpUtility.get_xy_by_id_field(info_layer,
-                                                              self.UNIQUE_ID_FIELD,
-                                                              cluster_center_id)
-            for member in members:
-                member_xy = DhpUtility.get_xy_by_id_field(info_layer,
-                                                          self.UNIQUE_ID_FIELD,
-                                                          member)
-                total_distance += euclidean(cluster_center_xy, member_xy)
+            if members:
+                cluster_center_position = self.member_positions[str(inner_dict[self.CLUSTER_CENTER_BUILDING_KEY])]
+                distances = self.calculate_distances(self.get_positions(members),
+                                                     self.member_xy[cluster_center_position])
+                for distance in distances.tolist():
+                    total_distance += distance
             inner_dict[self.SUM_OF_DISTANCES_PER_CLUSTER_KEY] = total_distance
         # Logger().debug(f"Sum of distances per cluster added. Current Dictionary: {cluster_dict}")
         return cluster_dict
@@ -207,7 +219,7 @@ class ClusteringSecondStageFeasibleSolutionCreator(IClusteringSecondStageFeasibl
 
         if member in cluster_dict[cluster_id][self.MEMBER_LIST_KEY]:
             cluster_dict[cluster_id][self.MEMBER_LIST_KEY].remove(member)
-            cluster_dict[cluster_id][self.CURRENT_CAPACITY_KEY] += member_demand
+            self.capacities[self.cluster_positions[cluster_id]] += member_demand
         else:
             raise Exception(f"Candidate {member} is not in cluster {cluster_id}")
 
@@ -224,4 +236,4 @@ class ClusteringSecondStageFeasibleSolutionCreator(IClusteringSecondStageFeasibl
             self.SUM_OF_DISTANCES_PER_CLUSTER_KEY: 0,
             self.CLUSTER_CENTER_BUILDING_KEY: "-1"
         }
-        return cluster_dict
\ No newline at end of file
+        return cluster_dict
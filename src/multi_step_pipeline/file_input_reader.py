@@ -0,0 +1,67 @@
+import time
+
+from qgis.core import (QgsVectorLayer, QgsProject, QgsGeometry, QgsCoordinateTransform,
+                       QgsCoordinateReferenceSystem, QgsWkbTypes)
+
+from ..util.dhp_utility import DhpUtility
+from ..util.logger import Logger
+
+
+class FileInputReader:
+    """Reads the input data directly from shapefiles or GeoPackages.
+    Only the features intersecting the selection are streamed from the provider into memory layers,
+    so the files themselves never have to be opened in the project."""
+
+    WINDOW_LAYER_PROPERTY = "dhp/window_layer"
+    """Custom property that marks memory layers created by this reader."""
+    BATCH_SIZE = 10_000
+
+    def read_window(self, path, layer_name, selection_geometry: QgsGeometry,
+                    selection_crs: QgsCoordinateReferenceSystem) -> QgsVectorLayer:
+        """
+        Creates a memory layer holding only the features of the file that intersect the selection.
+
+        :param path: path to the shapefile or GeoPackage.
+        :param layer_name: name of the resulting memory layer.
+        :param selection_geometry: the selection polygon.
+        :param selection_crs: crs of the selection polygon.
+        :return: memory layer in the crs of the file.
+        """
+        start_time = time.time()
+        source_layer = QgsVectorLayer(path, layer_name, "ogr")
+        if not source_layer.isValid():
+            raise Exception(f"Input file {path} could not be opened.")
+        window_geometry = QgsGeometry(selection_geometry)
+        if source_layer.crs() != selection_crs:
+            window_geometry.transform(QgsCoordinateTransform(selection_crs, source_layer.crs(), QgsProject.instance()))
+
+        window_layer = QgsVectorLayer(QgsWkbTypes.displayString(source_layer.wkbType()), layer_name, "memory")
+        window_layer.setCrs(source_layer.crs())
+        window_provider = window_layer.dataProvider()
+        window_provider.addAttributes(source_layer.fields())
+        window_layer.updateFields()
+        window_layer.setCustomProperty(self.WINDOW_LAYER_PROPERTY, True)
+
+        batch = []
+        feature_count = 0
+        for feature in DhpUtility.get_intersecting_features(source_layer, window_geometry):
+            batch.append(feature)
+            if len(batch) >= self.BATCH_SIZE:
+                window_provider.addFeatures(batch)
+                feature_count += len(batch)
+                batch = []
+        window_provider.addFeatures(batch)
+        feature_count += len(batch)
+        window_layer.updateExtents()
+        Logger().info(f"Read {feature_count} features of {path} within the selection "
+                      f"in {time.time() - start_time:.3f} seconds.")
+        return window_layer
+
+    def add_window_layer_to_project(self, window_layer: QgsVectorLayer):
+        """Adds the window to the project. Windows of previous runs with the same name get removed.
+        Layers of the user are kept, so the window has to be found by its id, not by its name."""
+        project = QgsProject.instance()
+        for layer in project.mapLayersByName(window_layer.name()):
+            if layer.customProperty(self.WINDOW_LAYER_PROPERTY, False):
+                project.removeMapLayer(layer.id())
+        project.addMapLayer(window_layer)
@@ -14,14 +14,16 @@ class MultiStepPipeline(DHCCreationPipeline):
     shortest_path_creator = None
     mst_visualizer = None
     clustering_first_stage = None
+    cluster_decomposition = None
     clustering_second_stage = None
     feasible_solution_creator = None
     visualization = None
 
-    def __init__(self, preprocessor, clustering_first_stage, feasible_solution_creator, clustering_second_stage,
-                 graph_creator, shortest_path_creator, mst_visualizer, visualization):
+    def __init__(self, preprocessor, clustering_first_stage, cluster_decomposition, feasible_solution_creator,
+                 clustering_second_stage, graph_creator, shortest_path_creator, mst_visualizer, visualization):
         self.preprocessing = preprocessor
         self.clustering_first_stage = clustering_first_stage
+        self.cluster_decomposition = cluster_decomposition
         self.feasible_solution_creator = feasible_solution_creator
         self.clustering_second_stage = clustering_second_stage
         self.graph_creator = graph_creator
@@ -43,7 +45,7 @@ class MultiStepPipeline(DHCCreationPipeline):
 
         if Config().get_distance_measuring_method() == "custom":
             # ToDo: Put this into function!
-            adjacency_matrix = self.shortest_path_creator.get_adjacency_matrix_with_custom_weights(shortest_paths)
+            adjacency_matrix = self.shortest_path_creator.get_distance_matrix_with_custom_weights(shortest_paths)
             # Logger().debug(f"'adjacency matrix is {adjacency_matrix}")
             nodes = list(shortest_paths.nodes())
             # translate nodes
@@ -57,6 +59,9 @@ class MultiStepPipeline(DHCCreationPipeline):
         else:
             self.clustering_first_stage.set_required_fields(preprocessing_result.building_centroids)
         clustering_first_stage_results = self.clustering_first_stage.start()
+        self.cluster_decomposition.set_required_fields(shortest_paths, building_to_point_dict,
+                                                       clustering_first_stage_results)
+        clustering_first_stage_results = self.cluster_decomposition.start()
         self.clustering_second_stage.set_required_fields(shortest_path_graph=shortest_paths,
                                                          first_stage_cluster_dict=clustering_first_stage_results,
                                                          # ToDo: This is only in because of sloppy visualization. Remove!!
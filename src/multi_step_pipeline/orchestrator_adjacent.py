@@ -4,10 +4,11 @@ from qgis.core import QgsProject
 
 class OrchestratorAdjacent():
 
-    def __init__(self, preprocessor, clustering_first_stage, feasible_solution_creator, clustering_second_stage,
-                 graph_creator, visualization):
+    def __init__(self, preprocessor, clustering_first_stage, cluster_decomposition, feasible_solution_creator,
+                 clustering_second_stage, graph_creator, visualization):
         self.preprocessing = preprocessor
         self.clustering_first_stage = clustering_first_stage
+        self.cluster_decomposition = cluster_decomposition
         self.feasible_solution_creator = feasible_solution_creator
         self.clustering_second_stage = clustering_second_stage
         self.graph_creator = graph_creator
@@ -25,6 +26,8 @@ class OrchestratorAdjacent():
         self.clustering_first_stage.set_required_fields(building_centroids_layer=preprocessing_result.building_centroids,
                                                         id_labels=translated_nodes)
         clustering_first_stage_results = self.clustering_first_stage.start()
+        self.cluster_decomposition.set_required_fields(graph, building_to_point_dict, clustering_first_stage_results)
+        clustering_first_stage_results = self.cluster_decomposition.start()
         self.clustering_second_stage.set_required_fields(shortest_path_graph=graph,
                                                          first_stage_cluster_dict=clustering_first_stage_results,
                                                          # ToDo: This is only in because of sloppy visualization. Remove!!
@@ -1,27 +1,35 @@
+import time
+
+import numpy as np
 from PyQt5.QtCore import QVariant
 
 from ..util.dhp_utility import DhpUtility
 from ..util.config import Config
+from ..util.config_exception import ConfigException
 from qgis.core import (QgsProject, QgsSpatialIndex, QgsFeatureRequest, QgsVectorLayer,
                        QgsCoordinateReferenceSystem, QgsCoordinateTransform,
-                       QgsField, QgsFeature, QgsProcessingFeatureSourceDefinition, QgsWkbTypes)
+                       QgsField, QgsFeature, QgsGeometry, QgsProcessingFeatureSourceDefinition, QgsWkbTypes)
 from qgis import processing
 from ..util.logger import Logger
+from ..util.stage_cache import StageCache
 from .preprocessing_result import PreprocessingResult
+from .file_input_reader import FileInputReader
 
 
 class Preprocessing:
     DESIRED_CRS = QgsCoordinateReferenceSystem('EPSG:4839')
 
     selection_layer = None
-    roads_layer_path = None
     roads_layer = None
-    buildings_layer_path = None
     buildings_layer = None
     selected_roads_exploded = None
     buildings_centroids = None
     preprocessing_result = None
     heating_demand_layer = None
+    selected_feature_ids = None
+    """Feature ids selected per layer. Keyed by the id of the layer."""
+    window_layer_ids = None
+    """Layer ids of the windows read from the input files. Keyed by the configured layer name."""
 
     # ToDo: Put this in config.
     HEAT_DEMAND_COL_NAME = "waermebeda"
@@ -29,6 +37,7 @@ class Preprocessing:
     INDIVIDUAL_HEAT_DEMAND_COL_NAME = "individual_heat_demand"
     JANUARY_CONSUMPTION_COL_NAME = "jan_demand"
     PEAK_DEMAND_COL_NAME = "peak_demand"
+    BUILDING_TYPE_COL_NAME = "type"
     BUILDINGS_ID_FIELD_NAME = "osm_id"
     COUNT_HOURS_IN_PEAK_MONTH = 31 * 24 # for January
     PEAK_MONTH_HEATING_DEMAND_PCT = 0.16 # for January - Jebamalai et al. (2019)
@@ -42,22 +51,29 @@ class Preprocessing:
     """Central method for preprocessing. Will start - and finish - the preprocessing pipeline."""
     def start(self) -> PreprocessingResult:
         self.selection_layer = None
-        # ToDo: Add back in, when we use files again instead of layers.
-        # self.roads_layer_path = Config().get_roads_path()
-        # self.buildings_layer_path = Config().get_buildings_path()
+        self.selected_feature_ids = {}
+        self.window_layer_ids = {}
         self.verify_layer(Config().get_selection_layer_name(), True)
         self.selection_layer = QgsProject.instance().mapLayersByName(Config().get_selection_layer_name())[0]
+        if Config().get_input_mode() == "files":
+            self.load_input_files()
         self.verify_layer(Config().get_roads_layer_name())
-        self.roads_layer = QgsProject.instance().mapLayersByName(Config().get_roads_layer_name())[0]
+        self.roads_layer = self.get_input_layer(Config().get_roads_layer_name())
         self.verify_layer(Config().get_buildings_layer_name())
-        self.buildings_layer = QgsProject.instance().mapLayersByName(Config().get_buildings_layer_name())[0]
+        self.buildings_layer = self.get_input_layer(Config().get_buildings_layer_name())
         self.verify_layer(Config().get_heat_demands_layer_name())
-        self.heating_demand_layer = QgsProject.instance().mapLayersByName(Config().get_heat_demands_layer_name())[0]
+        self.heating_demand_layer = self.get_input_layer(Config().get_heat_demands_layer_name())
 
-        # ToDo: Is selection_layer necessary in the parameters?
-        self.select_features(self.roads_layer, self.selection_layer)
-        self.select_features(self.buildings_layer, self.selection_layer)
-        self.select_features(self.heating_demand_layer, self.selection_layer)
+        if Config().get_input_mode() == "files":
+            # the windows only contain features within the selection anyway.
+            self.select_all_features(self.roads_layer)
+            self.select_all_features(self.buildings_layer)
+            self.select_all_features(self.heating_demand_layer)
+        else:
+            # ToDo: Is selection_layer necessary in the parameters?
+            self.select_features(self.roads_layer, self.selection_layer)
+            self.select_features(self.buildings_layer, self.selection_layer)
+            self.select_features(self.heating_demand_layer, self.selection_layer)
 
         # ToDo: This is not good practice. I should not do this in place.
         # ToDo: I want to change this, so that I only work with temporary layers from the preprocessing stage onward.
@@ -72,10 +88,8 @@ class Preprocessing:
         Logger().info("Buildings have been preprocessed successfully.")
         self.add_heat_demands_to_building_centroids()
         Logger().info("Building centroids have successfully been adjusted to display heat demands of buildings.")
-        self.delete_centroids_without_heat_demand()
         self.add_peak_demands_to_building_centroids()
         Logger().info("Peak demands have been calculated successfully and added to the buildings centroids.")
-        self.delete_centroids_with_too_large_heat_demand()
         result = PreprocessingResult(self.buildings_centroids, self.selected_roads_exploded)
         return result
 
@@ -90,7 +104,7 @@ class Preprocessing:
                 want to reduce the size of the layer
                 in a later preprocessing step. eg. explode the roads.
         """
-        layer = QgsProject.instance().mapLayersByName(layer_name)[0]
+        layer = self.get_input_layer(layer_name)
         if layer is None:
             raise Exception(f"No layer with name {layer_name} found.")
         if verify_crs and layer.crs() != self.DESIRED_CRS:
@@ -103,38 +117,73 @@ class Preprocessing:
         Logger().info(f"Layer {layer_name} has been verified successfully.")
 
     def convert_to_crs(self, layer, crs):
+        """Reprojects all geometries of the layer. The geometries are transformed while streaming them
+        without attributes and are then written back to the provider in a single batch."""
+        start_time = time.time()
         source_crs = layer.crs()
         transform = QgsCoordinateTransform(source_crs, crs, QgsProject.instance())
-        layer.startEditing()
-        for feature in layer.getFeatures():
+        request = QgsFeatureRequest().setNoAttributes()
+        transformed_geometries = {}
+        for feature in layer.getFeatures(request):
             geom = feature.geometry()
-            if geom:
-                geom.transform(transform)
-            layer.changeGeometry(feature.id(), geom)
+            if geom.isNull():
+                continue
+            geom.transform(transform)
+            transformed_geometries[feature.id()] = geom
+        if not layer.dataProvider().changeGeometryValues(transformed_geometries):
+            raise Exception(f"Geometries of layer {layer.name()} could not be transformed to {crs.authid()}.")
         layer.setCrs(crs)
-        layer.commitChanges()
-        Logger().info("Selection CRS has been changed successfully.")
+        layer.updateExtents()
+        layer.triggerRepaint()
+        Logger().info(f"CRS of layer {layer.name()} has been changed successfully. "
+                      f"{len(transformed_geometries)} geometries took {time.time() - start_time:.3f} seconds.")
+
+    def load_input_files(self):
+        """Streams the features within the selection from the input files into memory layers.
+        Only these windows are added to the project, the files themselves are never opened in it."""
+        selection_geometry = self.get_selection_geometry(self.selection_layer)
+        reader = FileInputReader()
+        for path, layer_name in [(Config().get_roads_path(), Config().get_roads_layer_name()),
+                                 (Config().get_buildings_path(), Config().get_buildings_layer_name()),
+                                 (Config().get_heat_demands_path(), Config().get_heat_demands_layer_name())]:
+            window_layer = reader.read_window(path, layer_name, selection_geometry, self.selection_layer.crs())
+            reader.add_window_layer_to_project(window_layer)
+            self.window_layer_ids[layer_name] = window_layer.id()
+
+    def get_input_layer(self, layer_name):
+        """Windows read from the input files are resolved by their layer id.
+        A layer of the user with the same name must not be taken instead."""
+        if layer_name in self.window_layer_ids:
+            return QgsProject.instance().mapLayer(self.window_layer_ids[layer_name])
+        return QgsProject.instance().mapLayersByName(layer_name)[0]
 
-    def select_features(self, target_layer, selection_layer):
-        """Selects the features of the target_layer within the selection_layer. Uses Intersection."""
-        if not target_layer.isEditable():
-            target_layer.startEditing()
-        # remove previous selection
-        target_layer.removeSelection()
-        # this is supposed to speed up the next processes.
-        index = QgsSpatialIndex(target_layer.getFeatures())
+    @staticmethod
+    def get_selection_geometry(selection_layer):
         if selection_layer.featureCount() != 1:
             raise ValueError(f"The selection layer has to have exactly one feature."
                              f" It currently has {selection_layer.featureCount()} features.")
         polygon_feature = next(selection_layer.getFeatures())
-        polygon_geom = polygon_feature.geometry()
-        request = QgsFeatureRequest().setFilterRect(polygon_geom.boundingBox())
-        intersecting_ids = [f.id() for f in target_layer.getFeatures(request) if polygon_geom.intersects(f.geometry())]
+        return polygon_feature.geometry()
+
+    def select_all_features(self, target_layer):
+        target_layer.selectAll()
+        self.selected_feature_ids[target_layer.id()] = set(target_layer.allFeatureIds())
+
+    def select_features(self, target_layer, selection_layer):
+        """Selects the features of the target_layer within the selection_layer. Uses Intersection.
+        The target layer is not edited. Returns the ids of the selected features."""
+        start_time = time.time()
+        polygon_geom = self.get_selection_geometry(selection_layer)
+        intersecting_ids = DhpUtility.get_intersecting_feature_ids(target_layer, polygon_geom)
+        # remove previous selection
+        target_layer.removeSelection()
         if intersecting_ids:
-            target_layer.selectByIds(intersecting_ids)
-        target_layer.commitChanges()
-        Logger().info(f"features of layer {target_layer.name()} have been selected successfully.")
+            target_layer.selectByIds(list(intersecting_ids))
+        self.selected_feature_ids[target_layer.id()] = intersecting_ids
+        Logger().info(f"{len(intersecting_ids)} features of layer {target_layer.name()} have been selected "
+                      f"successfully in {time.time() - start_time:.3f} seconds.")
         # iface.mapCanvas().refresh()
+        return intersecting_ids
 
     # ToDo: can we generalize this? Not only for roads, but for lines in general?
     def explode_road_lines(self):
@@ -202,7 +251,7 @@ class Preprocessing:
     def find_centroids_of_buildings(self):
         params = {
             'INPUT': QgsProcessingFeatureSourceDefinition(
-                self.buildings_layer.source(),
+                self.buildings_layer.id(),
                 selectedFeaturesOnly=True
             ),
             'OUTPUT': 'memory:'
@@ -222,135 +271,205 @@ class Preprocessing:
             layer.updateFeature(feature)
 
     def add_heat_demands_to_building_centroids(self):
+        """Distributes the heat demand of every heat demand polygon onto the centroids of the buildings
+        it contains, weighted by the footprint areas of the buildings. All values are written in one batch."""
+        start_time = time.time()
         building_centroids = self.buildings_centroids
         building_centroids.startEditing()
         DhpUtility.create_new_field(building_centroids, self.INDIVIDUAL_HEAT_DEMAND_COL_NAME, QVariant.String)
         insulation_factor = float(1 - (Config().get_insulation_factor() / 100))
-        heat_demands = self.heating_demand_layer
-        selected_heat_demands_list = list(self.heating_demand_layer.selectedFeatures())
-        if not selected_heat_demands_list:
+        selected_heat_demand_ids = sorted(self.selected_feature_ids[self.heating_demand_layer.id()])
+        if not selected_heat_demand_ids:
             raise Exception(f"No features selected in {self.heating_demand_layer.name()}.")
-        centroids_area_dict = self.infer_building_areas_in_heat_demand_layer(selected_heat_demands_list,
-                                                                                building_centroids)
-        heat_spatial_index = QgsSpatialIndex(heat_demands.getFeatures())
-        for centroid_feature, area_share in centroids_area_dict.items():
+        area_shares = self.infer_building_areas_in_heat_demand_layer(selected_heat_demand_ids)
+
+        heat_spatial_index = self.get_spatial_index(self.heating_demand_layer)
+        fields = building_centroids.fields()
+        id_idx = fields.indexFromName(self.BUILDINGS_ID_FIELD_NAME)
+        heat_demand_idx = fields.indexFromName(self.INDIVIDUAL_HEAT_DEMAND_COL_NAME)
+        # centroid feature id : (heat demand feature id, area share)
+        centroid_assignments = {}
+        for centroid_feature in building_centroids.getFeatures(QgsFeatureRequest().setSubsetOfAttributes([id_idx])):
+            area_share = area_shares.get(str(centroid_feature[id_idx]))
+            if area_share is None:
+                continue
             point_geom = centroid_feature.geometry()
-            heat_demand_ids = heat_spatial_index.intersects(point_geom.boundingBox())
-            heat_demand_feature_iterator = heat_demands.getFeatures(heat_demand_ids)
             multiple_check = False
-            for heat_demand_feature in heat_demand_feature_iterator:
-                if heat_demand_feature.geometry().intersects(point_geom) and not multiple_check:
+            for heat_demand_id in heat_spatial_index.intersects(point_geom.boundingBox()):
+                heat_demand_geometry = heat_spatial_index.geometry(heat_demand_id)
+                if heat_demand_geometry.intersects(point_geom) and not multiple_check:
                     multiple_check = True
-                    heat_demand_combined = heat_demand_feature[f"{self.HEAT_DEMAND_COL_NAME}"]
-                    heat_demand_individual = str((float(heat_demand_combined) * area_share * insulation_factor))
-                    # Logger().debug(f"centroid {DhpUtility.get_value_from_field(building_centroids, centroid_feature, self.BUILDINGS_ID_FIELD_NAME)} "
-                    #               f"has an area share of {area_share}. The summed heating demand is {DhpUtility.get_value_from_field(heat_demands, heat_demand_feature, self.HEAT_DEMAND_COL_NAME)} "
-                    #               f"and thus an individual heat demand of {heat_demand_individual}")
-                    DhpUtility.assign_value_to_field(building_centroids, self.INDIVIDUAL_HEAT_DEMAND_COL_NAME,
-                                                     centroid_feature, heat_demand_individual)
-                    building_centroids.updateFeature(centroid_feature)
-                elif heat_demand_feature.geometry().contains(point_geom) and multiple_check:
-                    building_centroid_id = centroid_feature.id()
+                    centroid_assignments[centroid_feature.id()] = (heat_demand_id, area_share)
+                elif heat_demand_geometry.contains(point_geom) and multiple_check:
                     raise Exception(
-                        f"Multiple heat demand geometries for building centroid with id {building_centroid_id} found.")
+                        f"Multiple heat demand geometries for building centroid with id {centroid_feature.id()} found.")
+
+        heat_demand_col_idx = self.heating_demand_layer.fields().indexFromName(self.HEAT_DEMAND_COL_NAME)
+        heat_demand_request = (QgsFeatureRequest()
+                               .setFilterFids(list({heat_demand_id for heat_demand_id, _
+                                                    in centroid_assignments.values()}))
+                               .setFlags(QgsFeatureRequest.NoGeometry)
+                               .setSubsetOfAttributes([heat_demand_col_idx]))
+        combined_heat_demands = {feature.id(): feature[heat_demand_col_idx]
+                                 for feature in self.heating_demand_layer.getFeatures(heat_demand_request)}
+        building_centroids.dataProvider().changeAttributeValues({
+            centroid_id: {heat_demand_idx: str(float(combined_heat_demands[heat_demand_id])
+                                               * area_share * insulation_factor)}
+            for centroid_id, (heat_demand_id, area_share) in centroid_assignments.items()
+        })
         building_centroids.commitChanges()
+        Logger().info(f"Heat demands of {len(centroid_assignments)} building centroids have been inferred "
+                      f"in {time.time() - start_time:.3f} seconds.")
 
-    def infer_building_areas_in_heat_demand_layer(self, selected_heat_demands_list, building_centroids):
-        buildings_spatial_index = QgsSpatialIndex(self.buildings_layer.getFeatures())
-        result_dict = {}
-        for heat_demand in selected_heat_demands_list:
-            sum_of_area = 0
-            id_area_dict = {}
-            heat_demand_geometry = heat_demand.geometry()
-            if heat_demand_geometry.isGeosValid() and heat_demand_geometry.type() == QgsWkbTypes.PolygonGeometry:
-                intersecting_buildings = buildings_spatial_index.intersects(heat_demand_geometry.boundingBox())
-                for building in DhpUtility.convert_iterator_to_list(
-                        self.buildings_layer.getFeatures(intersecting_buildings)):
-                    if building.geometry().intersects(heat_demand_geometry):
-                        area = building.geometry().area()
-                        sum_of_area += area
-                        id_area_dict[DhpUtility.get_value_from_field(self.buildings_layer, building,
-                                                                     self.BUILDINGS_ID_FIELD_NAME)] = area
-                        # Logger().debug(f"heat demand id: {heat_demand.id()} "
-                        #               f"Building area for building "
-                        #               f"{DhpUtility.get_value_from_field(self.buildings_layer, building, self.BUILDINGS_ID_FIELD_NAME)}: {area}")
-            else:
+    def infer_building_areas_in_heat_demand_layer(self, heat_demand_ids):
+        """
+        Calculates the share of every building of the summed footprint area of all buildings within
+        the same heat demand polygon. Buildings intersecting multiple polygons keep the share
+        of the last one.
+
+        :param heat_demand_ids: ids of the selected heat demand features.
+        :return: dict osm_id of the building : area share.
+        """
+        self.verify_heat_demand_geometries(heat_demand_ids)
+        buildings_spatial_index = self.get_spatial_index(self.buildings_layer)
+        heat_spatial_index = self.get_spatial_index(self.heating_demand_layer)
+        building_ids = []
+        heat_demand_positions = []
+        for heat_demand_position, heat_demand_id in enumerate(heat_demand_ids):
+            heat_demand_geometry = heat_spatial_index.geometry(heat_demand_id)
+            engine = QgsGeometry.createGeometryEngine(heat_demand_geometry.constGet())
+            engine.prepareGeometry()
+            for building_id in buildings_spatial_index.intersects(heat_demand_geometry.boundingBox()):
+                if engine.intersects(buildings_spatial_index.geometry(building_id).constGet()):
+                    building_ids.append(building_id)
+                    heat_demand_positions.append(heat_demand_position)
+        if not building_ids:
+            return {}
+        building_ids = np.array(building_ids, dtype=np.int64)
+        heat_demand_positions = np.array(heat_demand_positions, dtype=np.int64)
+
+        footprint_areas = self.get_building_footprint_areas(building_ids)
+        areas = np.array([footprint_areas[building_id] for building_id in building_ids.tolist()], dtype=float)
+        area_sums = np.bincount(heat_demand_positions, weights=areas, minlength=len(heat_demand_ids))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            area_shares = areas / area_sums[heat_demand_positions]
+
+        # pairs are ordered by heat demand, so the last share per building is the one that is kept.
+        osm_id_idx = self.buildings_layer.fields().indexFromName(self.BUILDINGS_ID_FIELD_NAME)
+        osm_id_request = (QgsFeatureRequest()
+                          .setFilterFids(np.unique(building_ids).tolist())
+                          .setFlags(QgsFeatureRequest.NoGeometry)
+                          .setSubsetOfAttributes([osm_id_idx]))
+        osm_ids = {feature.id(): str(feature[osm_id_idx])
+                   for feature in self.buildings_layer.getFeatures(osm_id_request)}
+        return {osm_ids[building_id]: float(area_share)
+                for building_id, area_share in zip(building_ids.tolist(), area_shares)}
+
+    def verify_heat_demand_geometries(self, heat_demand_ids):
+        """Only polygons with valid geometries are allowed. The validity of each feature is only checked once."""
+        validity = StageCache().get_or_create(self.heating_demand_layer, "geometry_validity", dict)
+        unchecked_ids = [heat_demand_id for heat_demand_id in heat_demand_ids if heat_demand_id not in validity]
+        if unchecked_ids:
+            heat_spatial_index = self.get_spatial_index(self.heating_demand_layer)
+            for heat_demand_id in unchecked_ids:
+                geometry = heat_spatial_index.geometry(heat_demand_id)
+                validity[heat_demand_id] = (geometry.type() == QgsWkbTypes.PolygonGeometry
+                                            and geometry.isGeosValid(), geometry.type())
+        for heat_demand_id in heat_demand_ids:
+            is_valid, geometry_type = validity[heat_demand_id]
+            if not is_valid:
                 raise Exception(f"A selected heat demand is of the wrong type. Needed: "
-                                f"Polygons. Gotten: {heat_demand_geometry.type()}, id of feature: {heat_demand.id()}")
-            for building_id, area in id_area_dict.items():
-                part_of_area_sum = area / sum_of_area
-                corresponding_centroid = DhpUtility.get_feature_by_id_field(building_centroids,
-                                                                            self.BUILDINGS_ID_FIELD_NAME,
-                                                                            building_id)
-                if corresponding_centroid is not None:
-                    result_dict[corresponding_centroid] = part_of_area_sum
-        logging_dict = {}
-        for centroid, area in result_dict.items():
-            logging_dict[DhpUtility.get_value_from_field(self.buildings_centroids, centroid, self.BUILDINGS_ID_FIELD_NAME)] = area
-        # Logger().debug(logging_dict)
-        return result_dict
+                                f"Polygons. Gotten: {geometry_type}, id of feature: {heat_demand_id}")
+
+    def get_building_footprint_areas(self, building_ids):
+        """Footprint areas keyed by feature id. Every area is only calculated once."""
+        footprint_areas = StageCache().get_or_create(self.buildings_layer, "footprint_areas", dict)
+        buildings_spatial_index = self.get_spatial_index(self.buildings_layer)
+        for building_id in building_ids.tolist():
+            if building_id not in footprint_areas:
+                footprint_areas[building_id] = buildings_spatial_index.geometry(building_id).area()
+        return footprint_areas
+
+    @staticmethod
+    def get_spatial_index(layer):
+        """Spatial index over the whole layer, which also stores the geometries of the features."""
+        return StageCache().get_or_create(
+            layer, "spatial_index",
+            lambda: QgsSpatialIndex(layer.getFeatures(QgsFeatureRequest().setNoAttributes()),
+                                    flags=QgsSpatialIndex.FlagStoreFeatureGeometries))
 
     def add_peak_demands_to_building_centroids(self):
         """
+            Calculates the january and peak demands of all building centroids in one pass.
+            Centroids without heat demand and centroids with a peak demand that the heating source
+            is not able to provide get deleted in the same pass.
             From: Rosa, et al. (2012)
         """
         building_centroids = self.buildings_centroids
         DhpUtility.create_new_field(building_centroids, self.PEAK_DEMAND_COL_NAME, QVariant.String)
         DhpUtility.create_new_field(building_centroids, self.JANUARY_CONSUMPTION_COL_NAME, QVariant.String)
-        building_centroids.startEditing()
-        centroid_features = building_centroids.getFeatures()
-
-        for centroid_feature in centroid_features:
-            heat_demand = centroid_feature[f"{self.INDIVIDUAL_HEAT_DEMAND_COL_NAME}"]
-
-            # unit: Kwh/month
-            peak_month_demand = float(heat_demand) * self.PEAK_MONTH_HEATING_DEMAND_PCT
-            DhpUtility.assign_value_to_field(building_centroids, self.JANUARY_CONSUMPTION_COL_NAME, centroid_feature, peak_month_demand)
-
-            building_type = DhpUtility.get_value_from_field(building_centroids, centroid_feature, "type")
-
-            # unit: Kwh/hour
-            load_factor = Config().get_load_factor(building_type)
-
-            peak_demand = self.q_peak_calculation(peak_month_demand, self.COUNT_HOURS_IN_PEAK_MONTH, load_factor)
-            DhpUtility.assign_value_to_field(building_centroids, self.PEAK_DEMAND_COL_NAME, centroid_feature, peak_demand)
+        fields = building_centroids.fields()
+        heat_demand_idx = fields.indexFromName(self.INDIVIDUAL_HEAT_DEMAND_COL_NAME)
+        building_type_idx = fields.indexFromName(self.BUILDING_TYPE_COL_NAME)
+        january_consumption_idx = fields.indexFromName(self.JANUARY_CONSUMPTION_COL_NAME)
+        peak_demand_idx = fields.indexFromName(self.PEAK_DEMAND_COL_NAME)
+        request = (QgsFeatureRequest()
+                   .setFlags(QgsFeatureRequest.NoGeometry)
+                   .setSubsetOfAttributes([heat_demand_idx, building_type_idx]))
+        feature_ids = []
+        heat_demands = []
+        building_types = []
+        for centroid_feature in building_centroids.getFeatures(request):
+            feature_ids.append(centroid_feature.id())
+            heat_demands.append(self.to_float_or_nan(centroid_feature[heat_demand_idx]))
+            building_types.append(str(centroid_feature[building_type_idx]))
+        feature_ids = np.array(feature_ids, dtype=np.int64)
+        heat_demands = np.array(heat_demands, dtype=float)
+        has_heat_demand = ~np.isnan(heat_demands)
+
+        # every building type is only looked up once.
+        unique_building_types, building_type_indices = np.unique(np.array(building_types, dtype=str),
+                                                                 return_inverse=True)
+        load_factor_lookup = np.array([self.to_float_or_nan(Config().get_load_factor(building_type))
+                                       for building_type in unique_building_types], dtype=float)
+        load_factors = load_factor_lookup[building_type_indices]
+        unknown_building_types = set(unique_building_types[building_type_indices[has_heat_demand &
+                                                                                 np.isnan(load_factors)]])
+        if unknown_building_types:
+            raise ConfigException(f"No load profile factor found for building types {unknown_building_types}.")
+
+        # unit: Kwh/month
+        peak_month_demands = heat_demands * self.PEAK_MONTH_HEATING_DEMAND_PCT
+        # unit: Kwh/hour
+        with np.errstate(invalid="ignore", divide="ignore"):
+            peak_demands = self.q_peak_calculation(peak_month_demands, self.COUNT_HOURS_IN_PEAK_MONTH, load_factors)
+        too_large_heat_demand = np.zeros(len(feature_ids), dtype=bool)
+        too_large_heat_demand[has_heat_demand] = peak_demands[has_heat_demand] >= float(Config().get_heat_capacity())
+        to_keep = has_heat_demand & ~too_large_heat_demand
 
+        centroid_provider = building_centroids.dataProvider()
+        centroid_provider.changeAttributeValues({
+            int(feature_id): {january_consumption_idx: str(float(peak_month_demand)),
+                              peak_demand_idx: str(float(peak_demand))}
+            for feature_id, peak_month_demand, peak_demand in zip(feature_ids[to_keep],
+                                                                  peak_month_demands[to_keep],
+                                                                  peak_demands[to_keep])
+        })
+        centroid_provider.deleteFeatures([int(feature_id) for feature_id in feature_ids[~to_keep]])
+        building_centroids.commitChanges()
+        Logger().info(f"Deleted {int(np.sum(~has_heat_demand))} centroids due to not having a corresponding heat "
+                      f"demand and {int(np.sum(too_large_heat_demand))} centroids due to having a larger heat demand "
+                      f"than the specified heating source is able to provide.")
 
+    @staticmethod
+    def to_float_or_nan(value):
+        """Converts attribute values to float. NULL values and missing values become nan."""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
 
     @staticmethod
     def q_peak_calculation(epeakm, t, lf):
         result = epeakm / (t * lf)
         return result
-
-    def delete_centroids_without_heat_demand(self):
-        building_centroids = self.buildings_centroids
-        centroid_provider = building_centroids.dataProvider()
-        heat_demand_idx = building_centroids.fields().indexFromName(self.HEAT_DEMAND_COL_NAME)
-        ids_to_delete = []
-        str_ids_to_delete = []
-        for feature in building_centroids.getFeatures():
-            if feature.attributes()[heat_demand_idx] is None:
-                ids_to_delete.append(feature.id())
-                # ToDo: Delete all the osm_id accesses and replace it by a centrally located wallet or similar.
-                str_ids_to_delete.append(DhpUtility.get_value_from_field(building_centroids, feature, "osm_id"))
-        centroid_provider.deleteFeatures(ids_to_delete)
-        building_centroids.commitChanges()
-        # Logger().debug(f"Deleted features with ids {', '.join(str_ids_to_delete)}, due to not having a corresponding"
-        #               f"heat demand.")
-
-    def delete_centroids_with_too_large_heat_demand(self):
-        building_centroids = self.buildings_centroids
-        centroid_provider = building_centroids.dataProvider()
-        peak_demand_idx = building_centroids.fields().indexFromName(self.PEAK_DEMAND_COL_NAME)
-        ids_to_delete = []
-        str_ids_to_delete = []
-        for feature in building_centroids.getFeatures():
-            if float(feature.attributes()[peak_demand_idx]) >= float(Config().get_heat_capacity()):
-                # Logger().debug(f"{float(feature.attributes()[peak_demand_idx])} was larger than {float(Config().get_heat_capacity())}")
-                ids_to_delete.append(feature.id())
-                # ToDo: Delete all the osm_id accesses and replace it by a centrally located wallet or similar.
-                str_ids_to_delete.append(DhpUtility.get_value_from_field(building_centroids, feature, "osm_id"))
-        centroid_provider.deleteFeatures(ids_to_delete)
-        building_centroids.commitChanges()
-        # Logger().debug(f"Deleted features with ids {', '.join(str_ids_to_delete)}, due to having a larger heat demand than"
-        #               f"the specified heating source is able to provide.")
\ No newline at end of file
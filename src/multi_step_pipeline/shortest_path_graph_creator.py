@@ -1,4 +1,5 @@
 import networkx as nx
+from scipy import sparse
 
 from ..util import function_timer
 from ..util.logger import Logger
@@ -210,15 +211,33 @@ class ShortestPathGraphCreator:
         #    f'distance sum of {distance_sum}. Result is {cumulated_factor}')
         return cumulated_factor
 
-    def get_adjacency_matrix_with_custom_weights(self, shortest_path_graph):
-        new_graph = shortest_path_graph.copy()
-        for u, v, data in new_graph.edges(data=True):
-            previous_weight = data['weight']
-            new_weight = data['weight'] * new_graph[u][v]['street_type_cost_factor']
-            new_graph.edges[u, v]['weight'] = new_weight
-            # Logger().debug(f"New custom weight for path between {u} and {v} is {new_weight}, was {previous_weight}")
-        adjacency_matrix = nx.adjacency_matrix(new_graph).todense()
-        return adjacency_matrix
+    def get_distance_matrix_with_custom_weights(self, shortest_path_graph, max_distance=None):
+        """
+        Sparse distance matrix of the shortest path graph, where every path length is weighted with its
+        street type cost factor. Only pairs with a weighted distance of at most max_distance are kept,
+        pairs without a path are missing as well. Rows and columns follow the order of shortest_path_graph.nodes().
+
+        :param shortest_path_graph: the shortest path graph.
+        :param max_distance: defaults to eps.
+        :return: symmetric csr matrix.
+        """
+        if max_distance is None:
+            max_distance = float(Config().get_eps())
+        node_positions = {node: position for position, node in enumerate(shortest_path_graph.nodes())}
+        rows = []
+        cols = []
+        distances = []
+        for u, v, data in shortest_path_graph.edges(data=True):
+            distance = data['weight'] * data['street_type_cost_factor']
+            if distance <= max_distance:
+                rows.append(node_positions[u])
+                cols.append(node_positions[v])
+                distances.append(distance)
+        amount_of_nodes = len(node_positions)
+        # explicitly stored zeros are kept, as they mark neighbors.
+        distance_matrix = sparse.csr_matrix((distances + distances, (rows + cols, cols + rows)),
+                                            shape=(amount_of_nodes, amount_of_nodes))
+        return distance_matrix
 
     def is_custom_weight_calculation_necessary(self):
         all_street_type_entries = Config().get_street_type_multipliers()
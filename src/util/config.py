@@ -54,22 +54,48 @@ class Config:
             raise ConfigException("Log Level is not valid.")
         if self.config.get("method") not in ["one-step", "multi-step"]:
             raise ConfigException("Method is not valid.")
-        # data_folder_path = Path(self.config.get("data-folder"))
-        # if not data_folder_path.is_dir():
-        #     raise ConfigException(f"Data Folder {data_folder_path} is not valid.")
-        # roads_file_path = data_folder_path / self.config.get("roads-file-name")
-        # ToDo: Add back in, once we're using files, not layers.
-        # if not roads_file_path.is_file():
-        #     raise ConfigException(f"Roads File {roads_file_path} is not valid.")
-        # buildings_file_path = data_folder_path / self.config.get("buildings-file-name")
-        # if not buildings_file_path.is_file():
-        #     raise ConfigException(f"Buildings File {buildings_file_path} is not valid.")
+        if self.get_input_mode() not in ["layers", "files"]:
+            raise ConfigException("Input mode is not valid.")
+        if self.get_input_mode() == "files":
+            if not os.path.isdir(self.config.get("data-folder", "")):
+                raise ConfigException(f"Data Folder {self.config.get('data-folder')} is not valid.")
+            for file_path in [self.get_roads_path(), self.get_buildings_path(), self.get_heat_demands_path()]:
+                if not os.path.isfile(file_path):
+                    raise ConfigException(f"Input File {file_path} is not valid.")
         if self.config.get("insulation-factor") < 0:
             raise ConfigException(f"Insulation factor is not valid. Needs to be greater than or equal to 0. "
                                   f"but is: {self.config.get('insulation-factor')}")
         if self.config.get("save-graph") not in ["True", "False"]:
             raise ConfigException(f"Invalid entry for save-graph! has to be 'True' or 'False' is "
                                   f"{self.config.get('save-graph')}")
+        if self.config.get("reuse-previous-results", "False") not in ["True", "False"]:
+            raise ConfigException(f"Invalid entry for reuse-previous-results! has to be 'True' or 'False' is "
+                                  f"{self.config.get('reuse-previous-results')}")
+        if self.get_max_cluster_size() != 0 and self.get_max_cluster_size() < 2:
+            raise ConfigException(f"max-cluster-size is invalid. Needs to be 0 or at least 2. "
+                                  f"But is {self.config.get('max-cluster-size')}")
+        if self.config.get("decomposition-boundary-repair", "False") not in ["True", "False"]:
+            raise ConfigException(f"Invalid entry for decomposition-boundary-repair! has to be 'True' or 'False' is "
+                                  f"{self.config.get('decomposition-boundary-repair')}")
+        if self.get_second_stage_workers() < 1:
+            raise ConfigException(f"second-stage-workers is invalid. Needs to be at least 1. "
+                                  f"But is {self.config.get('second-stage-workers')}")
+        if self.get_decoding_workers() < 1:
+            raise ConfigException(f"decoding-workers is invalid. Needs to be at least 1. "
+                                  f"But is {self.config.get('decoding-workers')}")
+        if self.get_decoding_workers() > 1 and self.get_second_stage_workers() > 1:
+            raise ConfigException(f"decoding-workers and second-stage-workers can not both be greater than 1. "
+                                  f"But are {self.config.get('decoding-workers')} "
+                                  f"and {self.config.get('second-stage-workers')}")
+        if self.config.get("lower-bound-pruning", "False") not in ["True", "False"]:
+            raise ConfigException(f"Invalid entry for lower-bound-pruning! has to be 'True' or 'False' is "
+                                  f"{self.config.get('lower-bound-pruning')}")
+        if self.get_brkga_engine() not in ["brkga_mp_ipr", "numpy"]:
+            raise ConfigException(f"Invalid entry for brkga-engine! has to be 'brkga_mp_ipr' or 'numpy' is "
+                                  f"{self.config.get('brkga-engine')}")
+        if self.get_cluster_cost_cache_size() < 0:
+            raise ConfigException(f"cluster-cost-cache-size is invalid. Needs to be greater than or equal to 0. "
+                                  f"But is {self.config.get('cluster-cost-cache-size')}")
         if self.config.get("eps") <= 0.0:
             raise ConfigException(f"Eps is invalid. Needs to be greater than or equal to 0. But is {self.config.get('eps')}")
 
@@ -85,13 +111,17 @@ class Config:
     def get_method(self):
         return self.config.get("method")
 
-    # ToDo: Add back in
-    # def get_roads_path(self):
-    #     return Path(self.config.get("data-folder")) / self.config.get("roads-file-name")
-    #
-    # ToDo: Add back in
-    # def get_buildings_path(self):
-    #     return Path(self.config.get("data-folder")) / self.config.get("buildings-file-name")
+    def get_input_mode(self):
+        return self.config.get("input-mode", "layers")
+
+    def get_roads_path(self):
+        return os.path.join(self.config.get("data-folder"), self.config.get("roads-file-name"))
+
+    def get_buildings_path(self):
+        return os.path.join(self.config.get("data-folder"), self.config.get("buildings-file-name"))
+
+    def get_heat_demands_path(self):
+        return os.path.join(self.config.get("data-folder"), self.config.get("heat-demands-file-name"))
 
     def get_logger_path_name(self):
         return self.config.get("logger-path-name")
@@ -189,6 +219,11 @@ class Config:
                 self.results_folder_path = folder_path
         return self.results_folder_path
 
+    def get_runtime_history_file_path(self):
+        """The runtime history is kept across runs next to the result folders, or in the debug folder without them."""
+        folder_path = self.config.get("results-file-path") or self.DEBUG_FOLDER
+        return os.path.join(folder_path, "brkga_runtime_history.json")
+
     def get_population_factor(self):
         return self.config.get("population-factor")
 
@@ -204,6 +239,35 @@ class Config:
     def get_life_time_of_heating_source(self):
         return int(self.config.get("life-time-in-years"))
 
+    def get_max_cluster_size(self):
+        """0 disables the decomposition of first stage clusters."""
+        return int(self.config.get("max-cluster-size", 0))
+
+    def get_do_boundary_repair(self):
+        return self.config.get("decomposition-boundary-repair", "False").lower() == "true"
+
+    def get_second_stage_workers(self):
+        return int(self.config.get("second-stage-workers", 1))
+
+    def get_decoding_workers(self):
+        return int(self.config.get("decoding-workers", 1))
+
+    def get_extra_populations_for_large_clusters(self):
+        return int(self.config.get("extra-populations-for-large-clusters", 0))
+
+    def get_brkga_engine(self):
+        return self.config.get("brkga-engine", "brkga_mp_ipr")
+
+    def get_lower_bound_pruning(self):
+        return self.config.get("lower-bound-pruning", "False").lower() == "true"
+
+    def get_cluster_cost_cache_size(self):
+        """Maximum number of cluster costs the fitness function keeps. 0 disables the cache."""
+        return int(self.config.get("cluster-cost-cache-size", 100000))
+
+    def get_reuse_previous_results(self):
+        return self.config.get("reuse-previous-results", "False").lower() == "true"
+
     def get_use_random_seed(self):
         return self.config.get("use-random-seed").lower() == "true"
 
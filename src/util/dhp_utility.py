@@ -1,8 +1,9 @@
 from PyQt5.QtCore import QVariant
-from qgis.core import QgsField, QgsFeatureRequest, QgsExpression, QgsVectorLayer, QgsProject
+from qgis.core import QgsField, QgsFeatureRequest, QgsVectorLayer, QgsProject, QgsGeometry
 from qgis import processing
 from .logger import Logger
 from .id_wallet import IdWallet
+from .feature_id_index import FeatureIdIndex
 
 class DhpUtility:
     """Offers utility methods for DHP"""
@@ -72,8 +73,7 @@ class DhpUtility:
         layer.startEditing()
         field_idx = layer.fields().indexFromName(id_field_name)
         value_field_idx = layer.fields().indexFromName(value_field_name)
-        expression = f"{id_field_name} = '{id_value}'"
-        request = QgsFeatureRequest().setFilterExpression(expression)
+        request = FeatureIdIndex().get_request(layer, id_field_name, [id_value])
         for feature in layer.getFeatures(request):
             feature[value_field_idx] = value
             layer.updateFeature(feature)
@@ -194,25 +194,44 @@ class DhpUtility:
 
     @staticmethod
     def get_features_by_id_field(layer, id_field_name, ids):
-        # ToDo: Get all features from specifying request with custom id field.
-        id_string = str.join(", ", ids)
-        expression = QgsExpression(f'"{id_field_name}" IN ({id_string})')
-        request = QgsFeatureRequest(expression)
+        request = FeatureIdIndex().get_request(layer, id_field_name, ids)
         features = layer.getFeatures(request)
         return features
 
     @staticmethod
     def get_feature_by_id_field(layer, id_field_name, id_):
-        expression = QgsExpression(f'"{id_field_name}" IN ({id_})')
-        request = QgsFeatureRequest(expression)
-        feature = layer.getFeatures(request)
-        feature_list = DhpUtility.convert_iterator_to_list(feature)
-        if len(feature_list) > 1:
-            raise Exception(f"Multiple features found for id {id}."
-                            f"Ids in id field may not be unique.")
-        if len(feature_list) == 0:
+        feature_id = FeatureIdIndex().get_feature_id(layer, id_field_name, id_)
+        if feature_id is None:
             return None
-        return feature_list[0]
+        return next(layer.getFeatures(QgsFeatureRequest().setFilterFid(feature_id)), None)
+
+    @staticmethod
+    def get_intersecting_features(layer, geometry: QgsGeometry, request: QgsFeatureRequest = None):
+        """
+        Yields all features of the layer that intersect the given geometry.
+        Candidates are requested by bounding box, so the provider can use its own spatial index.
+        The geometry is prepared once and then tested against each candidate.
+        The layer is neither edited nor committed.
+
+        :param layer: QgsVectorLayer (the layer to search in)
+        :param geometry: QgsGeometry (the geometry to intersect with, in the crs of the layer)
+        :param request: QgsFeatureRequest (optional base request, e.g. to restrict the attributes)
+        """
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        engine.prepareGeometry()
+        if request is None:
+            request = QgsFeatureRequest()
+        request.setFilterRect(geometry.boundingBox())
+        for feature in layer.getFeatures(request):
+            # features without geometry can not intersect anything.
+            if feature.hasGeometry() and engine.intersects(feature.geometry().constGet()):
+                yield feature
+
+    @staticmethod
+    def get_intersecting_feature_ids(layer, geometry: QgsGeometry) -> set:
+        """Returns the ids of all features of the layer that intersect the given geometry."""
+        request = QgsFeatureRequest().setNoAttributes()
+        return {feature.id() for feature in DhpUtility.get_intersecting_features(layer, geometry, request)}
 
     @staticmethod
     def get_value_from_field(layer, feature, field_name):
@@ -224,13 +243,14 @@ class DhpUtility:
     def get_value_from_feature_by_id_field(layer, id_field_name, id_to_find, field_name_to_look_up):
         """Only usable for one id."""
         look_up_field_idx = layer.fields().indexFromName(field_name_to_look_up)
-        expression = QgsExpression(f'"{id_field_name}" IN ({id_to_find})')
-        request = QgsFeatureRequest(expression)
-        feature = layer.getFeatures(request)
-        feature_list = DhpUtility.convert_iterator_to_list(feature)
-        if len(feature_list) > 1:
-            raise Exception(f"More than one feature found for id '{id_field_name}'. Not permitted!")
-        value = feature_list[0][look_up_field_idx]
+        feature_id = FeatureIdIndex().get_feature_id(layer, id_field_name, id_to_find)
+        if feature_id is None:
+            raise Exception(f"No feature found for id {id_to_find} in field '{id_field_name}'.")
+        request = (QgsFeatureRequest()
+                   .setFilterFid(feature_id)
+                   .setFlags(QgsFeatureRequest.NoGeometry)
+                   .setSubsetOfAttributes([look_up_field_idx]))
+        value = next(layer.getFeatures(request))[look_up_field_idx]
         return value
 
     @staticmethod
@@ -245,13 +265,11 @@ class DhpUtility:
 
     @staticmethod
     def get_xy_by_id_field(layer, id_field_name, id):
-        expression = QgsExpression(f'"{id_field_name}" IN ({id})')
-        request = QgsFeatureRequest(expression)
-        feature = layer.getFeatures(request)
-        feature_list = DhpUtility.convert_iterator_to_list(feature)
-        if len(feature_list) > 1:
-            raise Exception(f"More than one feature found for id '{id_field_name}'. Not permitted!")
-        feature_geom = feature_list[0].geometry()
+        feature_id = FeatureIdIndex().get_feature_id(layer, id_field_name, id)
+        if feature_id is None:
+            raise Exception(f"No feature found for id {id} in field '{id_field_name}'.")
+        request = QgsFeatureRequest().setFilterFid(feature_id).setNoAttributes()
+        feature_geom = next(layer.getFeatures(request)).geometry()
         feature_xy = (feature_geom.asPoint().x(), feature_geom.asPoint().y())
         return feature_xy
 
@@ -0,0 +1,96 @@
+from qgis.core import QgsFeatureRequest
+
+
+class FeatureIdIndex:
+    """Maps the values of custom id fields (e.g. osm_id) to feature ids.
+    Every layer only gets iterated once per id field. Features can then be requested by their feature ids,
+    so QGIS does not need to evaluate an expression against every feature.
+    The index of a layer is dropped as soon as features get added or deleted or an indexed field is changed."""
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """layer id : {id_field : {id : [feature ids]}}"""
+        if not hasattr(self, '_initialized') or not self._initialized:
+            self.indices = {}
+            self.feature_counts = {}
+            self.observed_layers = set()
+            self._initialized = True
+
+    def get_feature_ids(self, layer, id_field_name, ids):
+        """Returns the feature ids of all features with one of the given ids. Unknown ids are ignored."""
+        index = self._get_index(layer, id_field_name)
+        feature_ids = []
+        for id_ in ids:
+            feature_ids.extend(index.get(str(id_), []))
+        return feature_ids
+
+    def get_feature_id(self, layer, id_field_name, id_):
+        """Returns the feature id of the feature with the given id or None, if there is none."""
+        feature_ids = self._get_index(layer, id_field_name).get(str(id_), [])
+        if len(feature_ids) > 1:
+            raise Exception(f"Multiple features found for id {id_}."
+                            f"Ids in id field may not be unique.")
+        if not feature_ids:
+            return None
+        return feature_ids[0]
+
+    def get_request(self, layer, id_field_name, ids):
+        return QgsFeatureRequest().setFilterFids(self.get_feature_ids(layer, id_field_name, ids))
+
+    def invalidate(self, layer_id):
+        self.indices.pop(layer_id, None)
+        self.feature_counts.pop(layer_id, None)
+
+    def _get_index(self, layer, id_field_name):
+        layer_id = layer.id()
+        # edits made directly on the provider don't emit the signals of the layer.
+        if self.feature_counts.get(layer_id) != layer.featureCount():
+            self.invalidate(layer_id)
+        layer_indices = self.indices.setdefault(layer_id, {})
+        self.feature_counts[layer_id] = layer.featureCount()
+        if id_field_name not in layer_indices:
+            self._observe(layer)
+            id_field_idx = layer.fields().indexFromName(id_field_name)
+            if id_field_idx == -1:
+                raise Exception(f"Layer {layer.name()} has no field {id_field_name}.")
+            request = (QgsFeatureRequest()
+                       .setFlags(QgsFeatureRequest.NoGeometry)
+                       .setSubsetOfAttributes([id_field_idx]))
+            index = {}
+            for feature in layer.getFeatures(request):
+                index.setdefault(str(feature[id_field_idx]), []).append(feature.id())
+            layer_indices[id_field_name] = index
+        return layer_indices[id_field_name]
+
+    def _observe(self, layer):
+        layer_id = layer.id()
+        if layer_id in self.observed_layers:
+            return
+        invalidate = lambda *args: self.invalidate(layer_id)
+        layer.featureAdded.connect(invalidate)
+        layer.featuresDeleted.connect(invalidate)
+        # feature ids of added features change when they get committed.
+        layer.committedFeaturesAdded.connect(invalidate)
+        layer.committedFeaturesRemoved.connect(invalidate)
+        layer.afterRollBack.connect(invalidate)
+        layer.attributeValueChanged.connect(lambda feature_id, idx, value: self._on_attribute_value_changed(layer,
+                                                                                                            idx))
+        layer.dataProvider().dataChanged.connect(invalidate)
+        layer.willBeDeleted.connect(lambda: self._forget(layer_id))
+        self.observed_layers.add(layer_id)
+
+    def _on_attribute_value_changed(self, layer, idx):
+        layer_indices = self.indices.get(layer.id())
+        if layer_indices and layer.fields().at(idx).name() in layer_indices:
+            self.invalidate(layer.id())
+
+    def _forget(self, layer_id):
+        self.invalidate(layer_id)
+        self.observed_layers.discard(layer_id)
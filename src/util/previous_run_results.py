@@ -0,0 +1,60 @@
+from .logger import Logger
+
+
+class PreviousRunResults:
+    """Holds results of the previous run that can be reused as a whole: the distances between pairs of buildings
+    that did not change, and the brkga result of every cluster whose buildings, graph and config did not change.
+    Everything else, including both clustering stages, is computed again."""
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized') or not self._initialized:
+            self.building_geometry_hashes = {}
+            """osm_id : hash of the geometry of the building"""
+            self.pair_distances = {}
+            """(osm_id, osm_id) : distance. Only contains pairs within pair_distances_eps."""
+            self.pair_distances_eps = None
+            self.brkga_results = {}
+            """(frozenset of members, fingerprint) : result of the brkga"""
+            self._initialized = True
+
+    def get_unchanged_buildings(self, building_geometry_hashes, eps):
+        """Returns the osm_ids of all buildings whose distances of the previous run are still valid."""
+        added = building_geometry_hashes.keys() - self.building_geometry_hashes.keys()
+        removed = self.building_geometry_hashes.keys() - building_geometry_hashes.keys()
+        unchanged = {osm_id for osm_id, geometry_hash in building_geometry_hashes.items()
+                     if self.building_geometry_hashes.get(osm_id) == geometry_hash}
+        changed = len(building_geometry_hashes) - len(added) - len(unchanged)
+        Logger().info(f"Reusing previous results: {len(added)} buildings added, {len(removed)} removed "
+                      f"and {changed} changed since the previous run.")
+        # pairs missing in the previous run were further apart than its eps.
+        if self.pair_distances_eps is None or eps > self.pair_distances_eps:
+            return set()
+        return unchanged
+
+    @staticmethod
+    def get_pair_key(osm_id_1, osm_id_2):
+        osm_id_1, osm_id_2 = str(osm_id_1), str(osm_id_2)
+        return (osm_id_1, osm_id_2) if osm_id_1 < osm_id_2 else (osm_id_2, osm_id_1)
+
+    def update_pair_distances(self, building_geometry_hashes, pair_distances, eps):
+        self.building_geometry_hashes = building_geometry_hashes
+        self.pair_distances = pair_distances
+        self.pair_distances_eps = eps
+
+    def get_brkga_result(self, key):
+        return self.brkga_results.get(key)
+
+    def set_brkga_result(self, key, result):
+        self.brkga_results[key] = result
+
+    def retain_brkga_results(self, keys):
+        """Drops the results of all clusters that do not exist anymore."""
+        self.brkga_results = {key: result for key, result in self.brkga_results.items() if key in keys}
@@ -0,0 +1,34 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .logger import Logger
+
+
+class ProcessPool:
+    """Creates the process pools of the second stage and of the chromosome decoding.
+
+    The plugin can only be loaded within QGIS, so the workers are forked from the QGIS process.
+    A forked worker only gets the forking thread, so locks that other threads of QGIS held at that moment
+    stay locked in it. Workers must therefore only get plain data and never touch layers or other QGIS objects.
+    Both pools are opt-in and can not be combined, see Config.config_validation."""
+
+    @staticmethod
+    def is_available():
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    @staticmethod
+    def get_usable_workers(workers, description):
+        """Returns 1 if a pool would be needed but can not be created on this platform."""
+        if workers > 1 and not ProcessPool.is_available():
+            Logger().warning(f"Process pools need the fork start method, which is not available on this platform. "
+                             f"{description} sequentially.")
+            return 1
+        return workers
+
+    @staticmethod
+    def create_executor(workers, description, initializer=None, initargs=()):
+        Logger().warning(f"{description} in {workers} worker processes forked from the QGIS process.")
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context("fork"),
+                                   initializer=initializer,
+                                   initargs=initargs)
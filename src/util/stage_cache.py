@@ -0,0 +1,58 @@
+class StageCache:
+    """Holds values derived from layers, so that they survive multiple runs of the pipeline.
+    All entries of a layer are dropped as soon as the data of the layer changes."""
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """layer id : {key : value}"""
+        if not hasattr(self, '_initialized') or not self._initialized:
+            self.entries = {}
+            self.feature_counts = {}
+            self.observed_layers = set()
+            self._initialized = True
+
+    def get(self, layer, key, default=None):
+        layer_id = layer.id()
+        # edits made directly on the provider don't emit the signals of the layer.
+        if self.feature_counts.get(layer_id) != layer.featureCount():
+            self.invalidate(layer_id)
+        return self.entries.get(layer_id, {}).get(key, default)
+
+    def set(self, layer, key, value):
+        self.observe(layer)
+        layer_id = layer.id()
+        if layer_id not in self.entries:
+            self.entries[layer_id] = {}
+            self.feature_counts[layer_id] = layer.featureCount()
+        self.entries[layer_id][key] = value
+
+    def get_or_create(self, layer, key, factory):
+        value = self.get(layer, key)
+        if value is None:
+            value = factory()
+            self.set(layer, key, value)
+        return value
+
+    def invalidate(self, layer_id):
+        self.entries.pop(layer_id, None)
+        self.feature_counts.pop(layer_id, None)
+
+    def observe(self, layer):
+        layer_id = layer.id()
+        if layer_id in self.observed_layers:
+            return
+        layer.dataChanged.connect(lambda: self.invalidate(layer_id))
+        layer.dataProvider().dataChanged.connect(lambda: self.invalidate(layer_id))
+        layer.willBeDeleted.connect(lambda: self.forget(layer_id))
+        self.observed_layers.add(layer_id)
+
+    def forget(self, layer_id):
+        self.invalidate(layer_id)
+        self.observed_layers.discard(layer_id)
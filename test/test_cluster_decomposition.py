@@ -0,0 +1,110 @@
+# coding=utf-8
+"""ClusterDecomposition tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.multi_step_pipeline.cluster_decomposition import ClusterDecomposition
+from src.util.config import Config
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ClusterDecompositionTest(unittest.TestCase):
+    """Test the bisection of clusters larger than max-cluster-size."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.previous_config = dict(Config().config)
+        coordinates = np.random.default_rng(3).uniform(0, 1000, (200, 2))
+        self.distance_matrix = np.linalg.norm(coordinates[:, None] - coordinates[None], axis=2)
+        self.distance_matrix[self.distance_matrix > 250] = np.inf
+        np.fill_diagonal(self.distance_matrix, 0.0)
+
+    def tearDown(self):
+        """Runs after each test."""
+        Config().config.clear()
+        Config().config.update(self.previous_config)
+
+    def test_spectral_bisection_matches_dense_fiedler_vector(self):
+        """The sparse eigensolver splits the members like the dense one."""
+        members = np.arange(len(self.distance_matrix))
+        first_half, second_half = ClusterDecomposition.spectral_bisection(members, self.distance_matrix)
+        distances = self.distance_matrix
+        sigma = np.median(distances[np.isfinite(distances) & (distances > 0)])
+        affinity = np.exp(-(distances / sigma) ** 2)
+        np.fill_diagonal(affinity, 0.0)
+        _, eigenvectors = np.linalg.eigh(np.diag(affinity.sum(axis=1)) - affinity)
+        fiedler_vector = eigenvectors[:, 1]
+        if fiedler_vector[np.argmax(np.abs(fiedler_vector))] < 0:
+            fiedler_vector = -fiedler_vector
+        order = np.argsort(fiedler_vector, kind="stable")
+        self.assertEqual(set(first_half.tolist()), set(order[:len(members) // 2].tolist()))
+        self.assertEqual(len(first_half) + len(second_half), len(members))
+
+    def test_parts_respect_max_cluster_size(self):
+        """Parts are not larger than max-cluster-size and contain at least two buildings."""
+        members = np.arange(len(self.distance_matrix))
+        for max_cluster_size in (3, 7, 30):
+            parts = ClusterDecomposition().bisect_recursively(members, self.distance_matrix, max_cluster_size)
+            parts, dropped_members = ClusterDecomposition.merge_single_building_parts(parts, self.distance_matrix,
+                                                                                      max_cluster_size)
+            self.assertTrue(all(2 <= len(part) <= max_cluster_size for part in parts))
+            self.assertEqual(sorted(np.concatenate(parts).tolist() + dropped_members), members.tolist())
+
+    def test_no_single_building_parts(self):
+        """Three buildings with a max-cluster-size of 2 do not leave a single building cluster."""
+        distance_matrix = np.array([[0.0, 1.0, 5.0],
+                                    [1.0, 0.0, 4.0],
+                                    [5.0, 4.0, 0.0]])
+        parts = ClusterDecomposition().bisect_recursively(np.arange(3), distance_matrix, 2)
+        parts, dropped_members = ClusterDecomposition.merge_single_building_parts(parts, distance_matrix, 2)
+        self.assertEqual([len(part) for part in parts], [2])
+        self.assertEqual(len(dropped_members), 1)
+
+    def test_decomposed_clusters_keep_all_buildings(self):
+        """The buildings of the decomposed clusters and the dropped buildings are the buildings of the input cluster."""
+        building_ids = [str(5000 + i) for i in range(len(self.distance_matrix))]
+        graph = nx.Graph()
+        for i, j in zip(*np.nonzero(np.isfinite(self.distance_matrix))):
+            if i < j:
+                graph.add_edge(f"node_{i}", f"node_{j}", weight=float(self.distance_matrix[i, j]))
+        translation_dict = {building_id: f"node_{i}" for i, building_id in enumerate(building_ids)}
+        # three buildings in a row with a max-cluster-size of 2 always leave one building without a cluster.
+        first_stage_cluster_dict = {0: building_ids[3:], 1: building_ids[:3]}
+        graph.add_edge("node_0", "node_1", weight=1.0)
+        graph.add_edge("node_1", "node_2", weight=1.0)
+        graph.add_edge("node_0", "node_2", weight=2.0)
+        for max_cluster_size, do_boundary_repair in ((2, "False"), (7, "True"), (30, "False")):
+            Config().config["max-cluster-size"] = max_cluster_size
+            Config().config["decomposition-boundary-repair"] = do_boundary_repair
+            cluster_decomposition = ClusterDecomposition()
+            cluster_decomposition.set_required_fields(graph, translation_dict, first_stage_cluster_dict)
+            result = cluster_decomposition.start()
+            decomposed_buildings = [building_id for cluster in result.values() for building_id in cluster]
+            self.assertEqual(len(decomposed_buildings), len(set(decomposed_buildings)))
+            self.assertEqual(sorted(decomposed_buildings + cluster_decomposition.non_members), sorted(building_ids))
+            self.assertTrue(all(2 <= len(cluster) <= max_cluster_size for cluster in result.values()))
+            if max_cluster_size == 2:
+                self.assertGreater(len(cluster_decomposition.non_members), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClusterDecompositionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
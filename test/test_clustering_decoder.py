@@ -0,0 +1,90 @@
+# coding=utf-8
+"""ClusteringDecoder tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import math
+import unittest
+
+import numpy as np
+
+from src.multi_step_pipeline.brkga.clustering_decoder import ClusteringDecoder
+from src.multi_step_pipeline.brkga.fitness_function import FitnessFunction
+
+from utilities import get_qgis_app, load_pipe_catalogue, make_random_clustering_instance
+
+QGIS_APP = get_qgis_app()
+
+
+class ClusteringDecoderTest(unittest.TestCase):
+    """Test the batch decoding of chromosomes."""
+
+    NUMBER_OF_BUILDINGS = 30
+    NUMBER_OF_CLUSTERS = 4
+
+    def setUp(self):
+        """Runs before each test."""
+        self.instance = make_random_clustering_instance(self.NUMBER_OF_BUILDINGS, 7)
+        self.catalogue_df, self.pipe_prices = load_pipe_catalogue()
+        self.chromosomes = np.random.default_rng(8).random((100, len(self.instance.members)))
+
+    def create_decoder(self):
+        """Decoder without the cluster cost cache, so every cluster is costed."""
+        fitness_function = FitnessFunction(self.instance, self.instance.id_to_node_translation_dict,
+                                           self.catalogue_df, self.pipe_prices)
+        fitness_function.cluster_cost_cache_size = 0
+        return ClusteringDecoder(self.instance, self.NUMBER_OF_CLUSTERS, fitness_function, "single")
+
+    def test_decode_batch_matches_single_decodes(self):
+        """The batch gives the fitness the cluster dict of every single chromosome gets."""
+        batch_fitness_values = self.create_decoder().decode_batch(self.chromosomes)
+        single_decoder = self.create_decoder()
+        number_of_invalid_chromosomes = 0
+        for chromosome, batch_fitness in zip(self.chromosomes, batch_fitness_values):
+            cluster_dict = single_decoder.decode_chromosome(chromosome.tolist())
+            if cluster_dict == ClusteringDecoder.CONSTRAINT_BROKEN_PENALTY:
+                number_of_invalid_chromosomes += 1
+                self.assertEqual(batch_fitness, ClusteringDecoder.CONSTRAINT_BROKEN_PENALTY)
+                continue
+            self.assertAlmostEqual(batch_fitness, single_decoder.evaluate_solution(cluster_dict),
+                                   delta=abs(batch_fitness) * 1e-9)
+        self.assertLess(number_of_invalid_chromosomes, len(self.chromosomes))
+
+    def test_decode_batch_reuses_clusters_of_the_reference(self):
+        """Clusters that did not change since the best chromosome decoded so far are not costed again."""
+        decoder = self.create_decoder()
+        penalty = ClusteringDecoder.CONSTRAINT_BROKEN_PENALTY
+        chromosome = next(chromosome for chromosome in self.chromosomes
+                          if decoder.decode_chromosome(chromosome.tolist()) != penalty)
+        fitness_values = decoder.decode_batch([chromosome, chromosome])
+        self.assertEqual(fitness_values[0], fitness_values[1])
+        self.assertEqual(decoder.number_of_reused_clusters, self.NUMBER_OF_CLUSTERS)
+
+    def test_lower_bound_never_exceeds_exact_fitness(self):
+        """With a pruning threshold below every fitness, every chromosome only gets its lower bound."""
+        exact_fitness_values = self.create_decoder().decode_batch(self.chromosomes)
+        pruning_decoder = self.create_decoder()
+        pruning_decoder.pruning_threshold = -math.inf
+        for chromosome, exact_fitness in zip(self.chromosomes, exact_fitness_values):
+            # without a reference, all clusters of the chromosome are bounded.
+            pruning_decoder.reference_cluster_labels = None
+            lower_bound = pruning_decoder.decode_batch([chromosome])[0]
+            self.assertLessEqual(lower_bound, exact_fitness)
+        valid_chromosomes = sum(fitness != ClusteringDecoder.CONSTRAINT_BROKEN_PENALTY
+                                for fitness in exact_fitness_values)
+        self.assertEqual(pruning_decoder.number_of_pruned_decodes, valid_chromosomes)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClusteringDecoderTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
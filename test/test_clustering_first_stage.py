@@ -0,0 +1,69 @@
+# coding=utf-8
+"""ClusteringFirstStage tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from src.multi_step_pipeline.clustering_first_stage import ClusteringFirstStage
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ClusteringFirstStageTest(unittest.TestCase):
+    """Test the clustering of transitively connected buildings against DBSCAN."""
+
+    EPS = 30.0
+    NO_CONNECTION = 1e9
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(3)
+        coordinates = rng.uniform(0, 400, (80, 2))
+        distances = np.linalg.norm(coordinates[:, None] - coordinates[None], axis=2)
+        # like calculate_distances_between_points, only pairs within eps are stored.
+        distances[distances > self.EPS] = 0.0
+        self.distance_matrix = sparse.csr_matrix(distances)
+        self.labels = [str(2000 + i) for i in range(len(coordinates))]
+        self.sample_weights = rng.uniform(0.1, 1.0, len(coordinates))
+        self.first_stage = ClusteringFirstStage("nearest_point")
+
+    def create_zeroed_distance_matrix(self):
+        """Dense matrix with all distances within a neighborhood set to 0, as DBSCAN used to get it."""
+        _, neighborhoods = connected_components(self.distance_matrix, directed=False)
+        zeroed_distances = np.where(neighborhoods[:, None] == neighborhoods[None], 0.0, self.NO_CONNECTION)
+        return zeroed_distances
+
+    def test_cluster_transient_connections_matches_dbscan(self):
+        """Same labels as DBSCAN on the zeroed matrix, for several min_samples."""
+        zeroed_distances = self.create_zeroed_distance_matrix()
+        for min_samples in (1, 2, 3):
+            cluster_results = self.first_stage.cluster_transient_connections(
+                self.distance_matrix, self.labels, min_samples, self.sample_weights, eps=self.EPS)
+            expected_results = self.first_stage.do_clustering_with_custom_metric(
+                zeroed_distances, self.labels, min_samples, self.sample_weights, eps=self.EPS)
+            pd.testing.assert_frame_equal(cluster_results, expected_results, check_dtype=False)
+            if min_samples > 1:
+                self.assertIn(-1, cluster_results[ClusteringFirstStage.CLUSTER_RESULTS_CLUSTER_COL_NAME].tolist())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClusteringFirstStageTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
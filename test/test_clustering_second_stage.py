@@ -0,0 +1,94 @@
+# coding=utf-8
+"""ClusteringSecondStage tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.multi_step_pipeline.cluster_job import ClusterJob
+from src.multi_step_pipeline.clustering_second_stage import ClusteringSecondStage
+from src.util.config import Config
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ClusteringSecondStageTest(unittest.TestCase):
+    """Test running the brkga of the clusters in a process pool."""
+
+    CONFIG_OVERRIDES = {"use-random-seed": "False", "do-warm-start": "True", "log-detailed-results": "True",
+                        "num-generations-to-break": 2}
+
+    def setUp(self):
+        """Runs before each test."""
+        self.results_folder = tempfile.TemporaryDirectory()
+        self.previous_config = dict(Config().config)
+        Config().config.update(self.CONFIG_OVERRIDES)
+        Config().config["results-file-path"] = self.results_folder.name
+
+    def tearDown(self):
+        """Runs after each test."""
+        Config().config.clear()
+        Config().config.update(self.previous_config)
+        self.results_folder.cleanup()
+
+    @staticmethod
+    def create_cluster_jobs():
+        """Three clusters of eight buildings each, fully connected by their euclidean distances."""
+        rng = np.random.default_rng(5)
+        cluster_jobs = []
+        for cluster_id in range(3):
+            building_ids = [f"{cluster_id}{i:03d}" for i in range(8)]
+            coordinates = rng.uniform(0, 300, (len(building_ids), 2))
+            graph = nx.Graph()
+            for i in range(len(building_ids)):
+                for j in range(i + 1, len(building_ids)):
+                    graph.add_edge(building_ids[i], building_ids[j],
+                                   weight=float(np.linalg.norm(coordinates[i] - coordinates[j])), edge_ids=[i, j])
+            demands = {building_id: float(rng.uniform(5, 30)) for building_id in building_ids}
+            warm_start = {0: {"cluster_center": building_ids[0], "member_list": list(building_ids)},
+                          -1: {"member_list": []}}
+            cluster_jobs.append((cluster_id, ClusterJob(cluster_id=cluster_id,
+                                                        graph=graph,
+                                                        max_capacity=250,
+                                                        demands=demands,
+                                                        yearly_demands={building_id: demand * 1000 for
+                                                                        building_id, demand in demands.items()},
+                                                        members=list(building_ids),
+                                                        number_of_clusters=1,
+                                                        warm_start=warm_start,
+                                                        total_distance=0.0,
+                                                        pivot_element="single")))
+        return cluster_jobs
+
+    def run_cluster_jobs(self, workers):
+        Config().config["second-stage-workers"] = workers
+        return [(position, result) for position, _, result in
+                ClusteringSecondStage().run_cluster_jobs(self.create_cluster_jobs())]
+
+    def test_pooled_and_sequential_results_are_identical(self):
+        """With a fixed seed, the process pool returns the results of the sequential run in the same order."""
+        sequential_results = self.run_cluster_jobs(1)
+        pooled_results = self.run_cluster_jobs(2)
+        self.assertEqual([position for position, _ in pooled_results], [0, 1, 2])
+        self.assertEqual(pooled_results, sequential_results)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClusteringSecondStageTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,180 @@
+# coding=utf-8
+"""ClusteringSecondStageFeasibleSolutionCreator tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import copy
+import unittest
+
+import numpy as np
+from scipy.spatial.distance import euclidean
+
+from src.multi_step_pipeline.clustering_second_stage_feasible_solution_creator import \
+    ClusteringSecondStageFeasibleSolutionCreator
+from src.util.config import Config
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ClusteringSecondStageFeasibleSolutionCreatorTest(unittest.TestCase):
+    """Test the repair on arrays against the repair that looked up every member on its own."""
+
+    HEAT_CAPACITY = 250
+    NUMBER_OF_BUILDINGS = 120
+    NUMBER_OF_CLUSTERS = 8
+
+    def setUp(self):
+        """Runs before each test."""
+        self.previous_heat_capacity = Config().config.get("heat-capacity")
+        Config().config["heat-capacity"] = self.HEAT_CAPACITY
+        self.creator = ClusteringSecondStageFeasibleSolutionCreator()
+
+    def tearDown(self):
+        """Runs after each test."""
+        Config().config["heat-capacity"] = self.previous_heat_capacity
+
+    def create_instance(self, seed):
+        """Buildings on an integer grid, so that distances to members and cluster centers are often equal."""
+        rng = np.random.default_rng(seed)
+        member_ids = [str(3000 + i) for i in range(self.NUMBER_OF_BUILDINGS)]
+        member_xy = {member: tuple(float(value) for value in rng.integers(0, 20, 2)) for member in member_ids}
+        demands = {member: float(rng.uniform(5, 40)) for member in member_ids}
+        cluster_ids = list(range(self.NUMBER_OF_CLUSTERS))
+        cluster_center_dict = {cluster_id: tuple(float(value) for value in rng.integers(0, 20, 2))
+                               for cluster_id in cluster_ids}
+        # two clusters share their center.
+        cluster_center_dict[cluster_ids[-1]] = cluster_center_dict[cluster_ids[0]]
+        cluster_dict = {cluster_id: [] for cluster_id in cluster_ids}
+        # uneven cluster sizes, so some clusters exceed the heat capacity and others have room left.
+        for member, cluster_id in zip(member_ids, rng.choice(cluster_ids, len(member_ids),
+                                                             p=np.linspace(1, 3, len(cluster_ids)) / 16)):
+            cluster_dict[int(cluster_id)].append(member)
+        return cluster_dict, cluster_center_dict, member_xy, demands
+
+    def load_member_data(self, member_xy, demands):
+        """Fills the arrays load_member_data would fetch from the info layer."""
+        member_ids = list(member_xy.keys())
+        self.creator.member_positions = {member: position for position, member in enumerate(member_ids)}
+        self.creator.member_xy = np.array([member_xy[member] for member in member_ids], dtype=float)
+        self.creator.member_demands = np.array([demands[member] for member in member_ids], dtype=float)
+
+    def make_solution_feasible(self, cluster_dict, cluster_center_dict):
+        """make_solution_feasible without the layer request."""
+        creator = self.creator
+        distance_ranking_dict = creator.create_distance_ranking_dict(cluster_dict, cluster_center_dict)
+        dict_with_capacity = creator.add_capacity_field_to_cluster_dict(distance_ranking_dict)
+        feasible_solution, no_member_list = creator.swap_cluster_membership_until_solution_feasible(
+            dict_with_capacity, cluster_center_dict, [])
+        solution = creator.add_cluster_center_to_cluster_dict(feasible_solution, cluster_center_dict)
+        solution = creator.add_sum_of_distances_field_per_cluster(solution)
+        solution = creator.add_total_sum_of_distances_field(solution)
+        return creator.add_non_members_to_cluster_dict(solution, no_member_list)
+
+    def make_solution_feasible_by_lookups(self, cluster_dict, cluster_center_dict, member_xy, demands):
+        """The repair as it was before, with a lookup per member and cluster center.
+        Only the distance sums differ, they used to be carried over from one cluster to the next."""
+        creator_class = ClusteringSecondStageFeasibleSolutionCreator
+        member_list_key = creator_class.MEMBER_LIST_KEY
+        capacity_key = creator_class.CURRENT_CAPACITY_KEY
+        solution = {}
+        for cluster_id, member_list in cluster_dict.items():
+            ranking = sorted(((member, euclidean(member_xy[member], cluster_center_dict[cluster_id]))
+                              for member in member_list), key=lambda x: x[1], reverse=True)
+            capacity = float(self.HEAT_CAPACITY)
+            for member, _ in ranking:
+                capacity -= demands[member]
+            solution[cluster_id] = {member_list_key: [member for member, _ in ranking], capacity_key: capacity}
+        no_member_list = []
+        for cluster_id, inner_dict in solution.items():
+            if inner_dict[capacity_key] >= 0:
+                continue
+            for candidate in list(inner_dict[member_list_key]):
+                demand = demands[candidate]
+                cluster_centers_ranked = sorted(((center_id, euclidean(center_xy, member_xy[candidate]))
+                                                 for center_id, center_xy in cluster_center_dict.items()),
+                                                key=lambda x: x[1])
+                swapped = False
+                for center_id, _ in cluster_centers_ranked:
+                    if solution[center_id][capacity_key] > demand:
+                        inner_dict[member_list_key].remove(candidate)
+                        inner_dict[capacity_key] += demand
+                        solution[center_id][member_list_key].append(candidate)
+                        solution[center_id][capacity_key] -= demand
+                        swapped = True
+                        break
+                if inner_dict[capacity_key] >= 0:
+                    break
+                if not swapped:
+                    inner_dict[member_list_key].remove(candidate)
+                    inner_dict[capacity_key] += demand
+                    no_member_list.append(candidate)
+        for cluster_id, inner_dict in solution.items():
+            total_distance = 0.0
+            closest_building_id = -1
+            closest_distance = float('inf')
+            for member in inner_dict[member_list_key]:
+                distance = euclidean(cluster_center_dict[cluster_id], member_xy[member])
+                if distance < closest_distance:
+                    closest_distance = distance
+                    closest_building_id = member
+            inner_dict[creator_class.CLUSTER_CENTER_BUILDING_KEY] = closest_building_id
+            for member in inner_dict[member_list_key]:
+                total_distance += euclidean(member_xy[closest_building_id], member_xy[member])
+            inner_dict[creator_class.SUM_OF_DISTANCES_PER_CLUSTER_KEY] = total_distance
+        return solution, no_member_list
+
+    def test_repair_matches_lookups(self):
+        """Same members, capacities, non-members and cluster centers as the repair with lookups."""
+        creator_class = ClusteringSecondStageFeasibleSolutionCreator
+        number_of_non_members = 0
+        for seed in range(5):
+            cluster_dict, cluster_center_dict, member_xy, demands = self.create_instance(seed)
+            self.load_member_data(member_xy, demands)
+            expected_clusters, expected_non_members = self.make_solution_feasible_by_lookups(
+                copy.deepcopy(cluster_dict), cluster_center_dict, member_xy, demands)
+            result = self.make_solution_feasible(copy.deepcopy(cluster_dict), cluster_center_dict)
+            clusters = result[creator_class.CLUSTERS_KEY]
+            self.assertEqual(clusters[creator_class.NON_MEMBER_KEY][creator_class.MEMBER_LIST_KEY],
+                             expected_non_members)
+            number_of_non_members += len(expected_non_members)
+            for cluster_id, expected in expected_clusters.items():
+                inner_dict = clusters[cluster_id]
+                self.assertEqual(inner_dict[creator_class.MEMBER_LIST_KEY], expected[creator_class.MEMBER_LIST_KEY])
+                self.assertEqual(inner_dict[creator_class.CURRENT_CAPACITY_KEY],
+                                 expected[creator_class.CURRENT_CAPACITY_KEY])
+                self.assertEqual(inner_dict[creator_class.CLUSTER_CENTER_BUILDING_KEY],
+                                 expected[creator_class.CLUSTER_CENTER_BUILDING_KEY])
+                self.assertAlmostEqual(inner_dict[creator_class.SUM_OF_DISTANCES_PER_CLUSTER_KEY],
+                                       expected[creator_class.SUM_OF_DISTANCES_PER_CLUSTER_KEY], places=9)
+                self.assertGreaterEqual(inner_dict[creator_class.CURRENT_CAPACITY_KEY], 0)
+        # the instances are tight enough that some members can not be placed anywhere.
+        self.assertGreater(number_of_non_members, 0)
+
+    def test_distance_sums_per_cluster(self):
+        """Every cluster sums only the distances of its own members. A cluster without members has no center."""
+        self.load_member_data({"1": (0.0, 0.0), "2": (3.0, 4.0)}, {"1": 10.0, "2": 10.0})
+        result = self.make_solution_feasible({0: ["1", "2"], 1: []}, {0: (0.0, 0.0), 1: (50.0, 50.0)})
+        clusters = result[ClusteringSecondStageFeasibleSolutionCreator.CLUSTERS_KEY]
+        self.assertEqual(clusters[1][ClusteringSecondStageFeasibleSolutionCreator.CLUSTER_CENTER_BUILDING_KEY], -1)
+        self.assertEqual(clusters[0][ClusteringSecondStageFeasibleSolutionCreator.SUM_OF_DISTANCES_PER_CLUSTER_KEY],
+                         5.0)
+        self.assertEqual(clusters[1][ClusteringSecondStageFeasibleSolutionCreator.SUM_OF_DISTANCES_PER_CLUSTER_KEY],
+                         0.0)
+        self.assertEqual(result[ClusteringSecondStageFeasibleSolutionCreator.TOTAL_SUM_OF_DISTANCES_KEY], 5.0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ClusteringSecondStageFeasibleSolutionCreatorTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,98 @@
+# coding=utf-8
+"""DeferredDecodingBrkga tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+from brkga_mp_ipr.algorithm import BrkgaMpIpr
+from brkga_mp_ipr.enums import Sense
+from brkga_mp_ipr.types_io import load_configuration
+
+from src.multi_step_pipeline.brkga.brkga import Brkga
+from src.multi_step_pipeline.brkga.brkga_mp_ipr_populations import BrkgaMpIprPopulations
+from src.multi_step_pipeline.brkga.deferred_decoding_brkga import DeferredDecodingBrkga
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class SumDecoder:
+    """Decodes a chromosome to the sum of its keys and counts the batches it gets."""
+
+    def __init__(self):
+        self.number_of_batches = 0
+
+    def decode(self, chromosome, rewrite):
+        return sum(chromosome)
+
+    def evaluate(self, chromosomes):
+        self.number_of_batches += 1
+        return [self.decode(chromosome, True) for chromosome in chromosomes]
+
+
+class DeferredDecodingBrkgaTest(unittest.TestCase):
+    """Test the batch evaluation against brkga_mp_ipr decoding one chromosome after another."""
+
+    CHROMOSOME_SIZE = 15
+
+    def setUp(self):
+        """Runs before each test."""
+        self.params, _ = load_configuration(Brkga.CONFIG_FILE_PATH)
+        self.params.population_size = 40
+
+    def create_brkgas(self, sense):
+        kwargs = dict(sense=sense, seed=3, chromosome_size=self.CHROMOSOME_SIZE, params=self.params)
+        evaluation = SumDecoder()
+        brkga = BrkgaMpIpr(decoder=SumDecoder(), **kwargs)
+        deferred_brkga = DeferredDecodingBrkga(evaluation=evaluation, **kwargs)
+        return brkga, deferred_brkga, evaluation
+
+    def assert_same_populations(self, brkga, deferred_brkga):
+        for population_index in range(self.params.num_independent_populations):
+            self.assertEqual(BrkgaMpIprPopulations.get_fitness(deferred_brkga, population_index),
+                             BrkgaMpIprPopulations.get_fitness(brkga, population_index))
+            self.assertEqual(deferred_brkga.get_current_population(population_index).chromosomes,
+                             brkga.get_current_population(population_index).chromosomes)
+
+    def test_populations_match_brkga_mp_ipr(self):
+        """Same chromosomes and fitness in every population, with one batch per generation."""
+        for sense in (Sense.MINIMIZE, Sense.MAXIMIZE):
+            brkga, deferred_brkga, evaluation = self.create_brkgas(sense)
+            brkga.initialize()
+            deferred_brkga.initialize()
+            self.assert_same_populations(brkga, deferred_brkga)
+            self.assertEqual(evaluation.number_of_batches, 1)
+            brkga.evolve(5)
+            deferred_brkga.evolve(5)
+            self.assert_same_populations(brkga, deferred_brkga)
+            self.assertEqual(evaluation.number_of_batches, 6)
+            self.assertEqual(deferred_brkga.get_best_fitness(), brkga.get_best_fitness())
+
+    def test_worst_elite_fitness(self):
+        """The worst of the elite sets of all populations, for both senses."""
+        for sense in (Sense.MINIMIZE, Sense.MAXIMIZE):
+            brkga, _, _ = self.create_brkgas(sense)
+            brkga.initialize()
+            brkga.evolve(2)
+            elite_fitness = [fitness for population_index in range(self.params.num_independent_populations)
+                             for fitness, _ in BrkgaMpIprPopulations.get_fitness(brkga, population_index)
+                             [:brkga.elite_size]]
+            expected_fitness = max(elite_fitness) if sense == Sense.MINIMIZE else min(elite_fitness)
+            self.assertEqual(BrkgaMpIprPopulations.get_worst_elite_fitness(brkga), expected_fitness)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DeferredDecodingBrkgaTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,60 @@
+# coding=utf-8
+"""DhpUtility tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsVectorLayer
+
+from src.util.dhp_utility import DhpUtility
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class DhpUtilityTest(unittest.TestCase):
+    """Test the selection of intersecting features."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.layer = QgsVectorLayer("Point?crs=EPSG:25832", "points", "memory")
+        features = []
+        for x, y in [(1, 1), (5, 5), (20, 20)]:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            features.append(feature)
+        # a feature without geometry.
+        features.append(QgsFeature())
+        self.layer.dataProvider().addFeatures(features)
+
+    def test_get_intersecting_feature_ids(self):
+        """Only the points within the polygon are returned."""
+        polygon = QgsGeometry.fromWkt("POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))")
+        feature_ids = DhpUtility.get_intersecting_feature_ids(self.layer, polygon)
+        expected_ids = {feature.id() for feature in self.layer.getFeatures()
+                        if feature.hasGeometry() and feature.geometry().asPoint().x() < 10}
+        self.assertEqual(feature_ids, expected_ids)
+        self.assertEqual(len(feature_ids), 2)
+
+    def test_features_without_geometry_are_skipped(self):
+        """A polygon covering everything does not fail on features without geometry."""
+        polygon = QgsGeometry.fromWkt("POLYGON((-100 -100, 100 -100, 100 100, -100 100, -100 -100))")
+        feature_ids = DhpUtility.get_intersecting_feature_ids(self.layer, polygon)
+        self.assertEqual(len(feature_ids), 3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DhpUtilityTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""FitnessFunction tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import numpy as np
+
+from src.multi_step_pipeline.brkga.clustering_decoder import ClusteringDecoder
+from src.multi_step_pipeline.brkga.fitness_function import FitnessFunction
+
+from utilities import get_qgis_app, load_pipe_catalogue, make_random_clustering_instance
+
+QGIS_APP = get_qgis_app()
+
+
+class FitnessFunctionTest(unittest.TestCase):
+    """Test the cluster cost cache of the fitness function."""
+
+    NUMBER_OF_BUILDINGS = 30
+
+    def setUp(self):
+        """Runs before each test."""
+        self.instance = make_random_clustering_instance(self.NUMBER_OF_BUILDINGS, 7)
+        catalogue_df, pipe_prices = load_pipe_catalogue()
+        self.fitness_function = FitnessFunction(self.instance, self.instance.id_to_node_translation_dict,
+                                                catalogue_df, pipe_prices)
+        self.fitness_function.cluster_cost_cache_size = 100000
+        self.chromosomes = np.random.default_rng(8).random((50, len(self.instance.members)))
+
+    def test_cache_key_has_fixed_size(self):
+        """Keys do not grow with the cluster and do not depend on the order of the members."""
+        all_positions = np.arange(self.NUMBER_OF_BUILDINGS)
+        small_key = self.fitness_function.get_cache_key(all_positions[:2], 0)
+        large_key = self.fitness_function.get_cache_key(all_positions, 0)
+        self.assertEqual(len(small_key), FitnessFunction.CACHE_KEY_SIZE)
+        self.assertEqual(len(large_key), FitnessFunction.CACHE_KEY_SIZE)
+        self.assertEqual(large_key, self.fitness_function.get_cache_key(all_positions[::-1], 0))
+        self.assertNotEqual(large_key, self.fitness_function.get_cache_key(all_positions, 1))
+
+    def test_cached_costs_equal_computed_costs(self):
+        """A hit returns the costs compute_fitness returns for the same cluster."""
+        positions = np.array([3, 7, 11, 5])
+        computed_costs = self.fitness_function.compute_fitness(positions, 5)
+        self.assertEqual(self.fitness_function.compute_cached_fitness(positions, 5), computed_costs)
+        self.assertEqual(self.fitness_function.compute_cached_fitness(positions[::-1], 5), computed_costs)
+        self.assertEqual(self.fitness_function.cache_misses, 1)
+        self.assertEqual(self.fitness_function.cache_hits, 1)
+
+    def test_saved_evaluations(self):
+        """Decoding a population again only hits the cache, and the hits are the saved cluster evaluations."""
+        first_decoder = ClusteringDecoder(self.instance, 4, self.fitness_function, "single")
+        first_fitness_values = first_decoder.decode_batch(self.chromosomes)
+        cache_misses = self.fitness_function.cache_misses
+        cache_hits = self.fitness_function.cache_hits
+        second_decoder = ClusteringDecoder(self.instance, 4, self.fitness_function, "single")
+        second_fitness_values = second_decoder.decode_batch(self.chromosomes)
+        looked_up_clusters = second_decoder.number_of_clusters - second_decoder.number_of_reused_clusters
+        self.assertGreater(looked_up_clusters, 0)
+        self.assertEqual(self.fitness_function.cache_misses, cache_misses)
+        self.assertEqual(self.fitness_function.cache_hits - cache_hits, looked_up_clusters)
+        np.testing.assert_allclose(second_fitness_values, first_fitness_values, rtol=1e-12)
+
+    def test_cache_size_is_capped(self):
+        """The least recently used entries are evicted once the cache is full."""
+        self.fitness_function.cluster_cost_cache_size = 5
+        for center_position in range(20):
+            self.fitness_function.compute_cached_fitness(np.array([20, center_position]), center_position)
+        self.assertEqual(len(self.fitness_function.cluster_cost_cache), 5)
+        self.assertIsNotNone(self.fitness_function.get_cached_fitness(np.array([20, 19]), 19))
+        self.assertIsNone(self.fitness_function.get_cached_fitness(np.array([20, 0]), 0))
+
+
+    def test_mass_flow_above_catalogue_raises(self):
+        """No pipe of the catalogue can carry the mass flow."""
+        pipe_types = self.fitness_function.compute_pipe_types([0.0, 1.0])
+        self.assertTrue(all(pipe_type is not None for pipe_type in pipe_types))
+        with self.assertRaises(Exception):
+            self.fitness_function.compute_pipe_types([1.0, 1e12])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FitnessFunctionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
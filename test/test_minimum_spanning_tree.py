@@ -0,0 +1,101 @@
+# coding=utf-8
+"""MinimumSpanningTree tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.multi_step_pipeline.brkga.minimum_spanning_tree import MinimumSpanningTree
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class MinimumSpanningTreeTest(unittest.TestCase):
+    """Test the minimum spanning tree against networkx."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(11)
+        coordinates = rng.uniform(0, 500, (40, 2))
+        # euclidean distances of random points are distinct, so the minimum spanning tree is unique.
+        self.distance_matrix = np.linalg.norm(coordinates[:, None] - coordinates[None], axis=2)
+        self.distance_matrix[self.distance_matrix > 200] = np.inf
+        self.members = rng.choice(len(coordinates), 25, replace=False)
+        self.root = 3
+        # the first member can not be reached from the root.
+        self.distance_matrix[self.members[0], :] = np.inf
+        self.distance_matrix[:, self.members[0]] = np.inf
+        np.fill_diagonal(self.distance_matrix, 0.0)
+
+    def create_networkx_tree(self):
+        """Minimum spanning tree of the component of the root, directed away from the root."""
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(self.members)))
+        for i in range(len(self.members)):
+            for j in range(i + 1, len(self.members)):
+                distance = self.distance_matrix[self.members[i], self.members[j]]
+                if np.isfinite(distance):
+                    graph.add_edge(i, j, weight=distance)
+        component = graph.subgraph(nx.node_connected_component(graph, self.root))
+        return nx.bfs_tree(nx.minimum_spanning_tree(component), self.root)
+
+    def test_prim_matches_networkx(self):
+        """Same edges, parent distances and depths as the minimum spanning tree of networkx."""
+        parents, parent_distances, depths = MinimumSpanningTree.prim(self.distance_matrix, self.members, self.root)
+        tree = self.create_networkx_tree()
+        expected_parents = {child: parent for parent, child in tree.edges()}
+        expected_depths = nx.single_source_shortest_path_length(tree, self.root)
+        self.assertLess(len(tree), len(self.members))
+        for member in range(len(self.members)):
+            if member not in tree:
+                self.assertEqual(parents[member], MinimumSpanningTree.NO_PARENT)
+                self.assertEqual(depths[member], -1)
+                continue
+            self.assertEqual(parents[member], expected_parents.get(member, MinimumSpanningTree.NO_PARENT))
+            self.assertEqual(depths[member], expected_depths[member])
+            if member != self.root:
+                self.assertEqual(parent_distances[member],
+                                 self.distance_matrix[self.members[member], self.members[parents[member]]])
+
+    def test_get_levels(self):
+        """Levels hold the reachable members by depth, deepest first."""
+        _, _, depths = MinimumSpanningTree.prim(self.distance_matrix, self.members, self.root)
+        levels = MinimumSpanningTree.get_levels(depths)
+        self.assertEqual(levels[-1].tolist(), [self.root])
+        self.assertEqual([int(depths[level[0]]) for level in levels], list(range(len(levels)))[::-1])
+        self.assertEqual(sorted(np.concatenate(levels).tolist()), np.flatnonzero(depths >= 0).tolist())
+
+    def test_accumulate_subtree_sums_matches_networkx(self):
+        """Every member sums its own value and the values of all its descendants in the networkx tree."""
+        parents, _, depths = MinimumSpanningTree.prim(self.distance_matrix, self.members, self.root)
+        values = np.random.default_rng(12).uniform(5, 30, len(self.members))
+        subtree_sums = MinimumSpanningTree.accumulate_subtree_sums(values, parents,
+                                                                   MinimumSpanningTree.get_levels(depths))
+        tree = self.create_networkx_tree()
+        for member in tree:
+            expected_sum = values[member] + sum(values[descendant] for descendant in nx.descendants(tree, member))
+            self.assertAlmostEqual(subtree_sums[member], expected_sum, places=9)
+        self.assertEqual(subtree_sums[0], values[0])
+        number_of_consumers = MinimumSpanningTree.accumulate_subtree_sums(np.ones(len(self.members)), parents,
+                                                                          MinimumSpanningTree.get_levels(depths))
+        self.assertEqual(number_of_consumers[self.root], len(tree))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(MinimumSpanningTreeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
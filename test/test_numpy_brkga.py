@@ -0,0 +1,75 @@
+# coding=utf-8
+"""NumpyBrkga tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import numpy as np
+from brkga_mp_ipr.enums import Sense
+from brkga_mp_ipr.types_io import load_configuration
+
+from src.multi_step_pipeline.brkga.brkga import Brkga
+from src.multi_step_pipeline.brkga.clustering_decoder import ClusteringDecoder
+from src.multi_step_pipeline.brkga.fitness_function import FitnessFunction
+from src.multi_step_pipeline.brkga.numpy_brkga import NumpyBrkga
+
+from utilities import get_qgis_app, load_pipe_catalogue, make_random_clustering_instance
+
+QGIS_APP = get_qgis_app()
+
+
+class NumpyBrkgaTest(unittest.TestCase):
+    """Test the evolution of the populations held as arrays."""
+
+    NUMBER_OF_BUILDINGS = 20
+
+    def setUp(self):
+        """Runs before each test."""
+        instance = make_random_clustering_instance(self.NUMBER_OF_BUILDINGS, 7)
+        catalogue_df, pipe_prices = load_pipe_catalogue()
+        decoder = ClusteringDecoder(instance, 3, FitnessFunction(instance, instance.id_to_node_translation_dict,
+                                                                 catalogue_df, pipe_prices), "single")
+        params, _ = load_configuration(Brkga.CONFIG_FILE_PATH)
+        params.population_size = 3 * len(instance.members)
+        self.brkga = NumpyBrkga(decoder=decoder, sense=Sense.MINIMIZE, seed=4, chromosome_size=len(instance.members),
+                                params=params)
+        self.brkga.initialize()
+
+    def test_evolve_keeps_the_elite(self):
+        """Every elite chromosome is still in its population after one generation, with the same fitness."""
+        elite_size = self.brkga.elite_size
+        elite_chromosomes = self.brkga.populations[:, :elite_size].copy()
+        elite_fitness = self.brkga.fitness[:, :elite_size].copy()
+        self.brkga.evolve()
+        for population_index in range(self.brkga.num_populations):
+            population = self.brkga.populations[population_index]
+            for chromosome, fitness in zip(elite_chromosomes[population_index], elite_fitness[population_index]):
+                positions = np.flatnonzero((population == chromosome).all(axis=1))
+                self.assertGreater(len(positions), 0)
+                self.assertEqual(self.brkga.fitness[population_index, positions[0]], fitness)
+            # the elite can only get better.
+            self.assertLessEqual(self.brkga.fitness[population_index, elite_size - 1],
+                                 elite_fitness[population_index, -1])
+
+    def test_populations_stay_sorted(self):
+        """The best chromosome of every population comes first."""
+        self.brkga.evolve(3)
+        for fitness in self.brkga.fitness:
+            self.assertTrue(np.all(np.diff(fitness) >= 0))
+        self.assertEqual(self.brkga.get_best_fitness(), float(self.brkga.fitness.min()))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(NumpyBrkgaTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
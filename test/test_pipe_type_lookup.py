@@ -0,0 +1,82 @@
+# coding=utf-8
+"""PipeTypeLookup tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'felix.lewandowski@haw-hamburg.de'
+__date__ = '2026-10-19'
+__copyright__ = 'Copyright 2024, Felix Lewandowski, HAW-Hamburg'
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.multi_step_pipeline.brkga.brkga_api import BrkgaAPI
+from src.multi_step_pipeline.brkga.pipe_diameter_catalogue import PipeDiameterCatalogue
+from src.multi_step_pipeline.brkga.pipe_prices import PipePrices
+from src.multi_step_pipeline.brkga.pipe_type_lookup import PipeTypeLookup
+
+from utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class PipeTypeLookupTest(unittest.TestCase):
+    """Test the pipe type lookup against the filter on the catalogue dataframe it replaced."""
+
+    def setUp(self):
+        """Runs before each test."""
+        catalogue_interpreter = PipeDiameterCatalogue()
+        self.catalogue_df = catalogue_interpreter.create_dataframe(
+            catalogue_interpreter.open_catalogues(BrkgaAPI.CATALOGUE_FOLDER_PATH))
+        self.pipe_prices = PipePrices.open_prices_json(BrkgaAPI.PRICES_JSON_PATH)
+        self.pipe_type_lookup = PipeTypeLookup(self.catalogue_df, self.pipe_prices)
+
+    def compute_pipe_type(self, mass_flow):
+        """The pandas filter FitnessFunction used before the lookup."""
+        pdf = self.catalogue_df
+        filtered_pdf = pdf[pdf[PipeTypeLookup.MASS_FLOW_COL_NAME] >= mass_flow]
+        if filtered_pdf.empty:
+            return None
+        first_to_undershoot_threshold = filtered_pdf.iloc[0, :]
+        multiple_values = filtered_pdf[filtered_pdf[PipeTypeLookup.MASS_FLOW_COL_NAME]
+                                       == first_to_undershoot_threshold[PipeTypeLookup.MASS_FLOW_COL_NAME]]
+        pipe_columns = [col for col in pdf.columns if col != PipeTypeLookup.MASS_FLOW_COL_NAME]
+        for row in multiple_values.iterrows():
+            for col in pipe_columns:
+                if pd.notna(row[1][col]) and float(row[1][col]) < PipeTypeLookup.PRESSURE_LOSS_THRESHOLD:
+                    return self.pipe_prices[col]
+        return None
+
+    def assert_same_pipe_types(self, mass_flows):
+        pipe_types = self.pipe_type_lookup.get_pipe_types(mass_flows)
+        for mass_flow, pipe_type in zip(mass_flows, pipe_types):
+            self.assertEqual(pipe_type, self.compute_pipe_type(mass_flow), f"mass flow {mass_flow}")
+            self.assertEqual(self.pipe_type_lookup.get_pipe_type(mass_flow), pipe_type, f"mass flow {mass_flow}")
+
+    def test_catalogue_mass_flows(self):
+        """Mass flows that are exactly on a threshold of the catalogue."""
+        self.assert_same_pipe_types(self.catalogue_df[PipeTypeLookup.MASS_FLOW_COL_NAME].unique().tolist())
+
+    def test_random_mass_flows(self):
+        """Mass flows in between the thresholds."""
+        maximum_mass_flow = float(self.catalogue_df[PipeTypeLookup.MASS_FLOW_COL_NAME].max())
+        self.assert_same_pipe_types(np.random.default_rng(2).uniform(0, maximum_mass_flow, 500).tolist())
+
+    def test_out_of_range_mass_flows(self):
+        """Zero, negative and mass flows above the largest threshold of the catalogue."""
+        maximum_mass_flow = float(self.catalogue_df[PipeTypeLookup.MASS_FLOW_COL_NAME].max())
+        self.assert_same_pipe_types([0.0, -1.0, -1e6, maximum_mass_flow + 1e-9, maximum_mass_flow * 2])
+        self.assertIsNone(self.pipe_type_lookup.get_pipe_type(maximum_mass_flow * 2))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PipeTypeLookupTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -59,3 +59,47 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+def make_random_clustering_instance(number_of_buildings, seed):
+    """Clustering instance of randomly placed buildings, every pair connected by a straight line.
+
+    :param number_of_buildings: Number of buildings of the instance.
+    :param seed: Seed of the coordinates and demands.
+    :returns: The instance with a single pivot element and a heat capacity of 250.
+    :rtype: ClusteringInstance
+    """
+    import networkx as nx
+    import numpy as np
+    from src.multi_step_pipeline.brkga.brkga_api import BrkgaAPI
+    from src.multi_step_pipeline.brkga.clustering_instance import ClusteringInstance
+
+    rng = np.random.default_rng(seed)
+    building_ids = [str(1000 + i) for i in range(number_of_buildings)]
+    coordinates = rng.uniform(0, 500, (number_of_buildings, 2))
+    graph = nx.Graph()
+    for i in range(number_of_buildings):
+        for j in range(i + 1, number_of_buildings):
+            graph.add_edge(building_ids[i], building_ids[j],
+                           weight=float(np.linalg.norm(coordinates[i] - coordinates[j])), edge_ids=[i, j])
+    demands = {building_id: float(rng.uniform(5, 30)) for building_id in building_ids}
+    yearly_demands = {building_id: demand * 1000 for building_id, demand in demands.items()}
+    translation_dict = {building_id: building_id for building_id in building_ids}
+    members = building_ids + [BrkgaAPI.PIVOT_STRING_SINGLE]
+    return ClusteringInstance(graph, 250, demands, yearly_demands, members, translation_dict, "single")
+
+
+def load_pipe_catalogue():
+    """Pipe diameter catalogue and pipe prices the plugin ships with.
+
+    :returns: The catalogue dataframe and the pipe prices.
+    :rtype: (pandas.DataFrame, dict)
+    """
+    from src.multi_step_pipeline.brkga.brkga_api import BrkgaAPI
+    from src.multi_step_pipeline.brkga.pipe_diameter_catalogue import PipeDiameterCatalogue
+    from src.multi_step_pipeline.brkga.pipe_prices import PipePrices
+
+    catalogue_interpreter = PipeDiameterCatalogue()
+    catalogue_df = catalogue_interpreter.create_dataframe(
+        catalogue_interpreter.open_catalogues(BrkgaAPI.CATALOGUE_FOLDER_PATH))
+    return catalogue_df, PipePrices.open_prices_json(BrkgaAPI.PRICES_JSON_PATH)